@@ -0,0 +1,81 @@
+"""Per-message cost of the MIDI output backends.
+
+Drives MidiSender with one frame of gyro and joystick CCs per call through
+the mido fallback, the raw-byte rtmidi path (fake rtmidi port) and the
+batched raw device path (writes to /dev/null).
+
+Run from the repository root:
+    python -m benchmarks.bench_backends [--iterations N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from benchmarks.fakes import FakeInputDevice, FakeMidiOut, FakeRtMidiPort
+from mijoco.config.config_loader import JoyConType
+from mijoco.devices.controller import Controller
+from mijoco.midi.backends import RawMidiOutput
+from mijoco.midi.sender import MidiSender, send_midi_messages
+
+# Counts write() calls on the raw device path
+class CountingRawMidiOutput(RawMidiOutput):
+    def __init__(self):
+        super().__init__(os.devnull)
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        os.write(self.fd, data)
+
+def frame_benchmark(port, iterations):
+    controller = Controller(JoyConType.RIGHT, FakeInputDevice("Fake Joy-Con (R)"), FakeInputDevice("Fake IMU"))
+    midi_sender = MidiSender(port, controller.mapping)
+    gyro = controller.gyro_values
+    joy = controller.joycon_values
+
+    def frame(i):
+        # Every axis swings sides so change-only output sends all five CCs
+        sign = 1 if i & 1 else -1
+        gyro['x'], gyro['y'], gyro['z'] = sign * 4000, -sign * 3000, sign * 2000
+        joy['x'], joy['y'] = sign * 30000, -sign * 30000
+        send_midi_messages(midi_sender, controller, True, True)
+
+    frame(1)
+    sent = midi_sender.sent_count
+    start = time.perf_counter_ns()
+    for i in range(2, iterations + 2):
+        frame(i)
+    elapsed = time.perf_counter_ns() - start
+    messages = midi_sender.sent_count - sent
+    controller.close()
+    return {
+        'backend': type(midi_sender.output).__name__,
+        'ns_per_frame': round(elapsed / iterations, 1),
+        'ns_per_message': round(elapsed / messages, 1) if messages else None,
+        'messages_per_frame': round(messages / iterations, 2),
+    }
+
+def run(iterations):
+    raw = CountingRawMidiOutput()
+    results = {
+        'mido': frame_benchmark(FakeMidiOut(), iterations),
+        'rtmidi': frame_benchmark(FakeRtMidiPort(), iterations),
+        'rawmidi': frame_benchmark(raw, iterations),
+    }
+    results['rawmidi']['writes_per_frame'] = round(raw.writes / (iterations + 1), 2)
+    raw.close()
+    mido_ns = results['mido']['ns_per_message']
+    for name in ('rtmidi', 'rawmidi'):
+        if mido_ns and results[name]['ns_per_message']:
+            results[name]['speedup_vs_mido'] = round(mido_ns / results[name]['ns_per_message'], 2)
+    return {'benchmark': 'backends', 'python': sys.version.split()[0], 'backends': results}
+
+def main():
+    parser = argparse.ArgumentParser(description="MIDI output backend benchmarks")
+    parser.add_argument("--iterations", type=int, default=20000, help="Frames per backend")
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Cost of the batched IMU pipeline per read burst (needs numpy).
+
+Each case pushes one burst of hid-nintendo style IMU frames (accelerometer,
+gyroscope, MSC_TIMESTAMP, SYN_REPORT) to a fake device and times reading it
+with the per-event handler (raw axes only) and with the pipeline (raw axes
+plus fused, filtered pitch/roll/yaw).
+
+Run from the repository root:
+    python -m benchmarks.bench_imu [--bursts 3,15,64]
+"""
+import argparse
+import json
+import math
+import time
+import evdev
+from benchmarks.fakes import FakeInputDevice
+from mijoco.config.config_loader import JoyConType, get_config
+from mijoco.devices.controller import Controller
+from mijoco.devices.handler import process_device
+from mijoco.devices.imu import np
+from mijoco.midi.mapper import ControllerMapping
+from mijoco.midi.rules import parse_rule
+
+EV_ABS = evdev.ecodes.EV_ABS
+EV_MSC = evdev.ecodes.EV_MSC
+EV_SYN = evdev.ecodes.EV_SYN
+
+def push_burst(device, size, step):
+    for i in range(size):
+        angle = math.radians((step + i) % 90)
+        for code, value in ((evdev.ecodes.ABS_X, 0), (evdev.ecodes.ABS_Y, int(4096 * math.sin(angle))),
+                            (evdev.ecodes.ABS_Z, int(4096 * math.cos(angle))), (evdev.ecodes.ABS_RX, 14247),
+                            (evdev.ecodes.ABS_RY, (step + i) % 50), (evdev.ecodes.ABS_RZ, -(step + i) % 70)):
+            device.push(EV_ABS, code, value)
+        device.push(EV_MSC, evdev.ecodes.MSC_TIMESTAMP, (step + i) * 5000)
+        device.push(EV_SYN, evdev.ecodes.SYN_REPORT, 0)
+
+def make_controller():
+    """Right Joy-Con on fake devices with pitch/roll/yaw rules added"""
+    config = get_config()
+    controller = Controller(JoyConType.RIGHT, FakeInputDevice("Fake Joy-Con (R)"),
+                            FakeInputDevice("Fake Joy-Con (R) (IMU)"))
+    mapping = ControllerMapping(JoyConType.RIGHT, config)
+    for cc, source in enumerate(('pitch', 'roll', 'yaw'), 30):
+        rule = parse_rule({'source': source, 'action': 'cc', 'cc': cc}, config.user_config['input'],
+                          config.toggle_on, config.toggle_off)
+        mapping.rules['imu'][rule.key] = rule
+    controller.set_mapping(mapping)
+    return controller
+
+def time_reader(pipeline, size, iterations):
+    """ns per burst and per event of reading one burst"""
+    controller = make_controller()
+    reader = controller.read_imu if pipeline else process_device
+    elapsed = 0
+    for step in range(iterations + 1):
+        push_burst(controller.imu, size, step * size)
+        start = time.perf_counter_ns()
+        reader(controller.imu, controller.dispatch['imu'], controller.imu_sync, controller.frame)
+        if step:
+            elapsed += time.perf_counter_ns() - start
+        controller.frame.clear()
+    controller.close()
+    per_burst = elapsed / iterations
+    return {'ns_per_call': round(per_burst, 1), 'ns_per_event': round(per_burst / (size * 8), 1)}
+
+def run(bursts, iterations):
+    if np is None:
+        return {'benchmark': 'imu', 'skipped': 'numpy is not installed'}
+    results = []
+    for size in bursts:
+        results.append({
+            'burst': size,
+            'handler': time_reader(False, size, iterations),
+            'pipeline': time_reader(True, size, iterations),
+        })
+    return {'benchmark': 'imu', 'numpy': np.__version__, 'bursts': results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched IMU pipeline benchmark")
+    parser.add_argument("--bursts", default="3,15,64", help="Comma-separated frames per read burst")
+    parser.add_argument("--iterations", type=int, default=2000, help="Bursts per case")
+    args = parser.parse_args()
+    print(json.dumps(run([int(size) for size in args.bursts.split(',')], args.iterations), indent=2))
+
+if __name__ == "__main__":
+    main()
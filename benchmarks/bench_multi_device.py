@@ -0,0 +1,92 @@
+"""Per-device event-to-send latency as the number of controllers grows.
+
+Run from the repository root:
+    python -m benchmarks.bench_multi_device [--rate HZ] [--duration S] [--max-controllers N]
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import evdev
+from benchmarks.fakes import FakeInputDevice, FakeMidiOut
+from mijoco.config.config_loader import JoyConType
+from mijoco.devices.controller import Controller
+from mijoco.engine.engine import Engine
+
+TYPES = [JoyConType.LEFT, JoyConType.RIGHT, JoyConType.PRO]
+
+def make_controllers(count):
+    controllers = []
+    for i, joycon_type in zip(range(count), itertools.cycle(TYPES)):
+        main = FakeInputDevice(f"Fake {joycon_type.value}", f"/dev/input/fake{2 * i}")
+        imu = FakeInputDevice(f"Fake {joycon_type.value} (IMU)", f"/dev/input/fake{2 * i + 1}")
+        controllers.append(Controller(joycon_type, main, imu))
+    return controllers
+
+def feed(controllers, rate, duration, done):
+    """Push one gyro frame per controller IMU at the given rate"""
+    interval = 1.0 / rate
+    deadline = time.monotonic()
+    end = deadline + duration
+    value = 0
+    while deadline < end:
+        value = (value + 37) % 8000 - 4000
+        for controller in controllers:
+            controller.imu.push(evdev.ecodes.EV_ABS, evdev.ecodes.ABS_X, value)
+            controller.imu.push(evdev.ecodes.EV_SYN, evdev.ecodes.SYN_REPORT, 0)
+        deadline += interval
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    done.set()
+
+def run(count, rate, duration):
+    controllers = make_controllers(count)
+    midi_out = FakeMidiOut()
+    engine = Engine(controllers, midi_out, True, True)
+    done = threading.Event()
+    feeder = threading.Thread(target=feed, args=(controllers, rate, duration, done))
+    feeder.start()
+    while not done.is_set():
+        engine.loop.run_once(0.05)
+    feeder.join()
+    engine.close()
+    for controller in controllers:
+        controller.close()
+
+    summary = engine.stats.summary()
+    return {
+        'controllers': count,
+        'events': summary['events'],
+        'messages': midi_out.count,
+        'cpu_percent': round(summary['cpu_percent'], 2),
+        'per_device': [
+            {
+                'controller': controller.name,
+                'latency_avg_ms': round(s['latency_avg_ms'], 4),
+                'latency_max_ms': round(s['latency_max_ms'], 4),
+            }
+            for controller, s in ((c, st.summary()) for c, st in zip(controllers, engine.controller_stats))
+        ],
+    }
+
+def run_all(rate, duration, max_controllers):
+    results = []
+    count = 1
+    while count <= max_controllers:
+        results.append(run(count, rate, duration))
+        count *= 2
+    return {'benchmark': 'multi_device', 'rate_hz': rate, 'results': results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-controller latency benchmark")
+    parser.add_argument("--rate", type=float, default=200.0, help="IMU report rate per controller (Hz)")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--max-controllers", type=int, default=8)
+    args = parser.parse_args()
+
+    print(json.dumps(run_all(args.rate, args.duration, args.max_controllers), indent=2))
+
+if __name__ == "__main__":
+    main()
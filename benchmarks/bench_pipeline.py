@@ -0,0 +1,173 @@
+"""Hardware-free benchmarks for the input-to-MIDI pipeline.
+
+Micro benchmarks time each hot-path function on fake devices and a fake MIDI
+port; stream benchmarks drive the full engine with synthetic IMU reports.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline [--rates 200,1000,4000] [--duration S]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import evdev
+from benchmarks.fakes import FakeInputDevice, FakeMidiOut
+from mijoco.config.config_loader import JoyConType
+from mijoco.devices.controller import Controller
+from mijoco.engine.engine import Engine
+from mijoco.engine.shared_state import StatePublisher, StateReader
+from mijoco.midi.mapper import scale_gyro_to_midi, scale_joystick_to_midi
+from mijoco.midi.sender import MidiSender, send_midi_messages
+from mijoco.midi.smf_recorder import MidiFileRecorder
+import main as mijoco_main
+
+EV_ABS = evdev.ecodes.EV_ABS
+EV_KEY = evdev.ecodes.EV_KEY
+EV_SYN = evdev.ecodes.EV_SYN
+
+def make_controller(joycon_type=JoyConType.RIGHT):
+    name = f"Fake Joy-Con ({joycon_type.value[0]})"
+    return Controller(joycon_type, FakeInputDevice(name), FakeInputDevice(name + " (IMU)"))
+
+def measure(fn, iterations):
+    """Return ns per call"""
+    fn()
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+def micro_benchmarks(iterations):
+    controller = make_controller()
+    midi_out = FakeMidiOut()
+    midi_sender = MidiSender(midi_out, controller.mapping)
+    values = iter(range(10 ** 9))
+
+    def dispatch_gyro_event():
+        # One table lookup and one apply, as in process_device
+        controller.dispatch['imu'][(EV_ABS, evdev.ecodes.ABS_X)].apply(next(values) % 8000 - 4000)
+
+    def dispatch_button_event():
+        controller.dispatch['main'][(EV_KEY, 305)].apply(1)
+
+    def moving_gyro():
+        # Different value every call so change-only output still sends
+        controller.gyro_values['x'] = next(values) % 8000 - 4000
+        send_midi_messages(midi_sender, controller, True, True)
+
+    def status_line():
+        with contextlib.redirect_stdout(io.StringIO()):
+            mijoco_main.print_values([controller], True, True)
+
+    state_path = os.path.join(tempfile.mkdtemp(), "state")
+    publisher = StatePublisher(state_path)
+    reader = StateReader(state_path)
+    # Large enough that the timed calls never overrun
+    midi_recorder = MidiFileRecorder(os.path.join(os.path.dirname(state_path), "out.mid"), iterations * 2)
+
+    cases = {
+        'dispatch_gyro_event': dispatch_gyro_event,
+        'dispatch_button_event': dispatch_button_event,
+        'scale_gyro_to_midi': lambda: scale_gyro_to_midi(1234, 'x'),
+        'scale_joystick_to_midi': lambda: scale_joystick_to_midi(-20000, 'y'),
+        'send_midi_messages': moving_gyro,
+        'print_values': status_line,
+        'publish_state': lambda: publisher.publish(controller),
+        'read_state': lambda: reader.read(0),
+        'record_midi_message': lambda: midi_recorder.record(0xB0, 20, 64),
+    }
+    results = {}
+    for name, fn in cases.items():
+        results[name] = {'ns_per_call': round(measure(fn, iterations), 1)}
+    reader.close()
+    publisher.close()
+    midi_recorder.close()
+    os.unlink(midi_recorder.path)
+    os.rmdir(os.path.dirname(state_path))
+    controller.close()
+    return results
+
+def feed_imu(device, rate, duration, done):
+    """Push gyro X/Y/Z + SYN_REPORT frames at `rate` Hz, in ~1 ms bursts"""
+    start = time.monotonic()
+    sent = 0
+    while True:
+        elapsed = time.monotonic() - start
+        if elapsed >= duration:
+            break
+        due = int(elapsed * rate)
+        while sent < due:
+            value = (sent * 37) % 8000 - 4000
+            device.push(EV_ABS, evdev.ecodes.ABS_X, value)
+            device.push(EV_ABS, evdev.ecodes.ABS_Y, -value)
+            device.push(EV_ABS, evdev.ecodes.ABS_Z, value // 2)
+            device.push(EV_SYN, evdev.ecodes.SYN_REPORT, 0)
+            sent += 1
+        time.sleep(0.001)
+    done.set()
+
+def stream_benchmark(rate, duration, trace_memory=False):
+    controller = make_controller()
+    midi_out = FakeMidiOut()
+    engine = Engine([controller], midi_out, True, True)
+    done = threading.Event()
+    feeder = threading.Thread(target=feed_imu, args=(controller.imu, rate, duration, done))
+
+    if trace_memory:
+        tracemalloc.start()
+    cpu_start = time.thread_time()
+    wall_start = time.monotonic()
+    feeder.start()
+    while not done.is_set():
+        engine.loop.run_once(0.05)
+    engine.loop.run_once(0)
+    wall = time.monotonic() - wall_start
+    cpu = time.thread_time() - cpu_start
+    feeder.join()
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    events = engine.stats.events
+    summary = engine.stats.summary()
+    engine.close()
+    controller.close()
+    result = {
+        'rate_hz': rate,
+        'events': events,
+        'events_per_s': round(events / wall, 1),
+        'messages_per_s': round(midi_out.count / wall, 1),
+        'engine_cpu_us_per_event': round(1e6 * cpu / events, 3) if events else None,
+        'latency_avg_ms': round(summary['latency_avg_ms'], 4),
+        'latency_max_ms': round(summary['latency_max_ms'], 4),
+    }
+    if peak is not None:
+        result['traced_peak_kib'] = round(peak / 1024, 1)
+    return result
+
+def run(rates, duration, iterations, trace_memory=False):
+    return {
+        'benchmark': 'pipeline',
+        'python': sys.version.split()[0],
+        'micro': micro_benchmarks(iterations),
+        'stream': [stream_benchmark(rate, duration, trace_memory) for rate in rates],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Input-to-MIDI pipeline benchmarks")
+    parser.add_argument("--rates", default="200,1000,4000,8000", help="Comma-separated IMU report rates (Hz)")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per stream run")
+    parser.add_argument("--iterations", type=int, default=20000, help="Calls per micro benchmark")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peak (slower)")
+    args = parser.parse_args()
+    rates = [float(rate) for rate in args.rates.split(',')]
+    print(json.dumps(run(rates, args.duration, args.iterations, args.trace_memory), indent=2))
+
+if __name__ == "__main__":
+    main()
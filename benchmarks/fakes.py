@@ -0,0 +1,75 @@
+import os
+import time
+from collections import deque
+from evdev.events import InputEvent
+
+# Stand-in for evdev.InputDevice. Events are queued in memory and a pipe
+# provides a real fd, so the fake works with selectors like a device node.
+class FakeInputDevice:
+    def __init__(self, name, path="/dev/input/fake", uniq=""):
+        self.name = name
+        self.path = path
+        self.uniq = uniq
+        self.fd, self._notify_fd = os.pipe()
+        os.set_blocking(self.fd, False)
+        self.events = deque()
+
+    def push(self, type, code, value, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        sec = int(timestamp)
+        self.events.append(InputEvent(sec, int((timestamp - sec) * 1000000), type, code, value))
+        os.write(self._notify_fd, b'\0')
+
+    def read(self):
+        try:
+            os.read(self.fd, 65536)
+        except BlockingIOError:
+            pass
+        if not self.events:
+            raise BlockingIOError
+        # Only yield what is queued now; later pushes belong to the next read
+        events = self.events
+        for _ in range(len(events)):
+            yield events.popleft()
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        for fd in (self.fd, self._notify_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+# Stand-in for a mido output port that only counts what it receives
+class FakeMidiOut:
+    name = "Fake MIDI Out"
+
+    def __init__(self):
+        self.count = 0
+        self.last = None
+
+    def send(self, message):
+        self.count += 1
+        self.last = message
+
+    def close(self):
+        pass
+
+# Stand-in for python-rtmidi's MidiOut
+class FakeRtMidi:
+    def __init__(self):
+        self.count = 0
+
+    def send_message(self, message):
+        self.count += 1
+
+# Stand-in for a mido rtmidi port: exposes the rtmidi handle as _rt, which
+# is what the raw-byte backend looks for
+class FakeRtMidiPort(FakeMidiOut):
+    name = "Fake rtmidi Out"
+
+    def __init__(self):
+        super().__init__()
+        self._rt = FakeRtMidi()
@@ -0,0 +1,77 @@
+"""Run the benchmark suite and compare results between releases.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare baseline.json results.json [--threshold 0.2]
+
+--compare exits with status 1 if any tracked metric got worse by more than
+the threshold, so it can gate a release.
+"""
+import argparse
+import json
+import sys
+from benchmarks import bench_backends, bench_imu, bench_multi_device, bench_pipeline
+
+# Lower is better for all tracked metrics. Allocations are not tracked:
+# tracemalloc and sys.getallocatedblocks() only see live blocks, so objects
+# allocated and freed within a call cancel out and a count from either is noise
+TRACKED = ('ns_per_call', 'engine_cpu_us_per_event')
+
+def run_suite(quick=False):
+    duration = 0.5 if quick else 2.0
+    return {
+        'pipeline': bench_pipeline.run([200.0, 1000.0, 4000.0, 8000.0], duration, 2000 if quick else 20000),
+        'multi_device': bench_multi_device.run_all(200.0, duration, 8),
+        'backends': bench_backends.run(2000 if quick else 20000),
+        'imu': bench_imu.run([3, 15, 64], 200 if quick else 2000),
+    }
+
+def flatten(data, prefix=''):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from flatten(value, f"{prefix}{key}.")
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            label = value.get('rate_hz', value.get('controllers', i)) if isinstance(value, dict) else i
+            yield from flatten(value, f"{prefix}{label}.")
+    elif isinstance(data, (int, float)):
+        yield prefix[:-1], data
+
+def compare(baseline, current, threshold):
+    old = dict(flatten(baseline))
+    regressions = []
+    for key, value in flatten(current):
+        if not key.endswith(TRACKED) or key not in old or not old[key]:
+            continue
+        change = (value - old[key]) / abs(old[key])
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{key:70s} {old[key]:12.3f} -> {value:12.3f} ({change:+.1%}) {marker}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="MiJoCo benchmark suite")
+    parser.add_argument("--output", metavar="FILE", help="Write results as JSON (default: stdout)")
+    parser.add_argument("--quick", action="store_true", help="Shorter runs for a smoke check")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown (default 0.2)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    results = json.dumps(run_suite(args.quick), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(results + '\n')
+    else:
+        print(results)
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,196 @@
 import time
+# Taken before the imports below, for --startup-profile
+MODULE_START = time.clock_gettime(time.CLOCK_BOOTTIME)
 import sys
 import argparse
-import evdev
-from mijoco.config.config_loader import ConfigLoader
-from mijoco.devices.detector import find_joycon, select_midi_output, JoyConType
-from mijoco.devices.handler import ButtonState, process_devices, process_gyro_event, process_joystick_event, process_button_event
-from mijoco.midi.mapper import scale_gyro_to_midi, scale_joystick_to_midi
-from mijoco.midi.sender import MidiSender, send_midi_messages
+from mijoco.config.config_loader import get_config
+from mijoco.devices.detector import find_controllers, open_midi_port, select_midi_output
+from mijoco.devices.handler import process_controller
+from mijoco.devices.recorder import EventRecorder, Replayer, load_recording, replay_controllers
+from mijoco.midi.backends import RawMidiOutput
+from mijoco.midi.fanout import MidiFanOut, PortWriter, print_output_counters
+from mijoco.midi.network import OscOutput, RtpMidiSession, parse_address
+from mijoco.midi.sender import MidiSender, send_midi_frame
 from mijoco.midi.learner import midi_learn_loop
+from mijoco.engine.clock import print_clock_report
+from mijoco.engine.control import default_socket_path
+from mijoco.engine.shared_state import default_state_path
+from mijoco.engine.engine import Engine
+from mijoco.engine.instrumentation import Instrumentation, print_report
+from mijoco.engine.realtime import RealtimeRunner, print_realtime_report
+from mijoco.engine.startup import StartupProfile, print_startup_report
+from mijoco.engine.stats import LoopStats, print_stats
+from mijoco.ui.display import NoticeWriter, StatusDisplay, format_values
 
-# Initialize configuration
-config = ConfigLoader()
-
-def print_values(gyro_values, joycon_values, gyro_enabled, joystick_enabled, button_state, joycon_type: JoyConType):
-    gyro_status = "ON " if gyro_enabled else "OFF"
-    joystick_status = "ON " if joystick_enabled else "OFF"
-
-    active_buttons = []
-    toggle_on = config.config['midi'].get('toggle', {}).get('on', 127)
-    toggle_off = config.config['midi'].get('toggle', {}).get('off', 0)
-    
-    for code in config.button_mappings.keys():
-        if button_state.states.get(code, False):
-            state = "ON" if button_state.cc_values[code] == toggle_on else "OFF"
-            active_buttons.append(f"{config.button_names.get(code, '?')}({state})")
-
-    output = (
-        f"\r[{joycon_type.value}] Gyro: X:{gyro_values['x']:6d} | Y:{gyro_values['y']:6d} | Z:{gyro_values['z']:6d} "
-        f"[MIDI:{gyro_status}] | "
-        f"Joy: X:{joycon_values['x']:6d} | Y:{joycon_values['y']:6d} | "
-        f"[MIDI:{joystick_status}] | "
-        f"Buttons: {','.join(active_buttons) if active_buttons else 'None':20s}"
-    )
+def print_values(controllers, gyro_enabled, joystick_enabled):
+    lines = [format_values(controller, gyro_enabled, joystick_enabled) for controller in controllers]
+    output = "\r" + "\n".join(lines)
+    if len(lines) > 1:
+        # Move back to the first line so the next update redraws in place
+        output += f"\x1b[{len(lines) - 1}F"
     sys.stdout.write(output)
     sys.stdout.flush()
 
-def print_configuration(midi_out, gyro_enabled, joystick_enabled, joycon_type: JoyConType):
+def print_configuration(midi_out, gyro_enabled, joystick_enabled, controllers):
     if not midi_out:
         print("\nRunning in preview mode (no MIDI output)")
         return
 
     print("\nActive MIDI Configuration:")
-    print(f"Using Joy-Con: {joycon_type.value}")
-    print(f"MIDI Channel: {config.config['midi']['channel']}")
     print(f"Gyro Output: {'Enabled' if gyro_enabled else 'Disabled'}")
     print(f"Joystick Output: {'Enabled' if joystick_enabled else 'Disabled'}")
-    
-    print("\nControl Assignments:")
-    if gyro_enabled:
-        print("Gyro:")
-        for axis, cc in config.gyro_cc_map.items():
-            print(f"  {axis.upper()}-axis : CC{cc}")
-    
-    if joystick_enabled:
-        print("\nJoystick:")
-        joystick_map = (config.joystick_right_cc_map if joycon_type == JoyConType.RIGHT 
-                      else config.joystick_left_cc_map)
-        for axis, cc in joystick_map.items():
-            print(f"  {axis.upper()}-axis : CC{cc}")
-    
-    print("\nButtons:")
-    # Get all button mappings and names from config
-    button_mappings = config.button_mappings
-    button_names = config.button_names
-    
-    # Define which buttons belong to which Joy-Con type
-    left_buttons = {309, 310, 314, 317, 544, 545, 546, 547}  # Left-specific buttons
-    right_buttons = {304, 305, 307, 308, 315, 316, 318}  # Right-specific buttons
-    common_buttons = {311, 312, 313}  # Common buttons
-    
-    # Filter and display buttons for current Joy-Con
-    for code, cc in button_mappings.items():
-        if code in button_names:
-            name = button_names[code]
-            # Check if button belongs to current Joy-Con or is common
-            if ((joycon_type == JoyConType.LEFT and code in left_buttons) or
-                (joycon_type == JoyConType.RIGHT and code in right_buttons) or
-                (code in common_buttons)):
-                # Clean up name by removing parenthetical (L)/(R) if present
-                display_name = name.split('(')[0].strip() if '(' in name else name
-                print(f"  {display_name} : CC{cc}")
-
-def main_loop(joycon_main, joycon_imu, midi_out, gyro_enabled, joystick_enabled, joycon_type: JoyConType):
-    gyro_values = {'x': 0, 'y': 0, 'z': 0}
-    joycon_values = {'x': 0, 'y': 0}
-    button_state = ButtonState()
-    midi_sender = MidiSender(midi_out)
+
+    for controller in controllers:
+        mapping = controller.mapping
+        print(f"\nUsing controller: {controller.joycon_type.value}")
+        print(f"MIDI Channel: {mapping.channel}")
+
+        print("\nControl Assignments:")
+        sections = [("Gyro", gyro_enabled and controller.imu, mapping.rules_for('imu')),
+                    ("Joystick", joystick_enabled, [r for r in mapping.rules_for('main') if r.group == 'joystick']),
+                    ("Buttons", True, [r for r in mapping.rules_for('main') if r.group == 'button'])]
+        for title, enabled, rules in sections:
+            if enabled and rules:
+                print(f"{title}:")
+                for rule in rules:
+                    print(f"  {rule.label} : {rule.describe()}")
+
+def close_devices(controllers, midi_out):
+    for controller in controllers:
+        controller.close()
+    if midi_out:
+        midi_out.close()
+
+def total_counters(midi_senders):
+    counters = {}
+    for midi_sender in midi_senders:
+        for name, value in midi_sender.counters().items():
+            counters[name] = counters.get(name, 0) + value
+    return counters
+
+def main_loop(controllers, midi_out, gyro_enabled, joystick_enabled, show_stats=False, watch_config=True,
+              instrument=False, control_socket=None, recorder=None, replayer=None, quiet=False, realtime=False,
+              hotplug=True, state_file=None, record_midi=None, controller_pattern=None, profile=None):
+    instrumentation = Instrumentation() if instrument else None
+    engine = Engine(controllers, midi_out, gyro_enabled, joystick_enabled, instrumentation)
+    engine.controller_pattern = controller_pattern
+    stats = engine.stats
+    # Controllers connected while running are added to the engine's list
+    controllers = engine.controllers
+    display = None if quiet else StatusDisplay(gyro_enabled, joystick_enabled)
+    # Messages from the loop thread are written by the display's thread (or
+    # the notice writer's when quiet), never by the loop itself
+    notices = display or NoticeWriter()
+    if replayer:
+        # Stop once the last recorded event has been handed to the engine
+        replayer.on_done = lambda: engine.loop.call_soon_threadsafe(engine.loop.stop)
+        replayer.start()
+
+    # The loop thread only publishes a snapshot; the display thread draws it
+    def on_status():
+        stats.tick()
+        if display:
+            display.publish(controllers)
+
+    status_timer = engine.loop.add_timer(get_config().print_interval, on_status)
+    engine.reload_listeners.append(
+        lambda config: engine.loop.set_timer_interval(status_timer, config.print_interval))
+    notices.start()
+    if watch_config:
+        if display:
+            engine.reload_listeners.append(lambda config: display.notice("Config reloaded"))
+        engine.watch_config()
+    if hotplug:
+        engine.device_listeners.append(lambda controller, message: notices.notice(message))
+        engine.watch_devices()
+    engine.learn.listeners.append(notices.notice)
+    engine.banks.listeners.append(notices.notice)
+    engine.notice_listeners.append(notices.notice)
+    if instrument or control_socket:
+        engine.serve_control(control_socket)
+    if state_file:
+        print(f"Sharing controller state in {engine.publish_state(state_file).path}")
+    if record_midi:
+        engine.record_midi(record_midi)
+        print(f"Recording MIDI output to {record_midi}")
+    runner = None
+    if realtime:
+        settings = get_config().realtime
+        runner = RealtimeRunner(engine, settings.get('priority', 50), settings.get('cpu'),
+                                settings.get('deadline_ms', 2.0))
+    if profile:
+        profile.watch(engine)
+        profile.mark('engine setup')
+
+    try:
+        try:
+            if runner:
+                runner.run()
+            else:
+                engine.run()
+        finally:
+            # Stop drawing before anything else is printed
+            notices.stop()
+    except KeyboardInterrupt:
+        print("\nExiting MiJoCo...")
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+    finally:
+        # Clean up resources
+        clock_report = engine.clock.report() if engine.clock else None
+        if replayer:
+            replayer.stop()
+            print("\nReplay finished")
+        if recorder:
+            recorder.close()
+            print(f"\nRecorded {recorder.count} events")
+        engine.close()
+        if engine.midi_recorder:
+            from mijoco.midi.smf_recorder import print_recorder_counters
+            print_recorder_counters(engine.midi_recorder.counters())
+        if show_stats:
+            print_stats(stats, "event-driven", total_counters(engine.midi_senders))
+            if len(controllers) > 1:
+                for controller, latency_stats in zip(controllers, engine.controller_stats):
+                    s = latency_stats.summary()
+                    print(f"  [{controller.name}] event-to-send: avg {s['latency_avg_ms']:.3f} ms | "
+                          f"max {s['latency_max_ms']:.3f} ms")
+        if instrumentation:
+            print_report(instrumentation.report())
+        if runner:
+            print_realtime_report(runner.report())
+        if show_stats and clock_report:
+            print_clock_report(clock_report)
+        if show_stats and hasattr(midi_out, 'counters'):
+            print_output_counters(midi_out.counters())
+        if profile:
+            print_startup_report(profile.report())
+        close_devices(controllers, midi_out)
+        sys.exit(0)
+
+# Legacy sleep-poll loop, kept for comparison with the event-driven engine
+def poll_loop(controllers, midi_out, gyro_enabled, joystick_enabled, show_stats=False):
+    midi_senders = [MidiSender(midi_out, controller.mapping) for controller in controllers]
+    stats = LoopStats()
     last_print = 0
 
     try:
         while True:
             current_time = time.time()
-            new_data = False
-            
-            try:
-                process_devices(joycon_main, joycon_imu, gyro_values, joycon_values, 
-                              button_state, joycon_type)
-                new_data = any([
-                    joycon_values['x'] != 0,
-                    joycon_values['y'] != 0,
-                    any(button_state.states.values()),
-                    gyro_values['x'] != 0,
-                    gyro_values['y'] != 0,
-                    gyro_values['z'] != 0
-                ])
-            except BlockingIOError:
-                pass
-
-            if new_data and midi_out:
-                send_midi_messages(midi_sender, gyro_values, joycon_values,
-                                 button_state, gyro_enabled, joystick_enabled,
-                                 joycon_type)
-
-            if current_time - last_print >= config.config.get('print_interval', 0.1):
-                print_values(gyro_values, joycon_values, gyro_enabled,
-                           joystick_enabled, button_state, joycon_type)
+            for controller, midi_sender in zip(controllers, midi_senders):
+                event_count, event_timestamp = process_controller(controller)
+                stats.record_wakeup(event_count)
+
+                if midi_out and controller.frame:
+                    send_midi_frame(midi_sender, controller.frame, gyro_enabled, joystick_enabled)
+                    if event_timestamp:
+                        stats.record_send(event_timestamp)
+                if midi_out and midi_sender.flush_interval:
+                    midi_sender.flush()
+
+            if current_time - last_print >= get_config().print_interval:
+                stats.tick()
+                print_values(controllers, gyro_enabled, joystick_enabled)
                 last_print = current_time
 
             time.sleep(0.001)
@@ -125,38 +201,167 @@ def main_loop(joycon_main, joycon_imu, midi_out, gyro_enabled, joystick_enabled,
         print(f"\nError: {str(e)}")
     finally:
         # Clean up resources
-        joycon_main.close()
-        joycon_imu.close()
-        if midi_out:
-            midi_out.close()
+        if show_stats:
+            print_stats(stats, "sleep-poll", total_counters(midi_senders))
+        close_devices(controllers, midi_out)
         sys.exit(0)
 
+def open_output(kind, target, network):
+    """Open one output: a raw device, an RTP-MIDI peer, an OSC target or a MIDI port by name"""
+    redundancy = network.get('redundancy', 0)
+    if kind == 'device':
+        return RawMidiOutput(target)
+    if kind == 'rtp_midi':
+        host, port = parse_address(target, 5004)
+        return RtpMidiSession(host, port, network.get('session_name', 'MiJoCo'), redundancy)
+    if kind == 'osc':
+        host, port = parse_address(target, 9000)
+        return OscOutput(host, port, network.get('osc_address', '/midi/cc'), redundancy,
+                         network.get('osc_note_address', '/midi/note'))
+    return open_midi_port(target)
+
+def open_midi_output(args):
+    midi_config = get_config().config['midi']
+    network = midi_config.get('network', {})
+    if args.midi_device:
+        midi_out = open_output('device', args.midi_device, network)
+        print(f"Connected to raw MIDI device: {midi_out.name}")
+    elif args.rtp_midi:
+        midi_out = open_output('rtp_midi', args.rtp_midi, network)
+        print(f"Inviting RTP-MIDI peer: {midi_out.name}")
+    elif args.osc:
+        midi_out = open_output('osc', args.osc, network)
+        print(f"Sending OSC to: {midi_out.name}")
+    elif args.midi_port or midi_config.get('port'):
+        midi_out = open_output('port', args.midi_port or midi_config['port'], network)
+        print(f"Connected to MIDI output: {midi_out.name}")
+    else:
+        midi_out = select_midi_output()
+    if midi_config.get('outputs'):
+        midi_out = open_fan_out(midi_out, midi_config['outputs'], midi_config.get('output', {}), network)
+    return midi_out
+
+def session_outputs(midi_out):
+    """Names of the outputs that run a session on the event loop (RTP-MIDI)"""
+    ports = [writer.port for writer in midi_out.writers] if isinstance(midi_out, MidiFanOut) else [midi_out]
+    return [port.name for port in ports if isinstance(port, RtpMidiSession)]
+
+def open_fan_out(midi_out, outputs, output_config, network):
+    """Send to the chosen output and every entry of midi.outputs, each from its own writer thread"""
+    fast_path = output_config.get('fast_path', True)
+    writers = []
+    if midi_out:
+        writers.append(PortWriter(midi_out, depth=output_config.get('queue', 256),
+                                  policy=output_config.get('policy', 'drop-oldest'), fast_path=fast_path))
+    for entry in outputs:
+        kind = next((kind for kind in ('port', 'device', 'rtp_midi', 'osc') if kind in entry), None)
+        if not kind:
+            print(f"Skipping output {dict(entry)}: needs one of port, device, rtp_midi or osc")
+            continue
+        try:
+            port = open_output(kind, entry[kind], network)
+        except OSError as e:
+            print(f"Skipping output {entry[kind]}: {e.strerror or e}")
+            continue
+        writers.append(PortWriter(port, entry.get('channel'), entry.get('cc_map'), entry.get('queue', 256),
+                                  entry.get('policy', 'drop-oldest'), fast_path))
+        print(f"Also sending to: {port.name}")
+    return MidiFanOut(writers) if writers else None
+
 def main():
     parser = argparse.ArgumentParser(description="MiJoCo (Midi Joy-Con)")
     parser.add_argument("--no-gyro", action="store_true", help="Disable Gyroscope MIDI output")
     parser.add_argument("--no-joystick", action="store_true", help="Disable Joystick MIDI output")
     parser.add_argument("--midi-learn", action="store_true", help="Enable MIDI learn mode")
+    parser.add_argument("--poll-loop", action="store_true", help="Use the legacy 1 ms sleep-poll loop instead of the event-driven engine")
+    parser.add_argument("--realtime", action="store_true", help="Run MIDI output on a dedicated SCHED_FIFO thread with locked memory and a frozen GC")
+    parser.add_argument("--stats", action="store_true", help="Print CPU and event-to-send latency statistics on exit")
+    parser.add_argument("--instrument", action="store_true", help="Record latency histograms (printed on exit, served on the control socket)")
+    parser.add_argument("--control-socket", metavar="PATH", nargs='?', const=default_socket_path(),
+                        help="Serve the control socket (stats, learn, ...), optionally at PATH")
+    parser.add_argument("--state-file", metavar="PATH", nargs='?', const=default_state_path(),
+                        help="Share controller state with other processes through a memory-mapped file, optionally at PATH")
+    parser.add_argument("--record", metavar="FILE", help="Record all controller events to a binary log")
+    parser.add_argument("--record-midi", metavar="FILE", help="Record the MIDI output to a Standard MIDI File (.mid)")
+    parser.add_argument("--replay", metavar="FILE", help="Replay a recorded event log instead of reading controllers")
+    parser.add_argument("--replay-fast", action="store_true", help="Replay as fast as possible instead of in real time")
+    parser.add_argument("--midi-device", metavar="PATH", help="Write to a raw ALSA MIDI device (e.g. /dev/snd/midiC1D0) instead of choosing a port")
+    parser.add_argument("--rtp-midi", metavar="HOST[:PORT]", help="Send to an RTP-MIDI (AppleMIDI) session, default port 5004")
+    parser.add_argument("--osc", metavar="HOST[:PORT]", help="Send CCs as OSC bundles over UDP, default port 9000")
+    parser.add_argument("--midi-port", metavar="PATTERN", help="Open the first MIDI output whose name contains PATTERN instead of asking")
+    parser.add_argument("--controller", metavar="PATTERN", help="Only use controllers matching PATTERN: Left, Right, Pro, part of the name or a Bluetooth address")
+    parser.add_argument("--startup-profile", action="store_true", help="Print how long each startup phase took, up to the first MIDI message")
+    parser.add_argument("--quiet", action="store_true", help="Headless mode: no terminal status display")
+    parser.add_argument("--no-hotplug", action="store_true", help="Do not reattach controllers that reconnect")
+    parser.add_argument("--no-reload", action="store_true", help="Do not reload config.yml when it changes")
     args = parser.parse_args()
+    profile = StartupProfile(MODULE_START) if args.startup_profile else None
+    if profile:
+        profile.mark('imports')
 
     print("Starting MiJoCo controller processing...")
-    joycon_main, joycon_imu, joycon_type = find_joycon()
-    if not joycon_main or not joycon_imu:
+    try:
+        config = get_config()
+    except ValueError as e:
+        print(f"\nConfig error: {e}")
+        sys.exit(1)
+    if profile:
+        profile.mark('config (cached)' if config.from_cache else 'config')
+    controller_pattern = args.controller or config.config.get('controller')
+    replayer = None
+    if args.replay:
+        devices, records = load_recording(args.replay)
+        controllers, replay_devices = replay_controllers(devices)
+        replayer = Replayer(records, replay_devices, realtime=not args.replay_fast)
+        print(f"Replaying {len(records)} events from {args.replay} "
+              f"({'as fast as possible' if args.replay_fast else 'real time'})")
+    else:
+        controllers = find_controllers(controller_pattern)
+    if not controllers:
         return
+    if profile:
+        profile.mark('controller discovery')
+    recorder = EventRecorder(args.record, controllers) if args.record else None
 
-    midi_out = select_midi_output()
+    try:
+        midi_out = open_midi_output(args)
+    except OSError as e:
+        print(f"\nError: {e}")
+        sys.exit(1)
+    if profile:
+        # Choosing a port at the prompt is the user's time, not startup cost
+        prompted = not (args.midi_device or args.rtp_midi or args.osc or args.midi_port or
+                        config.config['midi'].get('port'))
+        profile.mark('MIDI output (interactive prompt)' if prompted else 'MIDI output', counted=not prompted)
+    sessions = session_outputs(midi_out)
+    if args.poll_loop and sessions:
+        # Their handshake and clock sync run on the event loop the poll loop does not have
+        print(f"\nError: --poll-loop cannot drive RTP-MIDI sessions ({', '.join(sessions)}); "
+              "run without --poll-loop")
+        close_devices(controllers, midi_out)
+        sys.exit(1)
     gyro_enabled = not args.no_gyro
     joystick_enabled = not args.no_joystick
     
     if args.midi_learn:
-        learned_mappings = midi_learn_loop(joycon_main, joycon_imu, midi_out, joycon_type)
+        learned_mappings = midi_learn_loop(controllers[0], midi_out)
         gyro_enabled = learned_mappings['gyro_x'] or learned_mappings['gyro_y'] or learned_mappings['gyro_z']
         joystick_enabled = learned_mappings['joystick_x'] or learned_mappings['joystick_y'] or learned_mappings['joystick_rx'] or learned_mappings['joystick_ry']
+        if profile:
+            # Interactive, so not startup cost: listed but left out of the total
+            profile.mark('MIDI learn (interactive)', counted=False)
     
-    print_configuration(midi_out, gyro_enabled, joystick_enabled, joycon_type)
+    print_configuration(midi_out, gyro_enabled, joystick_enabled, controllers)
     print("\nStarting main loop... (Press Ctrl+C to exit)\n")
 
     try:
-        main_loop(joycon_main, joycon_imu, midi_out, gyro_enabled, joystick_enabled, joycon_type)
+        if args.poll_loop and not (recorder or replayer or args.realtime or args.record_midi):
+            poll_loop(controllers, midi_out, gyro_enabled, joystick_enabled, args.stats)
+        else:
+            main_loop(controllers, midi_out, gyro_enabled, joystick_enabled, args.stats, not args.no_reload,
+                      args.instrument, args.control_socket, recorder, replayer, args.quiet,
+                      args.realtime, not (replayer or args.no_hotplug), args.state_file,
+                      args.record_midi, controller_pattern, profile)
     except Exception as e:
         print(f"\nUnexpected error: {str(e)}")
         sys.exit(1)
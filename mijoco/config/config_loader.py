@@ -1,12 +1,21 @@
+import copy
+import hashlib
+import os
+import pickle
 import sys
-import yaml
+import threading
+from collections.abc import Mapping
 from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, Any, Tuple
 from enum import Enum
 
+MIDI_MAX_14BIT = 16383
+
 class JoyConType(Enum):
     LEFT = "Left"
     RIGHT = "Right"
+    PRO = "Pro"
 
 class UIConfig:
     """Hardcoded UI configuration that was previously in ui.yml"""
@@ -45,76 +54,253 @@ class UIConfig:
         313: "TR2"
     }
 
+def _freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# Compiled-config cache: the parsed config.yml and its curve tables, written
+# after a config loaded without errors and used while config.yml is
+# unchanged, so a start skips the YAML parser and the curve tables. The key
+# also covers the code that produced them, so an upgrade never reuses old
+# tables; CACHE_VERSION covers changes to the cache format itself.
+CACHE_VERSION = 1
+# Modules whose output is cached, relative to the package
+CACHED_SOURCES = ('config/config_loader.py', 'midi/curves.py', 'midi/rules.py')
+_source_digest = None
+
+def _code_digest():
+    """Hash of the cached modules' sources; the executable's identity in a frozen build"""
+    global _source_digest
+    if _source_digest is None:
+        package_dir = Path(__file__).resolve().parent.parent
+        digest = hashlib.sha1()
+        try:
+            for source in CACHED_SOURCES:
+                digest.update((package_dir / source).read_bytes())
+        except OSError:
+            # No sources on disk (PyInstaller binary): any upgrade replaces the executable
+            stat = os.stat(sys.executable)
+            digest.update(f"{sys.executable}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+def _cache_path(config_path):
+    cache_dir = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'mijoco'
+    digest = hashlib.sha1(str(config_path.resolve()).encode()).hexdigest()[:16]
+    return cache_dir / f"config-{digest}.pickle"
+
+def _cache_key(config_path):
+    try:
+        stat = config_path.stat()
+    except OSError:
+        return None
+    return CACHE_VERSION, _code_digest(), stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def _read_cache(config_path, key):
+    """(user config, curve tables) cached for this version of config.yml, else None"""
+    if key is None:
+        return None
+    try:
+        with open(_cache_path(config_path), 'rb') as f:
+            cached_key, user_config, curves = pickle.load(f)
+    except Exception:
+        # Missing, unreadable or written by another version: load normally
+        return None
+    if cached_key != key:
+        return None
+    return pickle.loads(user_config), curves
+
+def _write_cache(config_path, key, user_config, curves):
+    path = _cache_path(config_path)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            pickle.dump((key, user_config, curves), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        # No writable cache directory: every start parses config.yml
+        temp_path.unlink(missing_ok=True)
+
+def _is_high_res(entry) -> bool:
+    return isinstance(entry, Mapping) and ('nrpn' in entry or int(entry.get('resolution', 7)) == 14)
+
+# Immutable snapshot of config.yml. Everything derived from it (merged views,
+# ranges, response curve tables) is computed once here, never on access.
 class ConfigLoader:
-    def __init__(self):
+    def __init__(self, config_path=None, user_config=None, curve_cache=None):
         # Determine paths
         self.is_frozen = getattr(sys, 'frozen', False)
         self.base_dir = Path(sys.executable).parent if self.is_frozen else Path(__file__).parent.parent.parent
+        self.config_path = Path(config_path) if config_path else self.base_dir / "config.yml"
         
         # Load configurations
-        self.user_config = self._load_user_config()
-        self.ui_config = {
+        cache_key = raw_config = None
+        self.from_cache = False
+        if user_config is None:
+            # Taken before reading, so a file changed meanwhile is never cached as this one
+            cache_key = _cache_key(self.config_path)
+            cached = _read_cache(self.config_path, cache_key)
+            if cached:
+                user_config, curve_cache = cached
+                self.from_cache = True
+            else:
+                user_config = self._load_user_config()
+                raw_config = pickle.dumps(user_config)
+        self._init_defaults(user_config)
+        bank_settings = user_config.pop('banks', None) or {}
+        # Curve tables by (input section, axis, resolution); banks share the
+        # input section, so they share this snapshot's tables
+        self.curve_cache = {} if curve_cache is None else curve_cache
+        # Preset banks are built from the plain dict, before it is frozen
+        banks = self._compile_banks(user_config, bank_settings)
+        self.user_config = _freeze(user_config)
+        self.ui_config = _freeze({
             'midi_learn': UIConfig.MIDI_LEARN_OPTIONS,
             'button_names': UIConfig.BUTTON_NAMES
-        }
-        self._init_defaults()
+        })
+        self.config = _freeze({**user_config, **self.ui_config})
+
+        # Precomputed fields
+        midi = self.user_config['midi']
+        mappings = self.user_config['mappings']
+        self.channel = midi['channel']
+        self.toggle_on = midi['toggle']['on']
+        self.toggle_off = midi['toggle']['off']
+        self.print_interval = self.user_config.get('print_interval', 0.1)
+        self.gyro_range = (self.user_config['input']['gyro']['min'],
+                           self.user_config['input']['gyro']['max'])
+        self.joystick_range = (self.user_config['input']['joystick']['min'],
+                               self.user_config['input']['joystick']['max'])
+        self.button_mappings = mappings['buttons']
+        self.gyro_cc_map = mappings['gyro']
+        self.joystick_left_cc_map = mappings['joystick_left']
+        self.joystick_right_cc_map = mappings['joystick_right']
+        self.controller_overrides = self.user_config.get('controllers') or MappingProxyType({})
+        self.realtime = self.user_config.get('realtime') or MappingProxyType({})
+        self.imu = self.user_config.get('imu') or MappingProxyType({})
+        # Bank switching settings, and the preset banks as (name, snapshot);
+        # bank 0 is this snapshot
+        self.bank_settings = _freeze(bank_settings)
+        self.banks = ((bank_settings.get('name') or 'Default', self), *banks)
+        self.button_names = self.ui_config['button_names']
+        self.midi_learn_options = self.ui_config['midi_learn']
+        self._compile_curves()
+        if raw_config is not None and cache_key is not None:
+            # Only a config that compiled without errors is cached
+            _write_cache(self.config_path, cache_key, raw_config, self.curve_cache)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_compiled', False):
+            raise AttributeError("Config snapshots are read-only; build a new ConfigLoader instead")
+        super().__setattr__(name, value)
+
+    def _compile_curves(self):
+        """Compile response curve tables; 14-bit tables only for axes mapped to high resolution"""
+        gyro_maps = [self.gyro_cc_map]
+        joystick_maps = [self.joystick_left_cc_map, self.joystick_right_cc_map]
+        for overrides in self.controller_overrides.values():
+            mappings = overrides.get('mappings', {})
+            gyro_maps.append(mappings.get('gyro', {}))
+            joystick_maps.extend([mappings.get('joystick_left', {}), mappings.get('joystick_right', {})])
+
+        curve = self._axis_curve
+        self.gyro_curves = {axis: curve('gyro', axis) for axis in ('x', 'y', 'z')}
+        self.joystick_curves = {axis: curve('joystick', axis) for axis in ('x', 'y')}
+        self.gyro_curves_14bit = {axis: curve('gyro', axis, MIDI_MAX_14BIT)
+                                  for axis in {a for m in gyro_maps for a, e in m.items() if _is_high_res(e)}}
+        self.joystick_curves_14bit = {axis: curve('joystick', axis, MIDI_MAX_14BIT)
+                                      for axis in {a for m in joystick_maps for a, e in m.items() if _is_high_res(e)}}
+        self._compile_rules()
+        self._compiled = True
+
+    def _axis_curve(self, section, axis, out_max=127):
+        from mijoco.midi.curves import compile_axis_curve
+
+        key = (section, axis, out_max)
+        curve = self.curve_cache.get(key)
+        if curve is None:
+            try:
+                curve = compile_axis_curve(self.user_config['input'][section], axis, out_max)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid curve for input.{section} axis {axis} in {self.config_path.name}: {e}") from e
+            self.curve_cache[key] = curve
+        return curve
+
+    def _compile_rules(self):
+        """Parse the `rules` section, curves included, so binding them to a controller is cheap"""
+        from mijoco.midi.rules import parse_rule
+
+        rules = []
+        for index, entry in enumerate(self.user_config.get('rules') or ()):
+            try:
+                rules.append(parse_rule(entry, self.user_config['input'], self.toggle_on, self.toggle_off,
+                                        self.button_names))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid rule {index} in {self.config_path.name}: {e}") from e
+        self.rules = tuple(rules)
+
+    def _compile_banks(self, user_config, bank_settings):
+        """A full snapshot per preset bank, so switching to one compiles nothing"""
+        banks = []
+        for index, entry in enumerate(bank_settings.get('list') or (), 1):
+            name = entry.get('name') or f"Bank {index}"
+            bank_config = copy.deepcopy(user_config)
+            for section, mappings in (entry.get('mappings') or {}).items():
+                bank_config['mappings'].setdefault(section, {}).update(mappings)
+            for section in ('controllers', 'rules'):
+                if section in entry:
+                    bank_config[section] = entry[section]
+            try:
+                banks.append((name, ConfigLoader(self.config_path, bank_config, self.curve_cache)))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid bank '{name}' in {self.config_path.name}: {e}") from e
+        return banks
 
     def _load_user_config(self) -> Dict[str, Any]:
         """Load user-editable config.yml from executable directory"""
-        config_path = self.base_dir / "config.yml"
+        config_path = self.config_path
         if not config_path.exists():
             raise FileNotFoundError(
                 f"Required config.yml not found at: {config_path}\n"
                 "Please place it in the same directory as the executable."
             )
         
+        import yaml
+
         with open(config_path, 'r') as f:
             return yaml.safe_load(f) or {}
 
-    def _init_defaults(self):
+    def _init_defaults(self, user_config):
         """Initialize default values for critical settings"""
-        self.user_config.setdefault('midi', {}).update({
-            'channel': self.user_config['midi'].get('channel', 0),
+        user_config.setdefault('midi', {}).update({
+            'channel': user_config['midi'].get('channel', 0),
             'toggle': {
-                'on': self.user_config['midi'].get('toggle', {}).get('on', 127),
-                'off': self.user_config['midi'].get('toggle', {}).get('off', 0)
+                'on': user_config['midi'].get('toggle', {}).get('on', 127),
+                'off': user_config['midi'].get('toggle', {}).get('off', 0)
             }
         })
 
-    @property
-    def config(self) -> Dict[str, Any]:
-        return {**self.user_config, **self.ui_config}
-
-    @property
-    def gyro_range(self) -> tuple:
-        return (self.user_config['input']['gyro']['min'], 
-                self.user_config['input']['gyro']['max'])
-
-    @property
-    def joystick_range(self) -> tuple:
-        return (self.user_config['input']['joystick']['min'], 
-                self.user_config['input']['joystick']['max'])
-
-    @property
-    def button_mappings(self) -> Dict[int, int]:
-        return self.user_config['mappings']['buttons']
-
-    @property
-    def gyro_cc_map(self) -> Dict[str, int]:
-        return self.user_config['mappings']['gyro']
-
-    @property
-    def joystick_left_cc_map(self) -> Dict[str, int]:
-        return self.user_config['mappings']['joystick_left']
-
-    @property
-    def joystick_right_cc_map(self) -> Dict[str, int]:
-        return self.user_config['mappings']['joystick_right']
+# Process-wide config snapshot. Modules call get_config() when they need a
+# value instead of holding their own ConfigLoader, so a reload is one swap.
+_current_config = None
+_config_lock = threading.Lock()
 
-    @property
-    def button_names(self) -> Dict[int, str]:
-        return self.ui_config['button_names']
+def get_config() -> ConfigLoader:
+    global _current_config
+    config = _current_config
+    if config is None:
+        with _config_lock:
+            if _current_config is None:
+                _current_config = ConfigLoader()
+            config = _current_config
+    return config
 
-    @property
-    def midi_learn_options(self) -> Dict[int, tuple]:
-        return UIConfig.MIDI_LEARN_OPTIONS
\ No newline at end of file
+def set_config(config: ConfigLoader):
+    """Atomically replace the process-wide snapshot"""
+    global _current_config
+    _current_config = config
@@ -0,0 +1,47 @@
+import threading
+from pathlib import Path
+from mijoco.config.config_loader import ConfigLoader
+from mijoco.utils.inotify import Inotify, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE
+
+# Watches config.yml with inotify. The watcher fd is registered with the event
+# loop; parsing and curve compilation run on a background thread so the loop
+# never stalls, and the finished snapshot is handed to on_reload(config).
+# A file that does not load is reported to on_error(message).
+class ConfigWatcher:
+    def __init__(self, config_path, on_reload, on_error=print):
+        self.config_path = Path(config_path)
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.inotify = Inotify()
+        # Watch the directory: editors often save by renaming a temp file
+        self.inotify.add_watch(self.config_path.parent, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        self.fd = self.inotify.fd
+        self._lock = threading.Lock()
+        self._building = False
+        self._pending = False
+
+    def handle_events(self, _device=None):
+        if any(name == self.config_path.name for _, _, name in self.inotify.read()):
+            with self._lock:
+                if self._building:
+                    self._pending = True
+                    return
+                self._building = True
+            threading.Thread(target=self._build, name="config-reload", daemon=True).start()
+
+    def _build(self):
+        while True:
+            try:
+                config = ConfigLoader(self.config_path)
+            except Exception as e:
+                self.on_error(f"Config reload failed, keeping current settings: {str(e)}")
+            else:
+                self.on_reload(config)
+            with self._lock:
+                if not self._pending:
+                    self._building = False
+                    return
+                self._pending = False
+
+    def close(self):
+        self.inotify.close()
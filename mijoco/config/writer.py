@@ -0,0 +1,72 @@
+import os
+import re
+import yaml
+from pathlib import Path
+from mijoco.config.config_loader import ConfigLoader
+
+# Writes learned rules into config.yml. The file is edited as text so the
+# user's comments and layout survive: each learned rule is one flow-style
+# line in the top-level `rules` list. The result is validated and then
+# swapped in with a rename, so readers see the old file or the new one.
+
+_RULES_KEY = re.compile(r'^rules:\s*(.*?)\s*(#.*)?$')
+
+def format_rule(entry):
+    """One flow-style YAML line, e.g. {controller: Right, device: main, event: [EV_ABS, ABS_RX], action: cc, cc: 30}"""
+    return yaml.safe_dump(dict(entry), default_flow_style=True, sort_keys=False, width=1000).strip()
+
+def _same_input(line, entry):
+    try:
+        item = yaml.safe_load(line.strip()[1:])
+    except yaml.YAMLError:
+        return False
+    if not isinstance(item, dict):
+        return False
+    return all(item.get(key) == entry.get(key) for key in ('controller', 'device', 'event'))
+
+def add_rule_text(text, entry):
+    """config.yml text with entry added to `rules`, replacing a rule for the same input"""
+    rule = format_rule(entry)
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if _RULES_KEY.match(line)), None)
+    if start is None:
+        return text.rstrip('\n') + f"\n\nrules:\n  - {rule}\n"
+    value = _RULES_KEY.match(lines[start]).group(1)
+    if value == '[]':
+        lines[start:start + 1] = ["rules:", f"  - {rule}"]
+        return '\n'.join(lines) + '\n'
+    if value:
+        raise ValueError("learned rules need `rules:` written as a block list (one '- ' item per line)")
+    # The list ends at the next top-level key; its items may sit at column 0
+    end = next((i for i in range(start + 1, len(lines)) if lines[i] and not lines[i][0].isspace()
+                and not lines[i].startswith(('#', '- '))), len(lines))
+    items = [i for i in range(start + 1, end) if lines[i].lstrip().startswith('- ')]
+    # New items use the indent of the existing ones
+    indent = lines[items[0]][:len(lines[items[0]]) - len(lines[items[0]].lstrip())] if items else '  '
+    item = f"{indent}- {rule}"
+    for i in items:
+        if _same_input(lines[i], entry):
+            lines[i] = item
+            return '\n'.join(lines) + '\n'
+    last = max((i for i in range(start, end) if lines[i].strip() and not lines[i].lstrip().startswith('#')))
+    lines.insert(last + 1, item)
+    return '\n'.join(lines) + '\n'
+
+def save_rule(config_path, entry):
+    """Add a rule to config.yml atomically; returns the new snapshot"""
+    config_path = Path(config_path)
+    text = add_rule_text(config_path.read_text(), entry)
+    temp_path = config_path.with_name(f".{config_path.name}.tmp")
+    with open(temp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        # Never swap in a file that does not load. The text is parsed here
+        # rather than loaded from temp_path, which would cache a throwaway file
+        ConfigLoader(config_path, user_config=yaml.safe_load(text) or {})
+        os.replace(temp_path, config_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return ConfigLoader(config_path)
@@ -0,0 +1,150 @@
+from mijoco.config.config_loader import JoyConType, get_config
+from mijoco.devices.handler import ButtonState, InputFrame, SyncState, process_device
+from mijoco.devices.imu import imu_pipeline
+from mijoco.midi.mapper import ControllerMapping
+from mijoco.midi.rules import bind_rules
+
+# One preset bank compiled for one controller: its mapping, dispatch tables
+# and button toggle state, ready to be swapped in
+class ControllerBank:
+    def __init__(self, controller, mapping, button_state=None):
+        self.mapping = mapping
+        if button_state is None:
+            button_state = ButtonState(mapping.button_mappings)
+        else:
+            button_state.remap(mapping.button_mappings, mapping.config.toggle_on, mapping.config.toggle_off)
+        self.button_state = button_state
+        self.dispatch = bind_rules(mapping.rules, controller, button_state)
+        # Actions that send again on release; released when the bank is left
+        self.held_actions = [action for table in self.dispatch.values() for action in table.values()
+                             if action.rule.action in ('momentary', 'note')]
+        # Banks with pitch/roll/yaw rules share the controller's IMU pipeline
+        pipeline = imu_pipeline(mapping, controller.imu_pipeline)
+        if pipeline:
+            controller.imu_pipeline = pipeline
+        self.read_imu = pipeline.process if pipeline else process_device
+
+# One physical controller: its evdev devices, input state and mapping namespace
+class Controller:
+    def __init__(self, joycon_type: JoyConType, main_device, imu_device=None):
+        self.joycon_type = joycon_type
+        self.main = main_device
+        self.imu = imu_device
+        # Bluetooth address, used to recognise the controller when it reconnects
+        self.uniq = getattr(main_device, 'uniq', '') or ''
+        # Roles ('main', 'imu') whose device was lost and awaits reconnection
+        self.missing = set()
+        self.gyro_values = {'x': 0, 'y': 0, 'z': 0}
+        self.joycon_values = {'x': 0, 'y': 0}
+        if joycon_type == JoyConType.PRO:
+            self.joycon_values.update({'rx': 0, 'ry': 0})
+        # Values of rule-mapped axes not shown in the status line
+        self.rule_values = {}
+        # Changes from complete input frames not yet sent, and per-device
+        # frame assembly state
+        self.frame = InputFrame()
+        self.main_sync = SyncState()
+        self.imu_sync = SyncState()
+        # Batched IMU pipeline, created for banks with pitch/roll/yaw rules
+        self.imu_pipeline = None
+        # Every preset bank compiled up front; the active one's mapping,
+        # button state, dispatch tables {(type, code): action} and IMU
+        # reader are copied onto the controller
+        self.banks = [ControllerBank(self, ControllerMapping(joycon_type, config))
+                      for _, config in get_config().banks]
+        self.bank_index = 0
+        self._activate(self.banks[0])
+
+    @property
+    def name(self):
+        return self.joycon_type.value
+
+    @property
+    def devices(self):
+        return [device for role, device in (('main', self.main), ('imu', self.imu))
+                if device and role not in self.missing]
+
+    def close(self):
+        for device in self.devices:
+            device.close()
+
+    def detach(self, role):
+        """Close a device that went away; state and mapping stay for when it returns"""
+        self.missing.add(role)
+        getattr(self, role).close()
+
+    def attach(self, role, device):
+        """Take a (re)connected device for role; returns the device to register"""
+        current = getattr(self, role)
+        if hasattr(current, 'replace'):
+            # Keep wrappers such as the event recorder's in place
+            current.replace(device)
+            device = current
+        setattr(self, role, device)
+        # Skip the first frame and query the device state instead, as after SYN_DROPPED
+        sync = SyncState()
+        sync.dropped = True
+        setattr(self, f"{role}_sync", sync)
+        if role == 'imu' and self.imu_pipeline:
+            self.imu_pipeline.reset()
+        self.missing.discard(role)
+        return device
+
+    def _activate(self, bank):
+        self.mapping = bank.mapping
+        self.button_state = bank.button_state
+        self.dispatch = bank.dispatch
+        self.read_imu = bank.read_imu
+
+    def _drop_pending(self):
+        # Unsent and staged changes belong to the old actions; a partial
+        # frame is replaced by a state query, as after SYN_DROPPED
+        self.frame.clear()
+        for sync in (self.main_sync, self.imu_sync):
+            if sync.pending:
+                sync.pending.clear()
+                sync.dropped = True
+
+    def set_mapping(self, mapping: ControllerMapping):
+        """Recompile the active bank for a new mapping; toggle state of still-mapped buttons is kept"""
+        self._drop_pending()
+        bank = self.banks[self.bank_index] = ControllerBank(self, mapping, self.button_state)
+        self._activate(bank)
+
+    def set_banks(self, mappings):
+        """Recompile every bank after a config reload, keeping each bank's toggle state by position"""
+        self._drop_pending()
+        self.banks = [ControllerBank(self, mapping, self.banks[index].button_state if index < len(self.banks) else None)
+                      for index, mapping in enumerate(mappings)]
+        self.bank_index = min(self.bank_index, len(self.banks) - 1)
+        self._activate(self.banks[self.bank_index])
+
+    def select_bank(self, index):
+        """Switch to another compiled bank: no compiling and no input lost
+
+        Buttons held across the switch stay held; notes and momentary CCs
+        the old bank holds are released into the frame, which the caller
+        sends before changing the MIDI sender's mapping.
+        """
+        old, bank = self.banks[self.bank_index], self.banks[index]
+        held = old.button_state.states
+        states = bank.button_state.states
+        for code in states:
+            states[code] = held.get(code, False)
+        for action in old.held_actions:
+            if action.value != action.released and action.apply(0):
+                self.frame.add(action)
+        # Events staged for the next SYN_REPORT go to the new bank's actions
+        for role, sync in (('main', self.main_sync), ('imu', self.imu_sync)):
+            if sync.pending:
+                table = bank.dispatch[role]
+                sync.pending[:] = [(table[action.rule.key], value) for action, value in sync.pending
+                                   if action.rule.key in table]
+        if bank.read_imu is not old.read_imu:
+            # The pipeline and the event handler keep separate partial frames
+            self.imu_sync.pending.clear()
+            self.imu_sync.dropped = True
+            if self.imu_pipeline:
+                self.imu_pipeline.reset()
+        self.bank_index = index
+        self._activate(bank)
@@ -1,49 +1,103 @@
 import evdev
-import mido
 from mijoco.config.config_loader import JoyConType  # Now using centralized enum
+from mijoco.devices.controller import Controller
+from mijoco.devices.sysfs import list_input_devices
 
-def find_joycon():
-    print("\nSearching for Joy-Con devices...")
-    devices = [evdev.InputDevice(path) for path in evdev.list_devices()]
-    
-    joycon_main = None
-    joycon_imu = None
-    joycon_type = None
-    
-    for device in devices:
-        name = device.name
-        if "Joy-Con (L)" in name:
-            if "(IMU)" in name:
-                joycon_imu = device
-                print(f"Found Left Joy-Con IMU: {name} at {device.path}")
-            else:
-                joycon_main = device
-                joycon_type = JoyConType.LEFT
-                print(f"Found Left Joy-Con Main: {name} at {device.path}")
-        elif "Joy-Con (R)" in name:
-            if "(IMU)" in name:
-                joycon_imu = device
-                print(f"Found Right Joy-Con IMU: {name} at {device.path}")
-            else:
-                joycon_main = device
-                joycon_type = JoyConType.RIGHT
-                print(f"Found Right Joy-Con Main: {name} at {device.path}")
-
-    if not joycon_main or not joycon_imu or not joycon_type:
-        print("\nError: Could not find required Joy-Con devices!")
-        if not joycon_main:
-            print("- Main Joy-Con device missing")
-        if not joycon_imu:
-            print("- IMU Joy-Con device missing")
+# Device name patterns for each supported controller type
+CONTROLLER_NAMES = {
+    JoyConType.LEFT: "Joy-Con (L)",
+    JoyConType.RIGHT: "Joy-Con (R)",
+    JoyConType.PRO: "Pro Controller",
+}
+
+def _controller_type(name):
+    for joycon_type, pattern in CONTROLLER_NAMES.items():
+        if pattern in name:
+            return joycon_type
+    return None
+
+def classify_device(name):
+    """(JoyConType, 'main' or 'imu') for a supported controller's device name, else (None, None)"""
+    joycon_type = _controller_type(name)
+    if not joycon_type:
+        return None, None
+    return joycon_type, 'imu' if "(IMU)" in name else 'main'
+
+def matches_controller(pattern, joycon_type, name, uniq):
+    """Whether pattern selects a controller: its type (Left, Right, Pro), part of its name or its Bluetooth address"""
+    if not pattern:
+        return True
+    pattern = pattern.lower()
+    return (pattern == joycon_type.value.lower() or pattern in name.lower() or
+            pattern == (uniq or '').lower())
+
+def open_device(path):
+    """Open an evdev node; None if it is gone or not accessible (yet)"""
+    try:
+        return evdev.InputDevice(path)
+    except OSError:
+        return None
+
+def find_controllers(pattern=None):
+    """Find every supported controller (or those matching pattern) and pair each main device with its IMU device"""
+    print("\nSearching for controllers...")
+    # Names come from sysfs; only controller nodes are opened
+    devices = list_input_devices()
+
+    mains = []
+    imus = []
+    for path, name, uniq in devices:
+        joycon_type, role = classify_device(name)
+        if not joycon_type or not matches_controller(pattern, joycon_type, name, uniq):
+            continue
+        device = open_device(path)
+        if not device:
+            print(f"Warning: cannot open {name} at {path} (check permissions)")
+            continue
+        if role == 'imu':
+            imus.append((joycon_type, device))
+            print(f"Found {joycon_type.value} IMU: {device.name} at {device.path}")
+        else:
+            mains.append((joycon_type, device))
+            print(f"Found {joycon_type.value} Main: {device.name} at {device.path}")
+
+    controllers = []
+    for joycon_type, main in mains:
+        # The main and IMU nodes of one controller share its Bluetooth address;
+        # fall back to the first unpaired IMU of the same type
+        candidates = [imu for imu_type, imu in imus if imu_type == joycon_type]
+        imu = next((imu for imu in candidates if main.uniq and imu.uniq == main.uniq),
+                   candidates[0] if candidates else None)
+        if imu:
+            imus.remove((joycon_type, imu))
+        else:
+            print(f"Warning: no IMU device found for {joycon_type.value} controller, gyro disabled")
+        controllers.append(Controller(joycon_type, main, imu))
+
+    if not controllers:
+        if pattern:
+            print(f"\nError: Could not find a supported controller matching '{pattern}'!")
+        else:
+            print("\nError: Could not find any supported controller!")
         print("Available devices:")
-        for i, device in enumerate(devices):
-            print(f"  {i}: {device.path} - {device.name}")
+        for i, (path, name, _uniq) in enumerate(devices):
+            print(f"  {i}: {path} - {name}")
+        return []
+
+    print(f"\nDetected: {', '.join(controller.name for controller in controllers)}")
+    return controllers
+
+def find_joycon():
+    """Find a single Joy-Con; returns (main device, IMU device, type) of the last one found"""
+    controllers = [c for c in find_controllers() if c.joycon_type != JoyConType.PRO and c.imu]
+    if not controllers:
         return None, None, None
-    
-    print(f"\n{joycon_type.value} Joy-Con successfully detected!")
-    return joycon_main, joycon_imu, joycon_type
+    controller = controllers[-1]
+    return controller.main, controller.imu, controller.joycon_type
 
 def select_midi_output():
+    import mido
+
     outputs = mido.get_output_names()
     if not outputs:
         print("No MIDI output devices found!")
@@ -66,4 +120,26 @@ def select_midi_output():
                 return device
             print("Invalid selection. Try again.")
         except ValueError:
-            print("Please enter a number or 'q' to quit.")
\ No newline at end of file
+            print("Please enter a number or 'q' to quit.")
+        except EOFError:
+            # No terminal to ask (started from a service or script)
+            print("\nNo MIDI output selected, continuing in preview mode (use --midi-port to choose one)")
+            return None
+
+def open_midi_port(pattern):
+    """Open the first MIDI output whose name contains pattern (case-insensitive)"""
+    import mido
+
+    for name in mido.get_output_names():
+        if pattern.lower() in name.lower():
+            return mido.open_output(name)
+    raise OSError(f"no MIDI output matching '{pattern}'")
+
+def open_midi_input(pattern, callback):
+    """Open the first MIDI input whose name contains pattern; callback runs on mido's thread"""
+    import mido
+
+    for name in mido.get_input_names():
+        if pattern.lower() in name.lower():
+            return mido.open_input(name, callback=callback)
+    raise OSError(f"no MIDI input matching '{pattern}'")
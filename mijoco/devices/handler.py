@@ -1,74 +1,131 @@
 import evdev
-from mijoco.config.config_loader import ConfigLoader
-from .detector import JoyConType
+from mijoco.config.config_loader import get_config
 
-config = ConfigLoader()
-
-# Axis codes
-ABS_X = 0
-ABS_Y = 1
-ABS_RX = 3
-ABS_RY = 4
+EV_SYN = evdev.ecodes.EV_SYN
+EV_ABS = evdev.ecodes.EV_ABS
+EV_KEY = evdev.ecodes.EV_KEY
+SYN_REPORT = evdev.ecodes.SYN_REPORT
+SYN_DROPPED = evdev.ecodes.SYN_DROPPED
 
 class ButtonState:
-    def __init__(self):
-        self.states = {code: False for code in config.button_mappings.keys()}
-        
-        # Get toggle values with defaults in case they're not in config
-        toggle_config = config.config.get('midi', {}).get('toggle', {})
-        toggle_off = toggle_config.get('off', 0)  # Default to 0 if not specified
-        toggle_on = toggle_config.get('on', 127)  # Default to 127 if not specified
-        
-        self.cc_values = {code: toggle_off for code in config.button_mappings.keys()}
+    def __init__(self, button_mappings=None):
+        config = get_config()
+        if button_mappings is None:
+            button_mappings = config.button_mappings
+        self.states = {code: False for code in button_mappings.keys()}
+        self.toggle_on = config.toggle_on
+        self.toggle_off = config.toggle_off
+        self.cc_values = {code: self.toggle_off for code in button_mappings.keys()}
+
+    def remap(self, button_mappings, toggle_on, toggle_off):
+        """Switch to new mappings, keeping the toggle state of buttons that remain mapped"""
+        self.states = {code: self.states.get(code, False) for code in button_mappings.keys()}
+        self.cc_values = {code: toggle_on if self.cc_values.get(code) == self.toggle_on else toggle_off
+                          for code in button_mappings.keys()}
         self.toggle_on = toggle_on
         self.toggle_off = toggle_off
 
-def process_gyro_event(event, gyro_values):
-    if event.code == evdev.ecodes.ABS_X:
-        gyro_values['x'] = event.value
-    elif event.code == evdev.ecodes.ABS_Y:
-        gyro_values['y'] = event.value
-    elif event.code == evdev.ecodes.ABS_Z:
-        gyro_values['z'] = event.value
+# Actions whose value changed since the last send, in arrival order and
+# coalesced over all complete frames: each action is queued at most once
+class InputFrame:
+    def __init__(self):
+        self.actions = []
 
-def process_joystick_event(event, joycon_values, joycon_type: JoyConType):
-    if joycon_type == JoyConType.RIGHT:
-        if event.code == 3:  # ABS_RX
-            joycon_values['x'] = event.value
-        elif event.code == 4:  # ABS_RY
-            joycon_values['y'] = event.value
-    else:
-        if event.code == 0:  # ABS_X
-            joycon_values['x'] = event.value
-        elif event.code == 1:  # ABS_Y
-            joycon_values['y'] = event.value
+    def __bool__(self):
+        return bool(self.actions)
 
-def process_button_event(event, button_state):
-    if event.code in config.button_mappings and event.type == evdev.ecodes.EV_KEY:
-        if event.value == 1:  # Press
-            button_state.cc_values[event.code] = \
-                button_state.toggle_on if button_state.cc_values[event.code] == button_state.toggle_off else button_state.toggle_off
-            button_state.states[event.code] = True
-        elif event.value == 0:  # Release
-            button_state.states[event.code] = False
-        return True
-    return False
+    def add(self, action):
+        if not action.dirty:
+            action.dirty = True
+            self.actions.append(action)
 
-# Process input from IMU and main devices
-def process_devices(joycon_main, joycon_imu, gyro_values, joycon_values, button_state, joycon_type: JoyConType):
-    # Process IMU device events
+    def clear(self):
+        for action in self.actions:
+            action.dirty = False
+        self.actions.clear()
+
+    def take(self, group):
+        """Remove and return the queued actions of one group ('gyro', 'joystick', 'button')"""
+        taken = [action for action in self.actions if action.group == group]
+        if taken:
+            self.actions[:] = [action for action in self.actions if action.group != group]
+            for action in taken:
+                action.dirty = False
+        return taken
+
+# Per-device frame assembly. Events are staged until SYN_REPORT and then
+# applied together; after SYN_DROPPED everything up to the next SYN_REPORT
+# is discarded and the device state is queried instead.
+class SyncState:
+    def __init__(self):
+        self.pending = []
+        self.dropped = False
+        self.frames = 0
+        self.resyncs = 0
+
+def process_device(device, dispatch, sync, frame):
+    """Read pending events of one device; returns (event count, newest frame timestamp)
+
+    Each event costs one lookup in the device's dispatch table; unmapped
+    events are dropped right away and mapped ones staged with their action
+    until SYN_REPORT applies the frame.
+    """
+    count = 0
+    timestamp = None
+    pending = sync.pending
     try:
-        for event in joycon_imu.read():
-            if event.type == evdev.ecodes.EV_ABS:
-                process_gyro_event(event, gyro_values)
+        for event in device.read():
+            count += 1
+            action = dispatch.get((event.type, event.code))
+            if action is not None:
+                if not sync.dropped:
+                    pending.append((action, event.value))
+            elif event.type == EV_SYN:
+                if event.code == SYN_REPORT:
+                    if sync.dropped:
+                        sync.dropped = False
+                        sync.resyncs += 1
+                        _resync(device, dispatch, frame)
+                    else:
+                        for action, value in pending:
+                            if action.apply(value):
+                                frame.add(action)
+                    pending.clear()
+                    sync.frames += 1
+                    timestamp = event.timestamp()
+                elif event.code == SYN_DROPPED:
+                    # The kernel buffer overflowed: this frame is incomplete
+                    sync.dropped = True
+                    pending.clear()
     except BlockingIOError:
         pass
-    # Process main device events
+    return count, timestamp
+
+def _resync(device, dispatch, frame):
+    """After dropped events, apply the device's current state instead"""
     try:
-        for event in joycon_main.read():
-            if event.type == evdev.ecodes.EV_ABS:
-                process_joystick_event(event, joycon_values, joycon_type)
-            elif event.type == evdev.ecodes.EV_KEY:
-                process_button_event(event, button_state)
-    except BlockingIOError:
-        pass
+        active = set(device.active_keys())
+    except (AttributeError, OSError):
+        active = None
+    for (type, code), action in dispatch.items():
+        if type == EV_ABS:
+            try:
+                value = device.absinfo(code).value
+            except (AttributeError, OSError):
+                continue
+        elif type == EV_KEY and active is not None and (code in active) != action.pressed:
+            # A button held now but released in our state was pressed during the gap
+            value = int(code in active)
+        else:
+            continue
+        if action.apply(value):
+            frame.add(action)
+
+# Process input from the IMU and main device of one controller
+def process_controller(controller):
+    imu_count, imu_timestamp = (controller.read_imu(controller.imu, controller.dispatch['imu'],
+                                                   controller.imu_sync, controller.frame)
+                                if controller.imu else (0, None))
+    main_count, main_timestamp = process_device(controller.main, controller.dispatch['main'],
+                                                controller.main_sync, controller.frame)
+    return imu_count + main_count, max(imu_timestamp or 0, main_timestamp or 0) or None
@@ -0,0 +1,22 @@
+from mijoco.devices.sysfs import DEV_INPUT, device_info
+from mijoco.utils.inotify import Inotify, IN_ATTRIB, IN_CREATE
+
+# Watches /dev/input for new event nodes. The watcher fd is registered with
+# the event loop, so a reconnecting controller is seen as soon as the kernel
+# creates its node. udev may only make the node readable a moment later, so
+# attribute changes are reported too and the receiver retries the open.
+class HotplugWatcher:
+    def __init__(self, on_device):
+        self.on_device = on_device
+        self.inotify = Inotify()
+        self.inotify.add_watch(DEV_INPUT, IN_CREATE | IN_ATTRIB)
+        self.fd = self.inotify.fd
+
+    def handle_events(self, _device=None):
+        """Call on_device(path, name, uniq) for every new or changed event node"""
+        for _, _, node in self.inotify.read():
+            if node.startswith('event'):
+                self.on_device(str(DEV_INPUT / node), *device_info(node))
+
+    def close(self):
+        self.inotify.close()
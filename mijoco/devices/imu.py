@@ -0,0 +1,282 @@
+import math
+import os
+import evdev
+from mijoco.devices.handler import EV_ABS, EV_SYN, SYN_DROPPED, SYN_REPORT
+from mijoco.midi.rules import ORIENTATION, ORIENTATION_SCALE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Batched IMU stage for the pitch / roll / yaw rule sources. It replaces the
+# per-event handler for a controller's IMU device: each read burst becomes
+# arrays (read straight from the fd for real devices), frames are assembled
+# with array operations, and the accelerometer and gyroscope are fused and
+# smoothed for the whole burst at once. The cost is a fixed number of NumPy
+# calls per wakeup, not Python work per event.
+#
+# Tilt (pitch, roll) is a complementary filter: the gyroscope is integrated
+# and pulled towards the accelerometer's gravity angle with a time constant.
+# Yaw has no absolute reference and is the integrated gyroscope alone. All
+# three then go through a One-Euro filter, which smooths hard at rest and
+# follows quickly when moving. Both filters are linear recurrences once the
+# speed estimate is known, so every sample of a burst is computed together.
+
+EV_MSC = evdev.ecodes.EV_MSC
+MSC_TIMESTAMP = evdev.ecodes.MSC_TIMESTAMP
+
+# Sample columns: accelerometer x/y/z, then gyroscope x/y/z
+IMU_CODES = (evdev.ecodes.ABS_X, evdev.ecodes.ABS_Y, evdev.ecodes.ABS_Z,
+             evdev.ecodes.ABS_RX, evdev.ecodes.ABS_RY, evdev.ecodes.ABS_RZ)
+# hid-nintendo's resolutions, for devices that report none
+ACCEL_RES = 4096    # Per g
+GYRO_RES = 14247    # Per degree/s
+# Samples per vectorized step (bounds the range of the filter products)
+MAX_BATCH = 32
+# Longest step integrated between two samples, and the step assumed for the first
+MAX_DT = 0.05
+DEFAULT_DT = 0.005
+# Input events per fd read
+READ_EVENTS = 256
+
+if np is not None:
+    # struct input_event
+    EVENT_DTYPE = np.dtype([('sec', 'l'), ('usec', 'l'), ('type', 'H'), ('code', 'H'), ('value', 'i')])
+    # ABS code -> sample column, -1 for other axes
+    _COLUMN = np.full(evdev.ecodes.ABS_CNT, -1)
+    _COLUMN[list(IMU_CODES)] = range(len(IMU_CODES))
+    # Extra column for MSC_TIMESTAMP
+    STAMP = len(IMU_CODES)
+
+def _recurrence(coeff, inputs, initial):
+    """y[n] = coeff[n] * y[n-1] + inputs[n] for a whole batch, from y[-1] = initial
+
+    Unrolled as y[n] = P[n] * (initial + sum of inputs[k] / P[k] up to n),
+    with P the running product of the coefficients. Batches hold at most
+    MAX_BATCH samples and coefficients are at least 1e-6, so P stays well
+    inside the float range.
+    """
+    decay = np.cumprod(np.maximum(coeff, 1e-6), axis=0)
+    return decay * (initial + np.cumsum(inputs / decay, axis=0))
+
+def _alpha(dt, cutoff):
+    """Smoothing factor of a first-order low-pass at cutoff Hz over dt seconds"""
+    r = 2 * math.pi * cutoff * dt
+    return r / (1 + r)
+
+class ImuPipeline:
+    def __init__(self, settings=None):
+        self.reset()
+        self.configure(settings or {})
+
+    def configure(self, settings):
+        """Apply the config's imu section"""
+        self.time_constant = settings.get('tilt_time_constant', 0.5)
+        self.min_cutoff = settings.get('min_cutoff', 1.0)
+        self.beta = settings.get('beta', 0.05)
+        self.d_cutoff = settings.get('d_cutoff', 1.0)
+
+    def reset(self):
+        """Start over, e.g. when the device reconnects"""
+        # Events after the last SYN_REPORT, completed by the next read
+        self.carry = None
+        # Last value of each IMU_CODES column, and the factors to g and degree/s
+        self.state = None
+        self.scale = None
+        self.last_msc = None
+        self.last_time = None
+        # Filter state: fused angles, their smoothed speed and the output
+        self.angles = None
+        self.speed = np.zeros(3)
+        self.filtered = None
+        # Newest pitch, roll and yaw in hundredths of a degree
+        self.orientation = (0, 0, 0)
+
+    def _read(self, device):
+        if type(device) is evdev.InputDevice:
+            # Straight from the fd into an array, no InputEvent objects
+            size = READ_EVENTS * EVENT_DTYPE.itemsize
+            chunks = []
+            while True:
+                try:
+                    data = os.read(device.fd, size)
+                except BlockingIOError:
+                    break
+                chunks.append(data)
+                if len(data) < size:
+                    break
+            return np.frombuffer(b''.join(chunks), EVENT_DTYPE)
+        # Wrapped, recorded or replayed devices
+        try:
+            events = [(event.sec, event.usec, event.type, event.code, event.value) for event in device.read()]
+        except BlockingIOError:
+            events = []
+        return np.array(events, EVENT_DTYPE)
+
+    def _reseed(self, device):
+        """Take the device's current values, as the event handler does after SYN_DROPPED"""
+        state = self.state if self.state is not None else np.zeros(len(IMU_CODES))
+        resolution = [ACCEL_RES] * 3 + [GYRO_RES] * 3
+        for column, code in enumerate(IMU_CODES):
+            try:
+                info = device.absinfo(code)
+            except (AttributeError, OSError):
+                continue
+            state[column] = info.value
+            if info.resolution:
+                resolution[column] = info.resolution
+        self.state = state
+        self.scale = 1 / np.array(resolution, dtype=float)
+        self.last_msc = None
+        self.last_time = None
+
+    def process(self, device, dispatch, sync, frame):
+        """Same contract as handler.process_device: read, apply, return (event count, newest frame timestamp)"""
+        events = self._read(device)
+        count = len(events)
+        if self.carry is not None:
+            events = np.concatenate((self.carry, events))
+            self.carry = None
+        if self.state is None:
+            self._reseed(device)
+        syn = events['type'] == EV_SYN
+        is_report = syn & (events['code'] == SYN_REPORT)
+        reports = np.flatnonzero(is_report)
+        dropped = np.flatnonzero(syn & (events['code'] == SYN_DROPPED))
+        if len(dropped):
+            sync.dropped = True
+            reports = reports[reports > dropped[-1]]
+        if not len(reports):
+            if not sync.dropped:
+                self.carry = events
+            return count, None
+        start, end = 0, reports[-1] + 1
+        if end < len(events):
+            self.carry = events[end:]
+        if sync.dropped:
+            # The frame up to the first report is incomplete: use the device state instead
+            sync.dropped = False
+            sync.resyncs += 1
+            self._reseed(device)
+            start = reports[0] + 1
+        last = events[end - 1]
+        timestamp = float(last['sec']) + last['usec'] * 1e-6
+        frames = np.count_nonzero(is_report[start:end])
+        if frames:
+            self._fuse(*self._assemble(events[start:end], is_report[start:end], frames))
+        self.last_time = timestamp
+        sync.frames += frames + (start > 0)
+        self._apply(dispatch, frame)
+        return count, timestamp
+
+    def _assemble(self, events, is_report, n):
+        """Per-frame samples (n, 6) and time steps (n,) from complete frames"""
+        frame_index = np.cumsum(is_report) - is_report
+        types, codes = events['type'], events['code']
+        columns = np.where(types == EV_ABS, _COLUMN.take(codes, mode='clip'), -1)
+        columns[(types == EV_MSC) & (codes == MSC_TIMESTAMP)] = STAMP
+        selected = np.flatnonzero(columns >= 0)
+
+        # Row 0 holds the previous state; the driver only sends changed axes,
+        # so missing values are carried forward from the row that had one
+        samples = np.full((n + 1, STAMP + 1), np.nan)
+        samples[0, :STAMP] = self.state
+        if self.last_msc is not None:
+            samples[0, STAMP] = self.last_msc
+        samples[frame_index[selected] + 1, columns[selected]] = events['value'][selected]
+        missing = np.isnan(samples)
+        if missing[1:].any():
+            rows = np.where(missing, 0, np.arange(n + 1)[:, None])
+            np.maximum.accumulate(rows, axis=0, out=rows)
+            samples = np.take_along_axis(samples, rows, axis=0)
+
+        # Sample times: the driver's MSC_TIMESTAMP (µs, wraps at 32 bits),
+        # since the samples of one report share its event time
+        stamps = samples[:, STAMP]
+        if not np.isnan(stamps[1:]).any():
+            if np.isnan(stamps[0]):
+                stamps[0] = stamps[1] - DEFAULT_DT * 1e6
+            dt = np.mod(np.diff(stamps), 2 ** 32) * 1e-6
+            self.last_msc = stamps[-1]
+        else:
+            reports = events[is_report]
+            times = reports['sec'] + reports['usec'] * 1e-6
+            dt = np.diff(times, prepend=times[0] - DEFAULT_DT if self.last_time is None else self.last_time)
+        self.state = samples[-1, :STAMP]
+        return samples[1:, :STAMP], np.clip(dt, 0.0, MAX_DT)
+
+    def _fuse(self, samples, dt):
+        for start in range(0, len(samples), MAX_BATCH):
+            self._fuse_batch(samples[start:start + MAX_BATCH], dt[start:start + MAX_BATCH])
+
+    def _fuse_batch(self, samples, dt):
+        n = len(samples)
+        scaled = samples * self.scale
+        if self.angles is None:
+            self.angles = np.zeros(3)
+            self.angles[0] = math.degrees(math.atan2(-scaled[0, 0], math.hypot(scaled[0, 1], scaled[0, 2])))
+            self.angles[1] = math.degrees(math.atan2(scaled[0, 1], scaled[0, 2]))
+        dt = dt[:, None]
+
+        # Gravity angles from the accelerometer
+        tilt = np.empty((n, 2))
+        tilt[:, 0] = np.arctan2(-scaled[:, 0], np.hypot(scaled[:, 1], scaled[:, 2]))
+        tilt[:, 1] = np.arctan2(scaled[:, 1], scaled[:, 2])
+        tilt *= 180 / math.pi
+
+        # Gyroscope steps: pitch turns about the y axis, roll about x, yaw about z
+        inputs = scaled[:, [4, 3, 5]] * dt
+        k = self.time_constant / (self.time_constant + dt)
+        coeff = np.ones((n, 3))
+        coeff[:, :2] = k
+        inputs[:, :2] *= k
+        inputs[:, :2] += (1 - k) * tilt
+        angles = _recurrence(coeff, inputs, self.angles)
+
+        # One-Euro filter; the speed is taken from the unfiltered angles,
+        # which keeps it a linear recurrence
+        speed = np.empty((n, 3))
+        speed[0] = angles[0] - self.angles
+        speed[1:] = angles[1:] - angles[:-1]
+        speed /= np.maximum(dt, 1e-3)
+        a = _alpha(dt, self.d_cutoff)
+        speed = _recurrence(np.repeat(1 - a, 3, axis=1), a * speed, self.speed)
+        a = _alpha(dt, self.min_cutoff + self.beta * np.abs(speed))
+        filtered = _recurrence(1 - a, a * angles, angles[0] if self.filtered is None else self.filtered)
+
+        self.angles = angles[-1]
+        self.speed = speed[-1]
+        self.filtered = filtered[-1]
+
+    def _apply(self, dispatch, frame):
+        """Hand the newest values to the rule actions, like a frame of events"""
+        if self.filtered is not None:
+            pitch, roll, yaw = self.filtered.tolist()
+            yaw = (yaw + 180) % 360 - 180
+            self.orientation = tuple(round(value * ORIENTATION_SCALE) for value in (pitch, roll, yaw))
+            for code, value in enumerate(self.orientation):
+                action = dispatch.get((ORIENTATION, code))
+                if action is not None and action.apply(value):
+                    frame.add(action)
+        # Raw axes keep working as plain EV_ABS rules
+        for code, value in zip(IMU_CODES, self.state.tolist()):
+            action = dispatch.get((EV_ABS, code))
+            if action is not None and action.apply(int(value)):
+                frame.add(action)
+
+_numpy_reported = False
+
+def imu_pipeline(mapping, current=None):
+    """The pipeline for a mapping whose rules use pitch/roll/yaw, else None"""
+    global _numpy_reported
+    if not any(rule.type == ORIENTATION for rule in mapping.rules['imu'].values()):
+        return None
+    if np is None:
+        if not _numpy_reported:
+            print("pitch/roll/yaw rules need numpy (pip install numpy); they stay inactive")
+            _numpy_reported = True
+        return None
+    pipeline = current or ImuPipeline()
+    pipeline.configure(mapping.config.imu)
+    return pipeline
@@ -0,0 +1,250 @@
+import os
+import struct
+import threading
+import time
+from collections import deque
+from evdev.events import InputEvent
+from mijoco.config.config_loader import JoyConType
+from mijoco.devices.controller import Controller
+
+# Binary event log:
+#   header  : magic, device count (u16), then per device: role (u8, 0 main /
+#             1 IMU), name length (u8), controller type (utf-8)
+#   records : timestamp ns (i64), device index (u16), flags (u8), type (u16),
+#             code (u16), value (i32), little endian, fixed width
+MAGIC = b'MJREC\x00\x01\x00'
+RECORD = struct.Struct('<qHBHHi')
+ROLE_MAIN = 0
+ROLE_IMU = 1
+# Set on the first event of each device read, so replay can rebuild the
+# original read batches exactly
+FLAG_BATCH_START = 1
+
+# Wraps an evdev device and appends every event it yields to the log
+class RecordingDevice:
+    def __init__(self, device, recorder, index):
+        self.device = device
+        self.recorder = recorder
+        self.index = index
+        self.fd = device.fd
+        self.name = device.name
+        self.path = device.path
+
+    def read(self):
+        write = self.recorder.write
+        index = self.index
+        flags = FLAG_BATCH_START
+        for event in self.device.read():
+            write(index, flags, event)
+            flags = 0
+            yield event
+
+    def replace(self, device):
+        """Record from a reconnected device under the same index"""
+        self.device = device
+        self.fd = device.fd
+
+    # State queries used to resync after SYN_DROPPED
+    def absinfo(self, code):
+        return self.device.absinfo(code)
+
+    def active_keys(self):
+        return self.device.active_keys()
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        self.device.close()
+
+# Records are queued on the loop thread and written by a background thread,
+# so the loop never waits for the file
+class EventRecorder:
+    def __init__(self, path, controllers, flush_interval=1.0):
+        self.file = open(path, 'wb')
+        self.count = 0
+        self.queue = deque()
+        devices = []
+        for controller in controllers:
+            for role, attr in ((ROLE_MAIN, 'main'), (ROLE_IMU, 'imu')):
+                device = getattr(controller, attr)
+                if device is None:
+                    continue
+                setattr(controller, attr, RecordingDevice(device, self, len(devices)))
+                devices.append((role, controller.joycon_type.value.encode()))
+
+        header = MAGIC + struct.pack('<H', len(devices))
+        for role, name in devices:
+            header += struct.pack('<BB', role, len(name)) + name
+        self.file.write(header)
+
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="event-recorder", daemon=True)
+        self.thread.start()
+
+    def write(self, index, flags, event):
+        self.queue.append(RECORD.pack(event.sec * 1000000000 + event.usec * 1000,
+                                      index, flags, event.type, event.code, event.value))
+        self.count += 1
+
+    def flush(self):
+        """Write out the queued records; runs on the writer thread"""
+        queue = self.queue
+        records = [queue.popleft() for _ in range(len(queue))]
+        if records:
+            self.file.write(b''.join(records))
+            self.file.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+        self.file.close()
+
+def load_recording(path):
+    """Return ([(role, JoyConType)], [(timestamp_ns, device, flags, type, code, value)])"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a MiJoCo event recording")
+    offset = len(MAGIC)
+    (device_count,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    devices = []
+    for _ in range(device_count):
+        role, length = struct.unpack_from('<BB', data, offset)
+        offset += 2
+        devices.append((role, JoyConType(data[offset:offset + length].decode())))
+        offset += length
+    # A crash can leave a partial final record; ignore it
+    end = offset + (len(data) - offset) // RECORD.size * RECORD.size
+    return devices, list(RECORD.iter_unpack(data[offset:end]))
+
+# Stand-in for an evdev device that yields replayed events. A pipe provides a
+# real fd, so the engine's selector treats it like a device node.
+class ReplayDevice:
+    def __init__(self, name, index):
+        self.name = name
+        self.path = f"replay:{index}"
+        self.fd, self._notify_fd = os.pipe()
+        os.set_blocking(self.fd, False)
+        os.set_blocking(self._notify_fd, False)
+        self.events = deque()
+        # Set once a read has taken every queued event
+        self.drained = None
+
+    def push_batch(self, events):
+        """Queue one recorded read of (type, code, value) events and wake the reader once"""
+        # Stamp with the replay time so latency measurements stay meaningful
+        now = time.time_ns()
+        sec, usec = now // 1000000000, now % 1000000000 // 1000
+        self.events.extend(InputEvent(sec, usec, type, code, value) for type, code, value in events)
+        try:
+            os.write(self._notify_fd, b'\0')
+        except BlockingIOError:
+            pass
+
+    def read(self):
+        try:
+            os.read(self.fd, 65536)
+        except BlockingIOError:
+            pass
+        if not self.events:
+            raise BlockingIOError
+        # Only yield what is queued now; later pushes belong to the next read
+        events = self.events
+        for _ in range(len(events)):
+            yield events.popleft()
+        if self.drained and not events:
+            self.drained.set()
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        for fd in (self.fd, self._notify_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+def replay_controllers(devices):
+    """Build controllers backed by ReplayDevices; returns (controllers, devices by index)"""
+    replay_devices = []
+    controllers = []
+    for index, (role, joycon_type) in enumerate(devices):
+        suffix = " (IMU)" if role == ROLE_IMU else ""
+        device = ReplayDevice(f"Replay {joycon_type.value}{suffix}", index)
+        replay_devices.append(device)
+        if role == ROLE_MAIN:
+            controllers.append(Controller(joycon_type, device))
+        elif controllers:
+            # The recorder writes each IMU right after its main device
+            controllers[-1].imu = device
+    return controllers, replay_devices
+
+# Feeds recorded events into ReplayDevices from a background thread, either
+# with the original timing or as fast as the engine consumes them. Each
+# recorded read is queued as a whole and read in one go, so read batches are
+# reproduced exactly in both modes.
+class Replayer:
+    def __init__(self, records, devices, realtime=True, on_done=None):
+        self.records = records
+        self.devices = devices
+        self.realtime = realtime
+        self.on_done = on_done
+        self.thread = threading.Thread(target=self._run, name="replay", daemon=True)
+        self.stopped = False
+        self.drained = threading.Event()
+        for device in devices:
+            device.drained = self.drained
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.drained.set()
+
+    def _batches(self):
+        """(timestamp, device index, [(type, code, value)]) for every recorded read"""
+        batch = None
+        for timestamp, index, flags, type, code, value in self.records:
+            if batch is None or flags & FLAG_BATCH_START or index != batch[1]:
+                if batch:
+                    yield batch
+                batch = (timestamp, index, [])
+            batch[2].append((type, code, value))
+        if batch:
+            yield batch
+
+    def _wait_drained(self):
+        """Block until the engine has read everything pushed so far"""
+        while not self.stopped:
+            self.drained.clear()
+            if not any(device.events for device in self.devices):
+                return
+            self.drained.wait(0.1)
+
+    def _run(self):
+        first = None
+        start = time.monotonic_ns()
+        for timestamp, index, events in self._batches():
+            if self.stopped:
+                break
+            if self.realtime:
+                if first is None:
+                    first = timestamp
+                delay = (timestamp - first) - (time.monotonic_ns() - start)
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+            # Every batch is read on its own, in the recorded order
+            self._wait_drained()
+            self.devices[index].push_batch(events)
+        if self.on_done:
+            self.on_done()
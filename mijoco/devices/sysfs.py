@@ -0,0 +1,22 @@
+from pathlib import Path
+
+# Input device discovery through sysfs: names and Bluetooth addresses are
+# read from /sys/class/input, so no device node is opened just to look at it
+SYS_CLASS_INPUT = Path('/sys/class/input')
+DEV_INPUT = Path('/dev/input')
+
+def _read_attribute(path):
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return ''
+
+def device_info(node):
+    """(name, uniq) of /dev/input/<node>"""
+    device = SYS_CLASS_INPUT / node / 'device'
+    return _read_attribute(device / 'name'), _read_attribute(device / 'uniq')
+
+def list_input_devices():
+    """[(path, name, uniq)] for every event node, in node order"""
+    nodes = sorted((entry.name for entry in SYS_CLASS_INPUT.glob('event*')), key=lambda node: int(node[5:]))
+    return [(str(DEV_INPUT / node), *device_info(node)) for node in nodes]
@@ -0,0 +1,85 @@
+import time
+from mijoco.engine.instrumentation import Histogram
+from mijoco.utils.timerfd import TimerFd
+
+# Fixed-rate output clock. Ticks come from a timerfd registered with the
+# event loop: the kernel keeps the deadline grid (start + n * period), so
+# there is no sleep and no drift, and a late wakeup reports how many ticks
+# it covers instead of firing a burst. Without timerfd the loop's own
+# timers are used, which wake with millisecond resolution.
+class OutputClock:
+    def __init__(self, loop, rate, on_tick):
+        self.loop = loop
+        self.on_tick = on_tick
+        self.timer = None
+        self.loop_timer = None
+        try:
+            self.timer = TimerFd()
+            loop.add_device(self.timer, self._on_timerfd)
+        except OSError as e:
+            print(f"timerfd unavailable ({e.strerror}), output clock uses loop timers")
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Start (or restart) ticking at rate Hz; statistics start over"""
+        self.rate = rate
+        self.period_ns = int(1e9 / rate)
+        self.ticks = 0
+        self.missed = 0
+        self.jitter = Histogram()
+        self.start_ns = time.monotonic_ns()
+        self.deadline_ns = self.start_ns + self.period_ns
+        if self.timer:
+            self.timer.set_interval(self.period_ns)
+        elif self.loop_timer:
+            self.loop.set_timer_interval(self.loop_timer, 1.0 / rate)
+        else:
+            self.loop_timer = self.loop.add_timer(1.0 / rate, self._on_loop_timer)
+
+    def _on_timerfd(self, timer):
+        expirations = timer.read()
+        if expirations:
+            self._tick(expirations)
+
+    def _on_loop_timer(self):
+        late = time.monotonic_ns() - self.deadline_ns
+        self._tick(late // self.period_ns + 1 if late > 0 else 1)
+
+    def _tick(self, expirations):
+        # The most recent deadline that passed is the one this tick serves
+        deadline = self.deadline_ns + (expirations - 1) * self.period_ns
+        self.jitter.record(max(0, time.monotonic_ns() - deadline))
+        self.deadline_ns = deadline + self.period_ns
+        self.missed += expirations - 1
+        self.ticks += 1
+        self.on_tick()
+
+    def report(self):
+        elapsed = (time.monotonic_ns() - self.start_ns) / 1e9
+        jitter = self.jitter.summary()
+        return {
+            'rate_hz': self.rate,
+            'achieved_hz': self.ticks / elapsed if elapsed else 0.0,
+            'ticks': self.ticks,
+            'missed_ticks': self.missed,
+            'jitter_p50_ms': jitter['p50_ms'],
+            'jitter_p99_ms': jitter['p99_ms'],
+            'jitter_max_ms': jitter['max_ms'],
+            'timer': 'timerfd' if self.timer else 'loop',
+        }
+
+    def close(self):
+        if self.timer:
+            self.loop.remove_device(self.timer)
+            self.timer.close()
+            self.timer = None
+        if self.loop_timer:
+            self.loop.remove_timer(self.loop_timer)
+            self.loop_timer = None
+
+def print_clock_report(report):
+    print(f"\nOutput clock ({report['timer']}):")
+    print(f"  Rate           : {report['achieved_hz']:.1f} Hz achieved of {report['rate_hz']} Hz "
+          f"({report['ticks']} ticks, {report['missed_ticks']} missed)")
+    print(f"  Tick jitter    : p50 {report['jitter_p50_ms']:.3f} ms | p99 {report['jitter_p99_ms']:.3f} ms | "
+          f"max {report['jitter_max_ms']:.3f} ms")
@@ -0,0 +1,104 @@
+"""Local control socket.
+
+Clients connect to a Unix socket, send one command line and get one JSON reply.
+Query it from a shell with:
+    python -m mijoco.engine.control stats
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"mijoco-{os.getuid()}.sock")
+
+# Served from the event loop: the listening socket and each client are
+# registered as readable fds, so there is no extra thread
+class ControlServer:
+    def __init__(self, loop, path=None):
+        self.loop = loop
+        self.path = path or default_socket_path()
+        self.commands = {}
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(4)
+        self.fd = self.sock.fileno()
+        loop.add_device(self, self._accept)
+
+    def register(self, command, handler):
+        """handler(*args) returns a JSON-serializable reply"""
+        self.commands[command] = handler
+
+    def _accept(self, _device):
+        try:
+            conn, _ = self.sock.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        client = _Client(conn)
+        self.loop.add_device(client, self._read)
+
+    def _read(self, client):
+        try:
+            data = client.conn.recv(4096)
+        except BlockingIOError:
+            return
+        client.buffer += data
+        if data and b'\n' not in client.buffer:
+            return
+        self.loop.remove_device(client)
+        line = client.buffer.split(b'\n', 1)[0].decode(errors='replace').split()
+        reply = self._dispatch(line)
+        try:
+            client.conn.settimeout(0.1)
+            client.conn.sendall(json.dumps(reply).encode() + b'\n')
+        except OSError:
+            pass
+        client.conn.close()
+
+    def _dispatch(self, line):
+        if not line:
+            return {'error': 'empty command', 'commands': sorted(self.commands)}
+        handler = self.commands.get(line[0])
+        if not handler:
+            return {'error': f"unknown command '{line[0]}'", 'commands': sorted(self.commands)}
+        try:
+            return handler(*line[1:])
+        except Exception as e:
+            return {'error': str(e)}
+
+    def close(self):
+        self.loop.remove_device(self)
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class _Client:
+    def __init__(self, conn):
+        self.conn = conn
+        self.fd = conn.fileno()
+        self.buffer = b''
+
+def send_command(command, path=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(2.0)
+        sock.connect(path or default_socket_path())
+        sock.sendall(command.encode() + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+if __name__ == "__main__":
+    print(json.dumps(send_command(' '.join(sys.argv[1:]) or 'stats'), indent=2))
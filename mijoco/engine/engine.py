@@ -0,0 +1,381 @@
+from mijoco.config.config_loader import get_config, set_config
+from mijoco.config.watcher import ConfigWatcher
+from mijoco.devices.controller import Controller
+from mijoco.devices.detector import classify_device, matches_controller, open_device
+from mijoco.devices.handler import process_device
+from mijoco.devices.hotplug import HotplugWatcher
+from mijoco.devices.sysfs import DEV_INPUT, list_input_devices
+from mijoco.engine.clock import OutputClock
+from mijoco.engine.control import ControlServer
+from mijoco.engine.event_loop import EventLoop
+from mijoco.engine.shared_state import StatePublisher
+from mijoco.engine.stats import LoopStats
+from mijoco.midi.banks import BankSwitcher
+from mijoco.midi.live_learn import LiveLearn
+from mijoco.midi.mapper import ControllerMapping
+from mijoco.midi.sender import MidiSender, send_midi_buttons, send_midi_frame
+
+# Input-to-MIDI engine: every controller device is registered with one event
+# loop and all controllers share one MIDI output
+class Engine:
+    def __init__(self, controllers, midi_out, gyro_enabled, joystick_enabled, instrumentation=None):
+        self.controllers = []
+        self.midi_out = midi_out
+        self.gyro_enabled = gyro_enabled
+        self.joystick_enabled = joystick_enabled
+        self.loop = EventLoop()
+        self.stats = LoopStats()
+        self.midi_senders = []
+        self.controller_stats = []
+        self.reload_listeners = []
+        # Called with (controller, message) when a device is lost or attached
+        self.device_listeners = []
+        # Called with messages from output sessions and the config watcher;
+        # listeners must be thread-safe (both the display and NoticeWriter are)
+        self.notice_listeners = []
+        self.device_callbacks = {}
+        self.flush_timer = None
+        # Fixed-rate output clock for axes (midi.output.clock_rate), or None
+        self.clock = None
+        # MIDI learn while running (button combo or the 'learn' command)
+        self.learn = LiveLearn(self, get_config().user_config.get('learn'))
+        # Preset bank switching (button combos, Program Change, 'bank' command)
+        self.banks = BankSwitcher(self, get_config().bank_settings)
+        # Controller state for other local processes (--state-file), or None
+        self.publisher = None
+        # Standard MIDI File of everything sent (--record-midi), or None
+        self.midi_recorder = None
+        self.watcher = None
+        self.hotplug = None
+        # Hotplugged controllers are only added when they match (--controller)
+        self.controller_pattern = None
+        self.control = None
+        self.instrumentation = instrumentation
+        if instrumentation:
+            self.loop.iteration_histogram = instrumentation.histograms['loop']
+        if hasattr(midi_out, 'attach_loop'):
+            # Network sessions handle their handshake on the loop
+            midi_out.attach_loop(self.loop, self.notify)
+        for controller in controllers:
+            self.add_controller(controller)
+        self._update_flush_timer()
+        self._update_clock(get_config())
+
+    def notify(self, message):
+        """Hand a message to the notice listeners; printed directly only before any is attached"""
+        if not self.notice_listeners:
+            print(message)
+        for listener in self.notice_listeners:
+            listener(message)
+
+    def add_controller(self, controller):
+        if controller.bank_index != self.banks.index:
+            controller.select_bank(self.banks.index)
+        midi_sender = MidiSender(self.midi_out, controller.mapping)
+        if self.midi_recorder:
+            midi_sender.set_recorder(self.midi_recorder)
+        latency_stats = LoopStats()
+        self.controllers.append(controller)
+        self.midi_senders.append(midi_sender)
+        self.controller_stats.append(latency_stats)
+        if self.instrumentation:
+            self.instrumentation.instrument_sender(midi_sender)
+            on_imu, on_main = self._instrumented_callbacks(controller, midi_sender, latency_stats)
+        else:
+            on_imu, on_main = self._callbacks(controller, midi_sender, latency_stats)
+        self.device_callbacks[controller] = {'imu': on_imu, 'main': on_main}
+
+        for role, device in (('imu', controller.imu), ('main', controller.main)):
+            if device and role not in controller.missing:
+                self.loop.add_device(device, self.device_callbacks[controller][role])
+        if self.publisher:
+            self.publisher.publish(controller)
+
+    def _send(self, controller, midi_sender):
+        send_midi_frame(midi_sender, controller.frame, self.gyro_enabled and controller.imu is not None,
+                        self.joystick_enabled)
+
+    def _send_input(self, controller, midi_sender):
+        """Send after input, or with the output clock only buttons; returns whether anything was sent"""
+        if self.clock:
+            return send_midi_buttons(midi_sender, controller.frame) > 0
+        self._send(controller, midi_sender)
+        return True
+
+    def _callbacks(self, controller, midi_sender, latency_stats):
+        learn = self.learn
+        banks = self.banks
+        # Every device fd gets its own callback bound to its controller, so a
+        # wakeup only reads and sends for the device that has input pending
+        def on_input(event_count, event_timestamp):
+            self.stats.record_wakeup(event_count)
+            # Only complete frames that changed something produce MIDI
+            if controller.frame:
+                if self.publisher:
+                    self.publisher.publish(controller)
+                if self.midi_out and self._send_input(controller, midi_sender) and event_timestamp:
+                    self.stats.record_send(event_timestamp)
+                    latency_stats.record_send(event_timestamp)
+            if learn.combo:
+                learn.check_combo(controller)
+            if banks.combos:
+                banks.check_combo(controller)
+
+        def on_imu(device):
+            try:
+                result = controller.read_imu(device, controller.dispatch['imu'], controller.imu_sync, controller.frame)
+            except OSError:
+                self.device_lost(controller, 'imu')
+                return
+            on_input(*result)
+
+        def on_main(device):
+            try:
+                result = process_device(device, controller.dispatch['main'], controller.main_sync, controller.frame)
+            except OSError:
+                self.device_lost(controller, 'main')
+                return
+            on_input(*result)
+
+        return on_imu, on_main
+
+    def _instrumented_callbacks(self, controller, midi_sender, latency_stats):
+        instrumentation = self.instrumentation
+        learn = self.learn
+        banks = self.banks
+
+        def on_input(event_count, event_timestamp):
+            self.stats.record_wakeup(event_count)
+            if controller.frame:
+                if self.publisher:
+                    self.publisher.publish(controller)
+                if self.midi_out and instrumentation.time_send(self._send_input, controller, midi_sender) \
+                        and event_timestamp:
+                    instrumentation.record_input_to_send(event_timestamp)
+                    self.stats.record_send(event_timestamp)
+                    latency_stats.record_send(event_timestamp)
+            if learn.combo:
+                learn.check_combo(controller)
+            if banks.combos:
+                banks.check_combo(controller)
+
+        def on_imu(device):
+            try:
+                result = instrumentation.time_read(controller.read_imu, device, controller.dispatch['imu'],
+                                                   controller.imu_sync, controller.frame)
+            except OSError:
+                self.device_lost(controller, 'imu')
+                return
+            on_input(*result)
+
+        def on_main(device):
+            try:
+                result = instrumentation.time_read(process_device, device, controller.dispatch['main'],
+                                                   controller.main_sync, controller.frame)
+            except OSError:
+                self.device_lost(controller, 'main')
+                return
+            on_input(*result)
+
+        return on_imu, on_main
+
+    def device_lost(self, controller, role):
+        """A read failed (Bluetooth link dropped): stop watching the device until it reconnects"""
+        self.loop.remove_device(getattr(controller, role))
+        controller.detach(role)
+        if self.publisher:
+            self.publisher.publish(controller)
+        self._notify_device(controller, f"{controller.name} {role} device disconnected, waiting for it to reconnect")
+
+    def _notify_device(self, controller, message):
+        for listener in self.device_listeners:
+            listener(controller, message)
+
+    def attach_device(self, controller, role, device):
+        device = controller.attach(role, device)
+        self.loop.add_device(device, self.device_callbacks[controller][role])
+        if self.publisher:
+            self.publisher.publish(controller)
+        self._notify_device(controller, f"{controller.name} {role} device connected")
+
+    def _waiting_controller(self, joycon_type, role, uniq):
+        """The controller a new device belongs to: same type, a free role and a matching address"""
+        candidates = [c for c in self.controllers if c.joycon_type == joycon_type and
+                      (role in c.missing or getattr(c, role) is None)]
+        exact = [c for c in candidates if uniq and c.uniq == uniq]
+        return (exact or [c for c in candidates if not uniq or not c.uniq] or [None])[0]
+
+    def _device_added(self, path, name, uniq):
+        joycon_type, role = classify_device(name)
+        if not joycon_type or not matches_controller(self.controller_pattern, joycon_type, name, uniq):
+            return
+        if any(getattr(device, 'path', None) == path for c in self.controllers for device in c.devices):
+            return  # Already attached; this is a later attribute change
+        controller = self._waiting_controller(joycon_type, role, uniq)
+        if not controller and role == 'imu':
+            return  # Picked up together with its main device
+        # Fails until udev has set the node's permissions; IN_ATTRIB retries
+        device = open_device(path)
+        if not device:
+            return
+        if controller:
+            self.attach_device(controller, role, device)
+            return
+        # A controller that was not there at startup
+        controller = Controller(joycon_type, device)
+        in_use = {getattr(device, 'path', None) for c in self.controllers for device in c.devices}
+        for imu_path, imu_name, imu_uniq in list_input_devices():
+            if (classify_device(imu_name) == (joycon_type, 'imu') and imu_path not in in_use and
+                    (not uniq or imu_uniq == uniq)):
+                controller.imu = open_device(imu_path)
+                break
+        self.add_controller(controller)
+        self._update_flush_timer()
+        self._notify_device(controller, f"{controller.name} controller connected")
+
+    def watch_devices(self):
+        """Reattach controllers that reconnect, and pick up new ones"""
+        try:
+            self.hotplug = HotplugWatcher(self._device_added)
+        except OSError as e:
+            print(f"Hotplug disabled: cannot watch {DEV_INPUT}: {e.strerror}")
+            return
+        self.loop.add_device(self.hotplug, self.hotplug.handle_events)
+
+    def flush(self):
+        for midi_sender in self.midi_senders:
+            if midi_sender.flush_interval:
+                midi_sender.flush()
+
+    def _update_flush_timer(self):
+        intervals = [s.flush_interval for s in self.midi_senders if s.flush_interval] if self.midi_out else []
+        if not intervals:
+            if self.flush_timer:
+                self.loop.remove_timer(self.flush_timer)
+                self.flush_timer = None
+        elif self.flush_timer:
+            self.loop.set_timer_interval(self.flush_timer, min(intervals))
+        else:
+            self.flush_timer = self.loop.add_timer(min(intervals), self.flush)
+
+    def _tick(self):
+        """Output clock tick: send the latest value of every axis that changed"""
+        for controller, midi_sender in zip(self.controllers, self.midi_senders):
+            if controller.frame:
+                self._send(controller, midi_sender)
+
+    def _update_clock(self, config):
+        rate = config.config['midi'].get('output', {}).get('clock_rate', 0) if self.midi_out else 0
+        if not rate:
+            if self.clock:
+                self.clock.close()
+                self.clock = None
+        elif self.clock:
+            if rate != self.clock.rate:
+                self.clock.set_rate(rate)
+        else:
+            self.clock = OutputClock(self.loop, rate, self._tick)
+
+    def apply_config(self, config):
+        """Swap in a new config snapshot; runs on the loop thread between wakeups"""
+        set_config(config)
+        for controller, midi_sender in zip(self.controllers, self.midi_senders):
+            controller.set_banks([ControllerMapping(controller.joycon_type, bank_config)
+                                  for _, bank_config in config.banks])
+            midi_sender.set_mapping(controller.mapping)
+        self._update_flush_timer()
+        self._update_clock(config)
+        self.banks.configure(config.bank_settings)
+        self.learn.configure(config.user_config.get('learn') or {})
+        if self.learn.armed:
+            self.learn.capture()
+        for listener in self.reload_listeners:
+            listener(config)
+
+    def select_bank(self, index):
+        """Make a precompiled preset bank active on every controller; runs on the loop thread"""
+        for controller, midi_sender in zip(self.controllers, self.midi_senders):
+            if controller.bank_index == index:
+                continue
+            controller.select_bank(index)
+            # Changes the old bank has not sent yet, and its releases, go out on its channel
+            if controller.frame and self.midi_out:
+                self._send(controller, midi_sender)
+            midi_sender.select_mapping(controller.mapping)
+            if self.publisher:
+                self.publisher.publish(controller)
+
+    def watch_config(self, config_path=None):
+        """Hot-reload config.yml when it changes on disk"""
+        config_path = config_path or get_config().config_path
+        self.watcher = ConfigWatcher(config_path,
+                                     lambda config: self.loop.call_soon_threadsafe(self.apply_config, config),
+                                     self.notify)
+        self.loop.add_device(self.watcher, self.watcher.handle_events)
+
+    def serve_control(self, path=None):
+        """Open the local control socket; 'stats' returns the latency report"""
+        self.control = ControlServer(self.loop, path)
+        if self.instrumentation:
+            self.control.register('stats', self.instrumentation.report)
+        else:
+            self.control.register('stats', lambda: {'error': 'instrumentation is off (start with --instrument)'})
+        self.control.register('clock', lambda: self.clock.report() if self.clock else
+                              {'error': 'output clock is off (set midi.output.clock_rate)'})
+        self.control.register('learn', self.learn.command)
+        self.control.register('bank', self.banks.command)
+        if self.midi_recorder:
+            # Ring occupancy and overruns of the MIDI file recorder
+            self.control.register('recorder', self.midi_recorder.counters)
+        if hasattr(self.midi_out, 'counters'):
+            # Queue depth and drops of each fan-out port
+            self.control.register('outputs', self.midi_out.counters)
+        return self.control
+
+    def publish_state(self, path=None):
+        """Share every controller's state through a memory-mapped file other processes can read"""
+        self.publisher = StatePublisher(path)
+        for controller in self.controllers:
+            self.publisher.publish(controller)
+        return self.publisher
+
+    def record_midi(self, path):
+        """Record every message the MIDI senders emit to a Standard MIDI File"""
+        from mijoco.midi.smf_recorder import MidiFileRecorder
+
+        settings = get_config().config['midi'].get('record', {})
+        self.midi_recorder = MidiFileRecorder(path, settings.get('ring', 65536), settings.get('flush_interval', 2.0),
+                                              settings.get('bpm', 120), settings.get('ticks_per_beat', 960))
+        for midi_sender in self.midi_senders:
+            midi_sender.set_recorder(self.midi_recorder)
+        if self.control:
+            self.control.register('recorder', self.midi_recorder.counters)
+        return self.midi_recorder
+
+    def preallocate(self):
+        """Grow per-CC caches now instead of on the first send of each CC"""
+        for midi_sender in self.midi_senders:
+            midi_sender.preallocate()
+
+    def run(self):
+        self.loop.run()
+
+    def close(self):
+        if self.learn.armed:
+            self.learn.stop()
+        self.banks.close()
+        if self.clock:
+            self.clock.close()
+        if self.publisher:
+            self.publisher.close()
+        if self.midi_recorder:
+            for midi_sender in self.midi_senders:
+                midi_sender.set_recorder(None)
+            self.midi_recorder.close()
+        if self.control:
+            self.control.close()
+        self.loop.close()
+        if self.watcher:
+            self.watcher.close()
+        if self.hotplug:
+            self.hotplug.close()
@@ -0,0 +1,102 @@
+import os
+import selectors
+import time
+from collections import deque
+
+# Event-driven replacement for the sleep-poll loop. Device fds are registered
+# with the platform selector (epoll on Linux) so the process only wakes when
+# input arrives or when a timer is due.
+class EventLoop:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self.running = False
+        # Optional Histogram of per-wakeup processing time (select wait excluded)
+        self.iteration_histogram = None
+        # Self-pipe so other threads can hand work to the loop thread
+        self._calls = deque()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, (None, self._run_calls))
+
+    def add_device(self, device, callback):
+        """Call callback(device) whenever the device fd becomes readable"""
+        self.selector.register(device.fd, selectors.EVENT_READ, (device, callback))
+
+    def remove_device(self, device):
+        try:
+            self.selector.unregister(device.fd)
+        except (KeyError, ValueError):
+            pass
+
+    def add_timer(self, interval, callback):
+        """Call callback() every interval seconds, independent of input"""
+        timer = [time.monotonic() + interval, interval, callback]
+        self.timers.append(timer)
+        return timer
+
+    def set_timer_interval(self, timer, interval):
+        timer[1] = interval
+        timer[0] = min(timer[0], time.monotonic() + interval)
+
+    def remove_timer(self, timer):
+        if timer in self.timers:
+            self.timers.remove(timer)
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Run callback(*args) on the loop thread at its next wakeup"""
+        self._calls.append((callback, args))
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # Pipe full: a wakeup is already pending
+
+    def _run_calls(self, _device):
+        try:
+            os.read(self._wake_r, 4096)
+        except BlockingIOError:
+            pass
+        while self._calls:
+            callback, args = self._calls.popleft()
+            callback(*args)
+
+    def _next_timeout(self):
+        if not self.timers:
+            return None
+        return max(0.0, min(timer[0] for timer in self.timers) - time.monotonic())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        for timer in self.timers:
+            if now >= timer[0]:
+                timer[2]()
+                # Skip missed periods instead of firing a burst to catch up
+                timer[0] = max(timer[0] + timer[1], now)
+
+    def run_once(self, max_wait=None):
+        timeout = self._next_timeout()
+        if max_wait is not None:
+            timeout = max_wait if timeout is None else min(timeout, max_wait)
+        ready = self.selector.select(timeout)
+        if self.iteration_histogram is not None:
+            start = time.perf_counter_ns()
+        for key, _ in ready:
+            device, callback = key.data
+            callback(device)
+        self._run_timers()
+        if self.iteration_histogram is not None and ready:
+            self.iteration_histogram.record(time.perf_counter_ns() - start)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
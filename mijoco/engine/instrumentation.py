@@ -0,0 +1,113 @@
+import time
+from array import array
+
+# Fixed-memory latency histogram. Values are integer nanoseconds; the first 32
+# buckets are exact, after that each power of two is split into 16 buckets
+# (~6% resolution). 40 octaves cover anything up to ~18 minutes.
+SUB_BUCKETS = 16
+OCTAVES = 40
+BUCKETS = 32 + OCTAVES * SUB_BUCKETS
+
+def _bucket(value):
+    if value < 32:
+        return value if value > 0 else 0
+    shift = value.bit_length() - 5
+    index = 32 + (shift - 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+    return index if index < BUCKETS else BUCKETS - 1
+
+def _bucket_value(index):
+    """Upper bound of a bucket, so percentiles never under-report"""
+    if index < 32:
+        return index
+    shift, top = divmod(index - 32, SUB_BUCKETS)
+    shift += 1
+    return ((top + SUB_BUCKETS + 1) << shift) - 1
+
+class Histogram:
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * BUCKETS))
+        self.count = 0
+        self.max = 0
+
+    def record(self, value):
+        self.counts[_bucket(value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        target = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(_bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """p50/p99/max in milliseconds"""
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+            'max_ms': self.max / 1e6,
+        }
+
+STAGES = ('input_to_send', 'read', 'scale', 'send', 'loop')
+
+# Optional instrumentation for the input-to-MIDI path. Nothing is wrapped
+# unless it is enabled, so the uninstrumented hot path is unchanged.
+#   input_to_send: kernel event timestamp -> last MIDI write of that wakeup
+#   read:          reading and parsing evdev events
+#   scale:         mapping/scaling time inside the sender (send time excluded)
+#   send:          MIDI port writes
+#   loop:          event loop iteration (work done after each wakeup)
+class Instrumentation:
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self._send_ns = 0
+
+    def instrument_sender(self, midi_sender):
+        """Wrap the sender's port writes (CCs and notes) to time every send"""
+        histogram = self.histograms['send']
+
+        # send_bytes itself is rebound when a recorder is attached, so the
+        # two methods that call it are wrapped instead
+        def timed(send):
+            def timed_send(data1, data2):
+                start = time.perf_counter_ns()
+                send(data1, data2)
+                elapsed = time.perf_counter_ns() - start
+                histogram.record(elapsed)
+                self._send_ns += elapsed
+            return timed_send
+
+        midi_sender._send = timed(midi_sender._send)
+        midi_sender.send_note = timed(midi_sender.send_note)
+
+    def time_read(self, process, *args):
+        start = time.perf_counter_ns()
+        result = process(*args)
+        self.histograms['read'].record(time.perf_counter_ns() - start)
+        return result
+
+    def time_send(self, send, *args):
+        self._send_ns = 0
+        start = time.perf_counter_ns()
+        result = send(*args)
+        self.histograms['scale'].record(time.perf_counter_ns() - start - self._send_ns)
+        return result
+
+    def record_input_to_send(self, event_timestamp):
+        # evdev timestamps use CLOCK_REALTIME
+        self.histograms['input_to_send'].record(time.time_ns() - int(event_timestamp * 1e9))
+
+    def report(self):
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+def print_report(report):
+    print("\nLatency (p50 / p99 / max):")
+    for stage, s in report.items():
+        print(f"  {stage:14s}: {s['p50_ms']:8.3f} / {s['p99_ms']:8.3f} / {s['max_ms']:8.3f} ms  ({s['count']} samples)")
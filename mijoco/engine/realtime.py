@@ -0,0 +1,128 @@
+import ctypes
+import gc
+import os
+import threading
+import time
+from mijoco.utils.libc import load_libc
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+def default_cpu():
+    """Last CPU this process may run on; CPU 0 usually takes most interrupts"""
+    cpus = sorted(os.sched_getaffinity(0))
+    return cpus[-1] if len(cpus) > 1 else None
+
+def lock_memory():
+    if load_libc().mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def apply_realtime(priority, cpu):
+    """Best effort for the calling thread; returns {feature: 'ok' or why it was not applied}"""
+    steps = {
+        'SCHED_FIFO': lambda: os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority)),
+        'affinity': (lambda: os.sched_setaffinity(0, {cpu})) if cpu is not None else None,
+        'mlockall': lock_memory,
+    }
+    applied = {}
+    for name, step in steps.items():
+        if step is None:
+            applied[name] = 'skipped (single CPU)'
+            continue
+        try:
+            step()
+            applied[name] = 'ok'
+        except OSError as e:
+            applied[name] = e.strerror or str(e)
+    return applied
+
+def freeze_gc():
+    """Collect once, then move every startup object out of the collector's reach"""
+    gc.collect()
+    gc.freeze()
+
+# Worst-case loop time and GC pauses on the realtime thread. Plugged into
+# EventLoop.iteration_histogram; an existing histogram keeps receiving samples.
+class RealtimeMonitor:
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self.iterations = 0
+        self.loop_max_ns = 0
+        self.gc_collections = 0
+        self.gc_max_ns = 0
+        self._gc_start = 0
+
+    def record(self, elapsed_ns):
+        self.iterations += 1
+        if elapsed_ns > self.loop_max_ns:
+            self.loop_max_ns = elapsed_ns
+        if self.histogram is not None:
+            self.histogram.record(elapsed_ns)
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self._gc_start = time.perf_counter_ns()
+        else:
+            self.gc_collections += 1
+            self.gc_max_ns = max(self.gc_max_ns, time.perf_counter_ns() - self._gc_start)
+
+# Runs the engine's loop on one dedicated thread with realtime scheduling.
+# The main thread only waits, so Ctrl+C still arrives there.
+class RealtimeRunner:
+    def __init__(self, engine, priority=50, cpu=None, deadline_ms=2.0):
+        self.engine = engine
+        self.priority = priority
+        self.cpu = default_cpu() if cpu is None else cpu
+        self.applied = {}
+        self.error = None
+        self.monitor = RealtimeMonitor(engine.loop.iteration_histogram)
+        engine.loop.iteration_histogram = self.monitor
+        engine.stats.deadline = deadline_ms / 1000.0
+        self.thread = threading.Thread(target=self._run, name="mijoco-rt", daemon=True)
+
+    def _run(self):
+        self.applied = apply_realtime(self.priority, self.cpu)
+        self.engine.preallocate()
+        freeze_gc()
+        gc.callbacks.append(self.monitor.on_gc)
+        try:
+            self.engine.run()
+        except Exception as e:
+            self.error = e
+        finally:
+            gc.callbacks.remove(self.monitor.on_gc)
+
+    def run(self):
+        self.thread.start()
+        try:
+            while self.thread.is_alive():
+                self.thread.join(0.5)
+        except KeyboardInterrupt:
+            self.engine.loop.call_soon_threadsafe(self.engine.loop.stop)
+            self.thread.join()
+            raise
+        if self.error:
+            raise self.error
+
+    def report(self):
+        stats = self.engine.stats
+        return {
+            'applied': self.applied,
+            'cpu': self.cpu,
+            'deadline_ms': 1000.0 * stats.deadline,
+            'sends': stats.latency_count,
+            'missed_deadlines': stats.missed_deadlines,
+            'loop_iterations': self.monitor.iterations,
+            'loop_max_ms': self.monitor.loop_max_ns / 1e6,
+            'gc_collections': self.monitor.gc_collections,
+            'gc_max_pause_ms': self.monitor.gc_max_ns / 1e6,
+        }
+
+def print_realtime_report(report):
+    print("\nRealtime mode:")
+    print("  Applied        : " + ", ".join(f"{name} {result}" for name, result in report['applied'].items()))
+    print(f"  Missed         : {report['missed_deadlines']} of {report['sends']} sends over "
+          f"{report['deadline_ms']:.2f} ms")
+    print(f"  Worst loop     : {report['loop_max_ms']:.3f} ms ({report['loop_iterations']} wakeups)")
+    print(f"  GC             : {report['gc_collections']} collections, max pause {report['gc_max_pause_ms']:.3f} ms")
@@ -0,0 +1,185 @@
+"""Controller state shared with other processes through a memory-mapped file.
+
+The engine writes one fixed-layout record per controller on every input
+frame that changed something; any number of local readers map the same
+file and read it without syscalls and without the engine knowing about
+them. Each record is guarded by a sequence lock: the writer makes the
+sequence odd, writes, and makes it even again, and a reader retries
+until it sees the same even sequence before and after copying.
+
+Layout (little-endian):
+    header  64 bytes   magic 'MJCS', version, slots, slot size, writer pid
+    slot    128 bytes  per controller: sequence u32, then PAYLOAD
+
+Read it from another process with:
+    from mijoco.engine.shared_state import StateReader
+    reader = StateReader()
+    reader.snapshot()
+
+or from a shell:
+    python -m mijoco.engine.shared_state [PATH]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+MAGIC = b'MJCS'
+VERSION = 1
+SLOTS = 8
+HEADER_SIZE = 64
+SLOT_SIZE = 128
+HEADER = struct.Struct('<4sHHIi')
+SEQUENCE = struct.Struct('<I')
+# type, connected flags, preset bank, frame count, publish time (CLOCK_MONOTONIC ns),
+# gyro x/y/z, stick x/y/rx/ry, pitch/roll/yaw (hundredths of a degree),
+# held buttons and buttons toggled on (bits in BUTTON_CODES order)
+PAYLOAD = struct.Struct('<BBHQq3i4i3iQQ')
+
+CONTROLLER_TYPES = (None, 'Left', 'Right', 'Pro')
+# Bit order of the button masks
+BUTTON_CODES = (304, 305, 307, 308, 309, 310, 311, 312, 313, 314, 315, 316, 317, 318, 544, 545, 546, 547)
+# Connected flags
+MAIN_CONNECTED = 1
+IMU_CONNECTED = 2
+
+# Seqlock retries before a reader gives up (the writer died mid-write)
+READ_RETRIES = 10000
+
+def default_state_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"mijoco-state-{os.getuid()}")
+
+# Engine side: owns the file and writes the records
+class StatePublisher:
+    def __init__(self, path=None):
+        self.path = path or default_state_path()
+        self.size = HEADER_SIZE + SLOTS * SLOT_SIZE
+        # Built aside and renamed into place, so readers never see a partial header
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, self.size)
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, SLOTS, SLOT_SIZE, os.getpid())
+        os.replace(temp_path, self.path)
+        # controller -> [slot offset, sequence, frame count, type index, button states dict, (bit, code) pairs]
+        self.slots = {}
+        self.masks = {code: 1 << bit for bit, code in enumerate(BUTTON_CODES)}
+
+    def _slot(self, controller):
+        if len(self.slots) == SLOTS:
+            return None
+        slot = self.slots[controller] = [HEADER_SIZE + len(self.slots) * SLOT_SIZE, 0, 0,
+                                         CONTROLLER_TYPES.index(controller.joycon_type.value), None, ()]
+        return slot
+
+    def publish(self, controller):
+        """Write one controller's current state; controllers beyond SLOTS are not shared"""
+        slot = self.slots.get(controller) or self._slot(controller)
+        if slot is None:
+            return
+        offset, sequence, frames, type_index, buttons, pairs = slot
+        button_state = controller.button_state
+        states = button_state.states
+        if states is not buttons:
+            # Mapped buttons only; rebuilt when a remap replaces the states dict
+            pairs = slot[5] = tuple((self.masks[code], code) for code in states if code in self.masks)
+            slot[4] = states
+        cc_values = button_state.cc_values
+        toggle_on = button_state.toggle_on
+        pressed = toggled = 0
+        for mask, code in pairs:
+            if states[code]:
+                pressed |= mask
+            if cc_values[code] == toggle_on:
+                toggled |= mask
+        gyro = controller.gyro_values
+        sticks = controller.joycon_values
+        pipeline = controller.imu_pipeline
+        orientation = pipeline.orientation if pipeline else (0, 0, 0)
+        missing = controller.missing
+        connected = (0 if 'main' in missing else MAIN_CONNECTED) | \
+                    (IMU_CONNECTED if controller.imu is not None and 'imu' not in missing else 0)
+        data = self.map
+        SEQUENCE.pack_into(data, offset, sequence + 1)
+        PAYLOAD.pack_into(data, offset + 4, type_index, connected, controller.bank_index,
+                          frames + 1, time.monotonic_ns(), gyro['x'], gyro['y'], gyro['z'],
+                          sticks['x'], sticks['y'], sticks.get('rx', 0), sticks.get('ry', 0),
+                          orientation[0], orientation[1], orientation[2], pressed, toggled)
+        SEQUENCE.pack_into(data, offset, sequence + 2)
+        slot[1] = sequence + 2
+        slot[2] = frames + 1
+
+    def close(self):
+        # Readers that still map the file see that the writer is gone
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, SLOTS, SLOT_SIZE, 0)
+        self.map.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+# Consumer side: maps the file read-only; no mijoco imports needed
+class StateReader:
+    def __init__(self, path=None):
+        self.path = path or default_state_path()
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slot_count, self.slot_size, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{self.path} is not a MiJoCo state file of version {VERSION}")
+
+    @property
+    def writer_pid(self):
+        """PID of the running MiJoCo, 0 once it has exited"""
+        return HEADER.unpack_from(self.map, 0)[4]
+
+    def read(self, slot):
+        """Consistent PAYLOAD tuple of one slot"""
+        data = self.map
+        offset = HEADER_SIZE + slot * self.slot_size
+        for _ in range(READ_RETRIES):
+            before = SEQUENCE.unpack_from(data, offset)[0]
+            if before & 1:
+                continue
+            record = PAYLOAD.unpack_from(data, offset + 4)
+            if SEQUENCE.unpack_from(data, offset)[0] == before:
+                return record
+        raise RuntimeError(f"slot {slot} of {self.path} stays locked (writer stopped mid-write?)")
+
+    def snapshot(self):
+        """State of every controller that has been published, as dicts"""
+        controllers = []
+        for slot in range(self.slot_count):
+            (type_index, connected, bank, frames, timestamp_ns, gx, gy, gz, x, y, rx, ry,
+             pitch, roll, yaw, pressed, toggled) = self.read(slot)
+            if not type_index:
+                continue
+            controllers.append({
+                'controller': CONTROLLER_TYPES[type_index],
+                'main_connected': bool(connected & MAIN_CONNECTED),
+                'imu_connected': bool(connected & IMU_CONNECTED),
+                'bank': bank,
+                'frames': frames,
+                'timestamp_ns': timestamp_ns,
+                'gyro': {'x': gx, 'y': gy, 'z': gz},
+                'joystick': {'x': x, 'y': y, 'rx': rx, 'ry': ry},
+                'orientation': {'pitch': pitch / 100, 'roll': roll / 100, 'yaw': yaw / 100},
+                'pressed': [code for bit, code in enumerate(BUTTON_CODES) if pressed >> bit & 1],
+                'toggled': [code for bit, code in enumerate(BUTTON_CODES) if toggled >> bit & 1],
+            })
+        return controllers
+
+    def close(self):
+        self.map.close()
+
+if __name__ == "__main__":
+    reader = StateReader(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(json.dumps({'writer_pid': reader.writer_pid, 'controllers': reader.snapshot()}, indent=2))
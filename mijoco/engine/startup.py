@@ -0,0 +1,107 @@
+import os
+import time
+
+# Startup profile (--startup-profile): how long each phase from process start
+# to the first MIDI message took. Times use CLOCK_BOOTTIME so the phase before
+# Python runs main.py (the frozen binary's unpacking, interpreter start) can
+# be taken from the kernel's process start time.
+
+def now():
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+def process_start():
+    """Start time of this process on CLOCK_BOOTTIME (clock-tick resolution), or None"""
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name; starttime is field 22
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+class StartupProfile:
+    def __init__(self, module_start):
+        self.phases = []
+        started = process_start()
+        if started is not None and started <= module_start:
+            self.phases.append(('interpreter start', module_start - started, True))
+        self.last = module_start
+
+    def mark(self, phase, counted=True):
+        """End a phase now; phases that wait for the user are listed but not counted in the total"""
+        current = now()
+        self.phases.append((phase, current - self.last, counted))
+        self.last = current
+
+    def watch(self, engine):
+        """Mark when the engine first gets input and first sends MIDI; waiting for the
+        user to move a controller is listed but not counted"""
+        self.input_seen = False
+        self.first_sent = False
+        devices = [(device, engine.device_callbacks[controller][role])
+                   for controller in engine.controllers
+                   for role, device in (('imu', controller.imu), ('main', controller.main))
+                   if device and role not in controller.missing]
+        self._watch_first_input(engine.loop, devices)
+        self._watch_first_send(engine.midi_senders)
+
+    def _watch_first_input(self, loop, devices):
+        probes = {}
+
+        def restore():
+            # Skip devices that were unplugged or re-registered since
+            for device, callback in devices:
+                try:
+                    registered = loop.selector.get_key(device.fd).data
+                except (KeyError, ValueError):
+                    continue
+                if registered == (device, probes[device]):
+                    loop.remove_device(device)
+                    loop.add_device(device, callback)
+
+        def probe(callback):
+            def first_input(device):
+                if not self.input_seen:
+                    self.input_seen = True
+                    if not self.first_sent:
+                        self.mark('waiting for first input', counted=False)
+                    restore()
+                callback(device)
+            return first_input
+
+        for device, callback in devices:
+            probes[device] = probe(callback)
+            loop.remove_device(device)
+            loop.add_device(device, probes[device])
+
+    def _watch_first_send(self, midi_senders):
+        """Mark the first MIDI message any of the senders emits, then step out of the send path"""
+        originals = [(midi_sender, midi_sender.send_bytes) for midi_sender in midi_senders]
+
+        def restore():
+            for midi_sender, send_bytes in originals:
+                midi_sender.send_bytes = send_bytes
+
+        def probe(send_bytes):
+            def first_send(status, data1, data2):
+                if not self.first_sent:
+                    self.first_sent = True
+                    self.mark('first input to first MIDI message' if self.input_seen else
+                              'first MIDI message (before any input)')
+                    restore()
+                send_bytes(status, data1, data2)
+            return first_send
+
+        for midi_sender, send_bytes in originals:
+            midi_sender.send_bytes = probe(send_bytes)
+
+    def report(self):
+        return {'phases_ms': {phase: round(seconds * 1000, 1) for phase, seconds, _ in self.phases},
+                'total_ms': round(sum(seconds for _, seconds, counted in self.phases if counted) * 1000, 1)}
+
+def print_startup_report(report):
+    print("\nStartup profile:")
+    for phase, ms in report['phases_ms'].items():
+        print(f"  {phase:48s}: {ms:8.1f} ms")
+    print(f"  {'total':48s}: {report['total_ms']:8.1f} ms")
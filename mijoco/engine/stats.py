@@ -0,0 +1,72 @@
+import time
+
+# Lightweight loop statistics used to compare the event-driven engine with the
+# legacy sleep-poll loop: CPU use while idle and input-to-send latency.
+class LoopStats:
+    def __init__(self):
+        self.start_wall = time.monotonic()
+        self.start_cpu = time.process_time()
+        self.window_wall = self.start_wall
+        self.window_cpu = self.start_cpu
+        self.window_events = 0
+        self.idle_wall = 0.0
+        self.idle_cpu = 0.0
+        self.wakeups = 0
+        self.events = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        # Optional input-to-send budget in seconds; sends over it count as missed
+        self.deadline = 0.0
+        self.missed_deadlines = 0
+
+    def record_wakeup(self, event_count):
+        self.wakeups += 1
+        self.events += event_count
+        self.window_events += event_count
+
+    def record_send(self, event_timestamp):
+        """Record latency from an evdev event timestamp (CLOCK_REALTIME) to now"""
+        latency = time.time() - event_timestamp
+        self.latency_count += 1
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if self.deadline and latency > self.deadline:
+            self.missed_deadlines += 1
+
+    def tick(self):
+        """Close the current measurement window; windows without input count as idle"""
+        now_wall = time.monotonic()
+        now_cpu = time.process_time()
+        if self.window_events == 0:
+            self.idle_wall += now_wall - self.window_wall
+            self.idle_cpu += now_cpu - self.window_cpu
+        self.window_wall = now_wall
+        self.window_cpu = now_cpu
+        self.window_events = 0
+
+    def summary(self):
+        self.tick()
+        wall = time.monotonic() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        return {
+            'wall_s': wall,
+            'cpu_percent': 100.0 * cpu / wall if wall else 0.0,
+            'idle_cpu_percent': 100.0 * self.idle_cpu / self.idle_wall if self.idle_wall else 0.0,
+            'wakeups': self.wakeups,
+            'events': self.events,
+            'latency_avg_ms': 1000.0 * self.latency_total / self.latency_count if self.latency_count else 0.0,
+            'latency_max_ms': 1000.0 * self.latency_max,
+        }
+
+def print_stats(stats: LoopStats, loop_name, sender_counters=None):
+    s = stats.summary()
+    print(f"\nLoop statistics ({loop_name}):")
+    print(f"  Runtime        : {s['wall_s']:.1f} s")
+    print(f"  CPU            : {s['cpu_percent']:.2f} % (idle: {s['idle_cpu_percent']:.2f} %)")
+    print(f"  Wakeups/events : {s['wakeups']} / {s['events']}")
+    print(f"  Event-to-send  : avg {s['latency_avg_ms']:.3f} ms | max {s['latency_max_ms']:.3f} ms")
+    if sender_counters:
+        print(f"  MIDI messages  : sent {sender_counters['sent']} | suppressed {sender_counters['suppressed']} | "
+              f"rate-limited {sender_counters['rate_limited']} | keepalive {sender_counters['keepalive']}")
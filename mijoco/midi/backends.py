@@ -0,0 +1,114 @@
+import os
+
+CONTROL_CHANGE = 0xB0
+NOTE_ON = 0x90
+
+# Output backends behind MidiSender. Each takes 3-byte channel messages as a
+# pre-encoded status byte (e.g. 0xB0 | channel) plus two data bytes; flush()
+# ends an input frame and is where batching backends do their single write.
+
+# Fallback: builds and validates a mido.Message per message, works with any mido port
+class MidoBackend:
+    batched = False
+
+    def __init__(self, port):
+        import mido
+
+        self.port = port
+        self.from_bytes = mido.Message.from_bytes
+
+    def send_message(self, status, data1, data2):
+        self.port.send(self.from_bytes((status, data1, data2)))
+
+    def flush(self):
+        pass
+
+# Fast path for mido's rtmidi ports: hands the three bytes straight to
+# rtmidi.MidiOut. python-rtmidi accepts only one channel message per call,
+# so there is nothing to batch.
+class RtMidiBackend:
+    batched = False
+
+    def __init__(self, port):
+        self.port = port
+        self.send = port._rt.send_message
+
+    def send_message(self, status, data1, data2):
+        self.send((status, data1, data2))
+
+    def flush(self):
+        pass
+
+# Fast path for a raw ALSA MIDI device node (/dev/snd/midiCxDy). All messages of
+# one frame are collected and written with one write(), using running status.
+class RawMidiBackend:
+    batched = True
+
+    def __init__(self, port):
+        self.port = port
+        self.buffer = bytearray()
+        self.running_status = None
+
+    def send_message(self, status, data1, data2):
+        if status != self.running_status:
+            self.buffer.append(status)
+            self.running_status = status
+        self.buffer.append(data1)
+        self.buffer.append(data2)
+
+    def flush(self):
+        if self.buffer:
+            self.port.write(self.buffer)
+            self.buffer.clear()
+            # Another sender may write to the port before the next frame
+            self.running_status = None
+
+# Network outputs (mijoco.midi.network): the messages of one frame are handed
+# over together and go out as one datagram
+class DatagramBackend:
+    batched = True
+
+    def __init__(self, port):
+        self.port = port
+        self.buffer = bytearray()
+
+    def send_message(self, status, data1, data2):
+        self.buffer.append(status)
+        self.buffer.append(data1)
+        self.buffer.append(data2)
+
+    def flush(self):
+        if self.buffer:
+            self.port.send_frame(bytes(self.buffer))
+            self.buffer.clear()
+
+# mido-like output port for a raw MIDI device node, opened with --midi-device
+class RawMidiOutput:
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+        self.fd = os.open(path, os.O_WRONLY)
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+    def send(self, message):
+        self.write(bytes(message.bytes()))
+
+    def close(self):
+        os.close(self.fd)
+
+def open_backend(port, fast_path=True):
+    """Pick the fastest backend the port supports; mido is the fallback"""
+    if hasattr(port, 'send_message'):
+        # Already a backend: a fan-out picks backends for each of its ports
+        return port
+    if not fast_path:
+        return MidoBackend(port)
+    if isinstance(port, RawMidiOutput):
+        return RawMidiBackend(port)
+    if hasattr(port, 'send_frame'):
+        return DatagramBackend(port)
+    if hasattr(port, '_rt'):
+        return RtMidiBackend(port)
+    return MidoBackend(port)
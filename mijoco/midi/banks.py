@@ -0,0 +1,104 @@
+from mijoco.config.config_loader import get_config
+from mijoco.devices.detector import open_midi_input
+from mijoco.midi.rules import event_code
+
+# Preset bank switching. Every bank is compiled for every controller when the
+# config loads (see ControllerBank), so a switch only swaps references on the
+# loop thread between two wakeups: nothing is parsed or bound and no input is
+# dropped. Switches come from the next / previous button combos, a Program
+# Change on a MIDI input or the 'bank' control command.
+class BankSwitcher:
+    def __init__(self, engine, settings=None):
+        self.engine = engine
+        self.index = 0
+        # Combo step each controller is holding, so a held combo switches once
+        self.combo_down = {}
+        self.input = None
+        self.input_pattern = None
+        # Called with a message for the status display
+        self.listeners = []
+        self.configure(settings or {})
+
+    def configure(self, settings):
+        """Apply the config's banks section: {next: [BTN_...], previous: [...], program_change: {port, channel}}"""
+        self.combos = tuple((step, tuple(event_code(name, ('BTN_', 'KEY_')) for name in combo))
+                            for step, combo in ((1, settings.get('next')), (-1, settings.get('previous')))
+                            if combo)
+        program_change = settings.get('program_change') or {}
+        self.channel = program_change.get('channel')
+        self._open_input(program_change.get('port'))
+        self.index = min(self.index, len(get_config().banks) - 1)
+
+    def _open_input(self, pattern):
+        if pattern == self.input_pattern:
+            return
+        self.close()
+        self.input_pattern = pattern
+        if pattern:
+            try:
+                self.input = open_midi_input(pattern, self._on_message)
+                self._notify(f"Bank select from Program Change on: {self.input.name}")
+            except OSError as e:
+                self._notify(f"Bank select by Program Change disabled: {e}")
+
+    def _on_message(self, message):
+        # mido's input thread: hand the switch to the loop
+        if message.type == 'program_change' and self.channel in (None, message.channel):
+            self.engine.loop.call_soon_threadsafe(self.select, message.program)
+
+    def _notify(self, message):
+        # No listeners yet while the engine is being set up: print directly
+        if not self.listeners:
+            print(message)
+        for listener in self.listeners:
+            listener(message)
+
+    def check_combo(self, controller):
+        """Called after input: holding the next or previous combo steps through the banks once"""
+        states = controller.button_state.states
+        held = 0
+        for step, combo in self.combos:
+            if all(states.get(code) for code in combo):
+                held = step
+                break
+        if held != self.combo_down.get(controller, 0):
+            self.combo_down[controller] = held
+            if held:
+                self.select((self.index + held) % len(get_config().banks))
+
+    def select(self, index):
+        """Make bank index active on every controller; runs on the loop thread"""
+        banks = get_config().banks
+        if not 0 <= index < len(banks):
+            return {'error': f"no bank {index} (banks are 0-{len(banks) - 1})"}
+        if self.engine.learn.armed:
+            self.engine.learn.stop()
+            self._notify("MIDI learn cancelled by the bank switch")
+        self.engine.select_bank(index)
+        self.index = index
+        self._notify(f"Bank {index}: {banks[index][0]}")
+        return self.status()
+
+    def status(self):
+        return {'bank': self.index, 'name': get_config().banks[self.index][0],
+                'banks': [name for name, _ in get_config().banks]}
+
+    def command(self, target=None, *args):
+        """Control socket: 'bank', 'bank next', 'bank previous', 'bank N' or 'bank NAME'"""
+        if target is None:
+            return self.status()
+        banks = get_config().banks
+        if target in ('next', 'previous'):
+            return self.select((self.index + (1 if target == 'next' else -1)) % len(banks))
+        if target.isdigit():
+            return self.select(int(target))
+        name = ' '.join((target, *args))
+        index = next((i for i, (bank_name, _) in enumerate(banks) if bank_name.lower() == name.lower()), None)
+        if index is None:
+            return {'error': f"no bank named '{name}'"}
+        return self.select(index)
+
+    def close(self):
+        if self.input:
+            self.input.close()
+            self.input = None
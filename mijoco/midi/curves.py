@@ -0,0 +1,82 @@
+import math
+from array import array
+
+CURVES = ('linear', 'exponential', 'cubic', 's-curve')
+# Exponential steepness: below EPSILON the curve is a line for all practical
+# purposes; beyond MAX the table is all zeros but for the end
+EXPONENTIAL_EPSILON = 1e-9
+EXPONENTIAL_MAX = 100.0
+
+def _shape(curve, x, amount):
+    """Apply a response curve to x in [-1, 1], keeping the sign"""
+    magnitude = abs(x)
+    if curve == 'linear' or (curve == 'exponential' and abs(amount) < EXPONENTIAL_EPSILON):
+        # An exponential curve flattens into a line as amount approaches 0
+        y = magnitude
+    elif curve == 'exponential':
+        y = math.expm1(amount * magnitude) / math.expm1(amount)
+    elif curve == 'cubic':
+        y = magnitude ** 3
+    elif curve == 's-curve':
+        # Smoothstep over the full range: steep around center, flat at the ends
+        t = (x + 1) / 2
+        return 2 * (t * t * (3 - 2 * t)) - 1
+    else:
+        raise ValueError(f"Unknown curve '{curve}' (expected one of: {', '.join(CURVES)})")
+    return y if x >= 0 else -y
+
+# Response curve compiled once into a dense table indexed by raw value
+class AxisCurve:
+    def __init__(self, min_val, max_val, curve='linear', deadzone=0.0, invert=False,
+                 center=None, amount=3.0, out_max=127):
+        if max_val <= min_val:
+            raise ValueError(f"Invalid axis range: min {min_val} must be below max {max_val}")
+        if curve == 'exponential' and not -EXPONENTIAL_MAX <= amount <= EXPONENTIAL_MAX:
+            raise ValueError(f"Invalid exponential amount {amount} (expected -{EXPONENTIAL_MAX:g} to {EXPONENTIAL_MAX:g})")
+        self.min_val = int(min_val)
+        self.max_val = int(max_val)
+        self.out_max = out_max
+        center = (min_val + max_val) / 2 if center is None else center
+        center = min(max(center, min_val), max_val)
+        deadzone = min(max(deadzone, 0.0), 0.99)
+
+        table = array('H' if out_max > 255 else 'B')
+        for raw in range(self.min_val, self.max_val + 1):
+            # Normalize each side of the center separately so an offset center
+            # still reaches both ends of the output range
+            if raw >= center:
+                span = max_val - center
+                x = (raw - center) / span if span else 1.0
+            else:
+                span = center - min_val
+                x = (raw - center) / span if span else -1.0
+            if abs(x) <= deadzone:
+                x = 0.0
+            elif deadzone:
+                x = math.copysign((abs(x) - deadzone) / (1 - deadzone), x)
+            y = _shape(curve, x, amount)
+            if invert:
+                y = -y
+            table.append(min(out_max, max(0, int((y + 1) / 2 * out_max))))
+        self.table = table
+
+    def __call__(self, raw_value):
+        if raw_value < self.min_val:
+            raw_value = self.min_val
+        elif raw_value > self.max_val:
+            raw_value = self.max_val
+        return self.table[raw_value - self.min_val]
+
+def compile_axis_curve(input_config, axis, out_max=127):
+    """Build the curve for one axis from an input section with optional per-axis overrides"""
+    settings = {**input_config, **input_config.get('axes', {}).get(axis, {})}
+    return AxisCurve(
+        settings['min'],
+        settings['max'],
+        curve=settings.get('curve', 'linear'),
+        deadzone=settings.get('deadzone', 0.0),
+        invert=settings.get('invert', False),
+        center=settings.get('center'),
+        amount=settings.get('amount', 3.0),
+        out_max=out_max,
+    )
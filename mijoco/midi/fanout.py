@@ -0,0 +1,291 @@
+import threading
+from collections import deque
+from mijoco.midi.backends import CONTROL_CHANGE, open_backend
+
+# Fan-out to several MIDI outputs. The fan-out is itself an output backend
+# (send_message / flush), so MidiSender needs no changes: each message is
+# remapped per port and queued, and every port has a writer thread that
+# drains its queue into the port's own backend. A slow or stalled port only
+# fills its own queue; the input path never waits on a port.
+
+POLICIES = ('drop-oldest', 'coalesce')
+
+# Parameter-number and data-entry CCs of (N)RPN sequences: coalescing would
+# reorder them, so they are always queued in order
+PARAMETER_CONTROLS = frozenset({6, 38, 96, 97, 98, 99, 100, 101})
+# Parameter-number CCs: the data entry that follows belongs to them
+PARAMETER_SELECTS = frozenset({98, 99, 100, 101})
+
+def _continues(first, second):
+    """Whether second completes first: the LSB (CC n + 32) of a 14-bit MSB
+    or the next CC of an NRPN / RPN sequence, on the same channel"""
+    status, control, _ = first
+    if second[0] != status or status & 0xF0 != CONTROL_CHANGE:
+        return False
+    return (control < 32 and second[1] == control + 32 or
+            control in PARAMETER_SELECTS and second[1] in PARAMETER_CONTROLS)
+
+# Bounded FIFO that drops the oldest message when full, together with the
+# messages completing it, so a 14-bit pair or NRPN sequence is never split.
+# Producer and writer only append and popleft, which are atomic on a deque,
+# so it needs no lock.
+class DropOldestQueue:
+    def __init__(self, depth):
+        self.depth = depth
+        self.items = deque()
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, message):
+        items = self.items
+        if len(items) >= self.depth:
+            self._drop_oldest()
+        items.append(message)
+        if len(items) > self.max_depth:
+            self.max_depth = len(items)
+
+    def _drop_oldest(self):
+        items = self.items
+        try:
+            dropped = items.popleft()
+            self.dropped += 1
+            while True:
+                head = items[0]
+                if not _continues(dropped, head):
+                    return
+                dropped = items.popleft()
+                if dropped is not head:
+                    # The writer took head meanwhile: keep what came after it
+                    items.appendleft(dropped)
+                    return
+                self.dropped += 1
+        except IndexError:
+            # The writer drained the queue meanwhile
+            return
+
+    def drain(self):
+        items = self.items
+        messages = []
+        while True:
+            try:
+                messages.append(items.popleft())
+            except IndexError:
+                return messages
+
+# Bounded queue that keeps one pending value per (status, CC): a newer value
+# replaces the queued one in place, so a backlog holds the latest state
+# instead of stale history. Notes and parameter CCs are never merged. The
+# MSB (CC n) and LSB (CC n + 32) of a 14-bit pair share one entry, so they
+# stay in order and are dropped together.
+#
+# No lock: the producer only inserts or replaces entries (one atomic dict
+# store each, always a new tuple) and the writer only takes them with
+# popitem(), which is atomic too and returns the newest first. A store that
+# misses the drain is a new entry for the next one.
+class CoalescingQueue:
+    def __init__(self, depth):
+        self.depth = depth
+        self.items = {}
+        self.serial = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, message):
+        status, data1, _ = message
+        items = self.items
+        if status & 0xF0 == CONTROL_CHANGE and data1 not in PARAMETER_CONTROLS:
+            if data1 < 64:
+                # (MSB, LSB) entry of the pair
+                key = (status, data1 & 0x1F)
+                entry = items.get(key)
+                if entry is not None:
+                    self.coalesced += 1
+                    items[key] = (message, entry[1]) if data1 < 32 else (entry[0], message)
+                    return
+                entry = (message, None) if data1 < 32 else (None, message)
+            else:
+                key = (status, data1)
+                if key in items:
+                    self.coalesced += 1
+                    items[key] = (message,)
+                    return
+                entry = (message,)
+        else:
+            self.serial += 1
+            key = self.serial
+            entry = (message,)
+        if len(items) >= self.depth:
+            try:
+                del items[next(iter(items))]
+                self.dropped += 1
+            except (KeyError, RuntimeError):
+                # The writer is draining right now, so there is room again
+                pass
+        items[key] = entry
+        if len(items) > self.max_depth:
+            self.max_depth = len(items)
+
+    def drain(self):
+        items = self.items
+        entries = []
+        while True:
+            try:
+                entries.append(items.popitem()[1])
+            except KeyError:
+                break
+        entries.reverse()
+        return [message for entry in entries for message in entry if message is not None]
+
+QUEUES = {'drop-oldest': DropOldestQueue, 'coalesce': CoalescingQueue}
+
+# One destination: its channel/CC remapping, its queue and its writer thread
+class PortWriter:
+    def __init__(self, port, channel=None, cc_map=None, depth=256, policy='drop-oldest', fast_path=True):
+        if policy not in QUEUES:
+            raise ValueError(f"Unknown queue policy '{policy}' (expected one of: {', '.join(POLICIES)})")
+        self.port = port
+        self.name = port.name
+        self.channel = channel
+        # CC number -> CC number on this port
+        self.cc_map = list(range(128))
+        cc_map = {int(control): int(target) for control, target in (cc_map or {}).items()}
+        for control, target in cc_map.items():
+            self.cc_map[control] = target
+            # The LSB (CC n + 32) of a 14-bit pair moves with its MSB unless mapped itself
+            if control < 32 and target < 32 and control + 32 not in cc_map:
+                self.cc_map[control + 32] = target + 32
+        # With a channel override, senders on different channels share this
+        # port's channel. Each sender only tracks its own channel, so per
+        # source channel the NRPN parameter and 14-bit MSBs it last set are
+        # kept here and sent again when another source changed them since.
+        self.nrpn_selects = {}
+        self.nrpn_owner = None
+        self.msbs = {}
+        self.msb_owners = {}
+        self.backend = open_backend(port, fast_path)
+        self.queue = QUEUES[policy](depth)
+        self.policy = policy
+        self.written = 0
+        self.errors = 0
+        self.wakeup = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"mijoco-out-{self.name}", daemon=True)
+        self.thread.start()
+
+    def put(self, status, data1, data2):
+        if self.channel is not None:
+            if status & 0xF0 == CONTROL_CHANGE and (data1 < 64 or data1 in (98, 99)):
+                self._claim(status & 0x0F, data1, data2)
+            status = status & 0xF0 | self.channel
+        self._put(status, data1, data2)
+
+    def _put(self, status, data1, data2):
+        if status & 0xF0 == CONTROL_CHANGE:
+            data1 = self.cc_map[data1]
+        self.queue.put((status, data1, data2))
+
+    def _claim(self, source, control, value):
+        """Track what source sets on the merged channel; before its data entry
+        or LSB, resend the NRPN select or MSB another source replaced"""
+        status = CONTROL_CHANGE | self.channel
+        if control in (99, 98):
+            self.nrpn_selects.setdefault(source, {})[control] = value
+            self.nrpn_owner = source
+        elif control in (6, 38):
+            if self.nrpn_owner != source and source in self.nrpn_selects:
+                for select, select_value in self.nrpn_selects[source].items():
+                    self._put(status, select, select_value)
+                self.nrpn_owner = source
+        elif control < 32:
+            self.msbs[source, control] = value
+            self.msb_owners[control] = source
+        elif control < 64:
+            msb = control - 32
+            owner = self.msb_owners.get(msb)
+            if owner is not None and owner != source and (source, msb) in self.msbs:
+                self._put(status, msb, self.msbs[source, msb])
+                self.msb_owners[msb] = source
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # Whatever is queued when closing is still written
+            running = self.running
+            messages = self.queue.drain()
+            if messages:
+                self._write(messages)
+            if not running:
+                return
+
+    def _write(self, messages):
+        backend = self.backend
+        try:
+            for status, data1, data2 in messages:
+                backend.send_message(status, data1, data2)
+            # One write per wakeup on batching backends
+            backend.flush()
+            self.written += len(messages)
+        except Exception:
+            # A port that fails (e.g. unplugged) must not stop the others
+            self.errors += 1
+
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join(1.0)
+        self.port.close()
+
+    def counters(self):
+        return {
+            'policy': self.policy,
+            'queued': len(self.queue),
+            'max_queued': self.queue.max_depth,
+            'dropped': self.queue.dropped,
+            'coalesced': self.queue.coalesced,
+            'written': self.written,
+            'errors': self.errors,
+        }
+
+# Port-like object the engine uses as its single midi_out
+class MidiFanOut:
+    def __init__(self, writers):
+        self.writers = writers
+        self.name = ", ".join(writer.name for writer in writers)
+
+    def send_message(self, status, data1, data2):
+        for writer in self.writers:
+            writer.put(status, data1, data2)
+
+    def flush(self):
+        """End of an input frame: wake the writers that have something queued"""
+        for writer in self.writers:
+            if len(writer.queue):
+                writer.wakeup.set()
+
+    def attach_loop(self, loop, notify=print):
+        # Network sessions among the ports run their handshake on the loop
+        for writer in self.writers:
+            if hasattr(writer.port, 'attach_loop'):
+                writer.port.attach_loop(loop, notify)
+
+    def counters(self):
+        return {writer.name: writer.counters() for writer in self.writers}
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+def print_output_counters(counters):
+    print("\nOutputs:")
+    for name, c in counters.items():
+        print(f"  {name:24s}: written {c['written']} | queued {c['queued']} (max {c['max_queued']}) | "
+              f"dropped {c['dropped']} | coalesced {c['coalesced']} | errors {c['errors']}")
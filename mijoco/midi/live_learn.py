@@ -0,0 +1,182 @@
+import threading
+import evdev
+from mijoco.config.config_loader import get_config
+from mijoco.midi.rules import EV_ABS, EV_KEY, _code_name, event_code
+
+# Live MIDI learn, inside the running engine. While armed, every
+# controller's dispatch tables are swapped for capture tables that see all
+# input at the full report rate and send nothing. The first control moved
+# far enough (or button pressed) becomes a rule on the learned CC. The rule
+# is written to config.yml on a background thread and the new config is
+# applied like any reload: no restart, devices stay open.
+
+# Fraction of an axis' configured range it must move to be learned
+AXIS_THRESHOLD = 0.25
+
+# Stands in for an unmapped or mapped event while learning
+class CaptureAction:
+    group = 'learn'
+    pressed = False
+    dirty = False
+
+    def __init__(self, learn, controller, role, key):
+        self.learn = learn
+        self.controller = controller
+        self.role = role
+        self.key = key
+        self.first = None
+
+    def apply(self, value):
+        type, code = self.key
+        if type == EV_KEY:
+            if value == 1:
+                self.learn.captured(self.controller, self.role, self.key)
+        else:
+            if self.first is None:
+                self.first = value
+            elif abs(value - self.first) >= self.learn.thresholds[self.role]:
+                self.learn.captured(self.controller, self.role, self.key)
+        return False
+
+# Dispatch table used while learning: every axis and key maps to a capture
+# action; the combo buttons keep their own actions so their release is seen
+class CaptureTable(dict):
+    def __init__(self, learn, controller, role, passthrough):
+        super().__init__(passthrough)
+        self.learn = learn
+        self.controller = controller
+        self.role = role
+
+    def get(self, key, default=None):
+        action = dict.get(self, key)
+        if action is None and key[0] in (EV_ABS, EV_KEY):
+            action = self[key] = CaptureAction(self.learn, self.controller, self.role, key)
+        return action
+
+class LiveLearn:
+    def __init__(self, engine, settings=None):
+        self.engine = engine
+        self.combo_down = set()
+        self.cc = None
+        self.timer = None
+        self.last = None
+        self.thresholds = {}
+        # Called with a message for the status display
+        self.listeners = []
+        self.configure(settings or {})
+
+    def configure(self, settings):
+        """Apply the config's learn section: {combo: [BTN_...], timeout: seconds}"""
+        self.combo = tuple(event_code(name, ('BTN_', 'KEY_')) for name in settings.get('combo') or ())
+        self.timeout = settings.get('timeout', 10)
+
+    @property
+    def armed(self):
+        return self.cc is not None
+
+    def _notify(self, message):
+        for listener in self.listeners:
+            listener(message)
+
+    def check_combo(self, controller):
+        """Called after input: holding all combo buttons arms learning once"""
+        states = controller.button_state.states
+        for code in self.combo:
+            if not states.get(code):
+                self.combo_down.discard(controller)
+                return
+        if controller not in self.combo_down:
+            self.combo_down.add(controller)
+            if not self.armed:
+                self.start()
+
+    def free_cc(self):
+        """Lowest CC no controller's rules use (0-119; 120+ are channel mode messages)"""
+        used = set()
+        for controller in self.engine.controllers:
+            for rules in controller.mapping.rules.values():
+                for rule in rules.values():
+                    if rule.action in ('cc', 'toggle', 'momentary'):
+                        used.add(rule.number)
+                    elif rule.action == 'cc14':
+                        used.update((rule.number, rule.number + 32))
+                    elif rule.action == 'nrpn':
+                        used.update((6, 38, 98, 99))
+        return next((cc for cc in range(1, 120) if cc not in used), None)
+
+    def start(self, cc=None):
+        """Arm learning; the next control moved is assigned to cc (default: the first free CC)"""
+        cc = self.free_cc() if cc is None else int(cc)
+        if cc is None or not 0 <= cc <= 119:
+            raise ValueError("no CC to learn (give one between 0 and 119)")
+        if self.armed:
+            self.stop()
+        self.cc = cc
+        self.capture()
+        self.timer = self.engine.loop.add_timer(self.timeout, self._timed_out)
+        self._notify(f"MIDI learn: move a control to assign CC{cc}")
+        return {'status': 'armed', 'cc': cc}
+
+    def capture(self):
+        """Install the capture tables; also called again after a config reload while armed"""
+        config = get_config()
+        gyro, joystick = config.gyro_range, config.joystick_range
+        self.thresholds = {'imu': (gyro[1] - gyro[0]) * AXIS_THRESHOLD,
+                           'main': (joystick[1] - joystick[0]) * AXIS_THRESHOLD}
+        for controller in self.engine.controllers:
+            controller.frame.clear()
+            combo = {key: action for key, action in controller.dispatch['main'].items()
+                     if key[0] == EV_KEY and key[1] in self.combo}
+            controller.dispatch = {'main': CaptureTable(self, controller, 'main', combo),
+                                   'imu': CaptureTable(self, controller, 'imu', {})}
+
+    def stop(self):
+        """Disarm and put the controllers' own dispatch tables back"""
+        if self.timer:
+            self.engine.loop.remove_timer(self.timer)
+            self.timer = None
+        self.cc = None
+        for controller in self.engine.controllers:
+            controller.set_mapping(controller.mapping)
+
+    def _timed_out(self):
+        if self.armed:
+            self.stop()
+            self._notify("MIDI learn timed out")
+
+    def captured(self, controller, role, key):
+        if not self.armed:
+            return
+        type, code = key
+        entry = {
+            'controller': controller.joycon_type.value,
+            'device': role,
+            'event': [evdev.ecodes.EV[type], _code_name(type, code)],
+            'action': 'cc' if type == EV_ABS else 'toggle',
+            'cc': self.cc,
+        }
+        self.stop()
+        self.last = entry
+        self._notify(f"MIDI learn: {controller.name} {entry['event'][1]} -> CC{entry['cc']}, saving")
+        config_path = get_config().config_path
+        threading.Thread(target=self._save, args=(config_path, entry), name="learn-save", daemon=True).start()
+
+    def _save(self, config_path, entry):
+        from mijoco.config.writer import save_rule
+
+        try:
+            config = save_rule(config_path, entry)
+        except Exception as e:
+            self.engine.loop.call_soon_threadsafe(self._notify, f"MIDI learn: could not save config: {e}")
+            return
+        self.engine.loop.call_soon_threadsafe(self.engine.apply_config, config)
+
+    def command(self, action=None, *args):
+        """Control socket: 'learn [CC]', 'learn cancel', 'learn status'"""
+        if action == 'cancel':
+            if self.armed:
+                self.stop()
+            return {'status': 'idle'}
+        if action == 'status':
+            return {'status': 'armed' if self.armed else 'idle', 'cc': self.cc, 'last': self.last}
+        return self.start(action)
@@ -1,11 +1,95 @@
-from mijoco.config.config_loader import ConfigLoader
+import evdev
+from mijoco.config.config_loader import ConfigLoader, JoyConType, get_config
+from mijoco.midi.rules import GYRO_AXES, JOYSTICK_AXES, Rule, parse_axis_target
 
-config = ConfigLoader()
+def scale_gyro_to_midi(raw_value, axis='x', high_res=False):
+    config = get_config()
+    return (config.gyro_curves_14bit if high_res else config.gyro_curves)[axis](raw_value)
 
-def scale_gyro_to_midi(raw_value):
-    min_val, max_val = config.gyro_range
-    return min(127, max(0, int((raw_value - min_val) * 127 / (max_val - min_val))))
+def scale_joystick_to_midi(raw_value, axis='x', high_res=False):
+    config = get_config()
+    return (config.joystick_curves_14bit if high_res else config.joystick_curves)[axis](raw_value)
 
-def scale_joystick_to_midi(raw_value):
-    min_val, max_val = config.joystick_range
-    return min(127, max(0, int((raw_value - min_val) * 127 / (max_val - min_val))))
\ No newline at end of file
+def _button_fits(name, joycon_type):
+    """Buttons named "(L)" / "(R)" exist only on that side; a Pro Controller has all"""
+    if joycon_type == JoyConType.LEFT:
+        return not name.endswith("(R)")
+    if joycon_type == JoyConType.RIGHT:
+        return not name.endswith("(L)")
+    return True
+
+# Mapping namespace for one controller: the global mappings with any
+# per-controller overrides from the `controllers` section applied on top,
+# compiled into rules {'main': {(type, code): Rule}, 'imu': {...}}. Rules
+# from the `rules` section replace mappings for the same event.
+class ControllerMapping:
+    def __init__(self, joycon_type=None, config: ConfigLoader = None):
+        config = config or get_config()
+        overrides = config.controller_overrides.get(joycon_type.value, {}) if joycon_type else {}
+        mappings = overrides.get('mappings', {})
+        self.config = config
+        self.joycon_type = joycon_type or JoyConType.LEFT
+        self.channel = overrides.get('channel', config.channel)
+        self.gyro_cc_map = {**config.gyro_cc_map, **mappings.get('gyro', {})}
+        self.joystick_left_cc_map = {**config.joystick_left_cc_map, **mappings.get('joystick_left', {})}
+        self.joystick_right_cc_map = {**config.joystick_right_cc_map, **mappings.get('joystick_right', {})}
+        buttons = {**config.button_mappings, **{int(code): cc for code, cc in mappings.get('buttons', {}).items()}}
+
+        self.rules = {'main': {}, 'imu': {}}
+        self._compile_mappings(buttons)
+        for rule in config.rules:
+            if rule.controller in (None, self.joycon_type.value):
+                self.rules[rule.device][rule.key] = rule
+        # Button codes with a rule; their state is tracked in ButtonState
+        self.button_mappings = {rule.code: rule.number for rule in self.rules['main'].values()
+                                if rule.group == 'button'}
+
+    def _compile_mappings(self, buttons):
+        ev_key = evdev.ecodes.EV_KEY
+        for code, axis in GYRO_AXES.items():
+            if axis in self.gyro_cc_map:
+                self._add_axis('imu', code, 'gyro', self.gyro_target(axis), f"Gyro {axis.upper()}-axis",
+                               f"gyro_{axis}")
+
+        # Stick axes: the left stick uses the left map, the right stick
+        # (a Right Joy-Con's only stick) the right map
+        sticks = JOYSTICK_AXES[self.joycon_type]
+        for code, key in sticks.items():
+            right = code in (evdev.ecodes.ABS_RX, evdev.ecodes.ABS_RY)
+            axis = key[-1]
+            cc_map = self.joystick_right_cc_map if right else self.joystick_left_cc_map
+            if axis not in cc_map:
+                continue
+            prefix = ("Right " if right else "Left ") if self.joycon_type == JoyConType.PRO else ""
+            self._add_axis('main', code, 'joystick', self.joystick_target(cc_map, axis),
+                           f"{prefix}{axis.upper()}-axis", f"joystick_{'r' if right else ''}{axis}")
+
+        names = self.config.button_names
+        for code, cc in buttons.items():
+            name = names.get(code, str(code))
+            if _button_fits(name, self.joycon_type):
+                # Drop the (L)/(R) suffix for display
+                self.rules['main'][(ev_key, code)] = Rule('main', ev_key, code, 'toggle', cc,
+                                                         label=name.split('(')[0].strip(),
+                                                         name='buttons', on=self.config.toggle_on,
+                                                         off=self.config.toggle_off)
+
+    def _add_axis(self, device, code, group, target, label, name):
+        mode, number, _ = target
+        rule = Rule(device, evdev.ecodes.EV_ABS, code, mode, number, target, group, label, name)
+        self.rules[device][rule.key] = rule
+
+    def gyro_target(self, axis):
+        """Resolve an axis to (mode, number, curve) so sending is one lookup"""
+        mode, number = parse_axis_target(self.gyro_cc_map[axis])
+        curves = self.config.gyro_curves if mode == 'cc' else self.config.gyro_curves_14bit
+        return mode, number, curves[axis]
+
+    def joystick_target(self, cc_map, axis):
+        mode, number = parse_axis_target(cc_map[axis])
+        curves = self.config.joystick_curves if mode == 'cc' else self.config.joystick_curves_14bit
+        return mode, number, curves[axis]
+
+    def rules_for(self, device):
+        """Rules of one device in display order: axes, then buttons"""
+        return sorted(self.rules[device].values(), key=lambda rule: (rule.group == 'button', rule.type, rule.code))
@@ -0,0 +1,323 @@
+import random
+import socket
+import struct
+import sys
+import time
+
+# Network MIDI outputs. Both are mido-like ports (name, send, close) plus
+# send_frame(data), which takes the 3-byte channel messages of one input frame
+# and sends them as one datagram on a non-blocking UDP socket. Every
+# datagram is sent 1 + redundancy times; receivers either drop the copies
+# (RTP-MIDI sequence numbers) or re-apply the same absolute values (OSC).
+
+APPLEMIDI_SIGNATURE = 0xFFFF
+APPLEMIDI_VERSION = 2
+RTP_MIDI_PAYLOAD = 0x61
+# AppleMIDI session clock: 100 µs units
+SESSION_CLOCK_HZ = 10000
+CLOCK_SYNC_INTERVAL = 10.0
+NTP_EPOCH_OFFSET = 2208988800
+
+SESSION = struct.Struct('>HHIII')   # signature, command, version, token, SSRC (+ name)
+CLOCK_SYNC = struct.Struct('>HHIB3xQQQ')
+RTP_HEADER = struct.Struct('>BBHII')
+
+def parse_address(address, default_port):
+    """'host[:port]' -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, default_port
+    return host, int(port)
+
+def _udp_socket(bind_port=0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('', bind_port))
+    sock.setblocking(False)
+    return sock
+
+# Socket wrapper with the .fd attribute the event loop registers
+class _Channel:
+    def __init__(self, sock, handler):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.handler = handler
+
+    def handle_events(self, _device=None):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65536)
+            except BlockingIOError:
+                return
+            self.handler(data, address)
+
+class _DatagramOutput:
+    def __init__(self, redundancy):
+        self.redundancy = redundancy
+        self.datagrams = 0
+        self.dropped = 0
+
+    def _transmit(self, sock, packet, target):
+        for _ in range(1 + self.redundancy):
+            try:
+                sock.sendto(packet, target)
+                self.datagrams += 1
+            except (BlockingIOError, OSError):
+                # Never wait on the network: a full buffer or an unreachable
+                # host loses this copy only
+                self.dropped += 1
+
+    def _send_once(self, sock, packet, target):
+        """Session control packets go out once, without redundancy"""
+        try:
+            sock.sendto(packet, target)
+        except (BlockingIOError, OSError):
+            self.dropped += 1
+
+    def send(self, message):
+        """mido fallback path; only 3-byte channel messages are sent"""
+        data = bytes(message.bytes())
+        if len(data) == 3:
+            self.send_frame(data)
+
+# OSC over UDP: one bundle per frame, time-tagged with the send time, with
+# one message per MIDI message:
+#   <address> ,iii channel control value        (control change)
+#   <note_address> ,iii channel note velocity   (note on; velocity 0 is off)
+class OscOutput(_DatagramOutput):
+    def __init__(self, host, port, address='/midi/cc', redundancy=0, note_address='/midi/note'):
+        super().__init__(redundancy)
+        self.name = f"osc://{host}:{port}"
+        self.target = (host, port)
+        self.sock = _udp_socket()
+        # Encoded size + address + type tags, by status nibble
+        self.prefixes = {}
+        for status, path in ((0xB0, address), (0x90, note_address), (0x80, note_address)):
+            prefix = _osc_string(path) + _osc_string(',iii')
+            self.prefixes[status] = struct.pack('>i', len(prefix) + 12) + prefix
+
+    def send_frame(self, data):
+        parts = [b'#bundle\0', _ntp_timestamp(time.time())]
+        for i in range(0, len(data), 3):
+            status = data[i] & 0xF0
+            prefix = self.prefixes.get(status)
+            if prefix is None:
+                continue
+            parts.append(prefix)
+            # Note off goes out as velocity 0
+            parts.append(struct.pack('>iii', data[i] & 0x0F, data[i + 1], data[i + 2] if status != 0x80 else 0))
+        self._transmit(self.sock, b''.join(parts), self.target)
+
+    def close(self):
+        self.sock.close()
+
+def _osc_string(text):
+    data = text.encode() + b'\0'
+    return data + b'\0' * (-len(data) % 4)
+
+def _ntp_timestamp(seconds):
+    seconds += NTP_EPOCH_OFFSET
+    return struct.pack('>II', int(seconds) & 0xFFFFFFFF, int((seconds % 1) * (1 << 32)))
+
+# RTP-MIDI (AppleMIDI) session initiator. The invitation handshake and clock
+# sync run on the event loop; MIDI sent before the peer accepts is dropped.
+class RtpMidiSession(_DatagramOutput):
+    def __init__(self, host, port=5004, session_name='MiJoCo', redundancy=0):
+        super().__init__(redundancy)
+        self.name = f"rtpmidi://{host}:{port}"
+        self.session_name = session_name
+        self.control_target = (socket.gethostbyname(host), port)
+        self.data_target = (self.control_target[0], port + 1)
+        self.ssrc = random.getrandbits(32)
+        self.token = random.getrandbits(32)
+        self.sequence = random.getrandbits(16)
+        self.clock_start = time.monotonic_ns()
+        self.state = 'closed'
+        self.last_sync = 0.0
+        # Session events go here; the engine routes them off the loop thread
+        self.notify = print
+        self.control, self.data = self._bind_pair()
+
+    def _bind_pair(self):
+        """AppleMIDI expects the data port right above the control port"""
+        for _ in range(20):
+            control = _udp_socket()
+            try:
+                data = _udp_socket(control.getsockname()[1] + 1)
+            except OSError:
+                control.close()
+                continue
+            return _Channel(control, self._on_control), _Channel(data, self._on_data)
+        raise OSError("no free UDP port pair for the RTP-MIDI session")
+
+    def attach_loop(self, loop, notify=print):
+        """Register the session sockets and start inviting the peer"""
+        self.notify = notify
+        loop.add_device(self.control, self.control.handle_events)
+        loop.add_device(self.data, self.data.handle_events)
+        loop.add_timer(1.0, self._tick)
+        self._invite(self.control, self.control_target)
+
+    def clock(self):
+        return (time.monotonic_ns() - self.clock_start) * SESSION_CLOCK_HZ // 1000000000
+
+    def _session_packet(self, command):
+        return SESSION.pack(APPLEMIDI_SIGNATURE, command, APPLEMIDI_VERSION, self.token,
+                            self.ssrc) + self.session_name.encode() + b'\0'
+
+    def _invite(self, channel, target):
+        self.state = 'inviting' if channel is self.control else 'inviting-data'
+        self._send_once(channel.sock, self._session_packet(0x494E), target)  # IN
+
+    def _tick(self):
+        if self.state == 'inviting':
+            self._invite(self.control, self.control_target)
+        elif self.state == 'inviting-data':
+            self._invite(self.data, self.data_target)
+        elif time.monotonic() - self.last_sync >= CLOCK_SYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self):
+        self.last_sync = time.monotonic()
+        self._send_once(self.data.sock, CLOCK_SYNC.pack(APPLEMIDI_SIGNATURE, 0x434B, self.ssrc, 0,
+                                                        self.clock(), 0, 0), self.data_target)
+
+    def _on_control(self, packet, _address):
+        if len(packet) < 4 or packet[:2] != b'\xff\xff':
+            return
+        command = packet[2:4]
+        if command == b'OK' and self.state == 'inviting':
+            self._invite(self.data, self.data_target)
+        elif command == b'NO':
+            self.notify(f"RTP-MIDI session rejected by {self.name}")
+            self.state = 'closed'
+        elif command == b'BY':
+            # The peer ended the session: invite again until it is back
+            self.state = 'inviting'
+
+    def _on_data(self, packet, _address):
+        if len(packet) < 4 or packet[:2] != b'\xff\xff':
+            return
+        command = packet[2:4]
+        if command == b'OK' and self.state == 'inviting-data':
+            self.state = 'open'
+            self.notify(f"RTP-MIDI session open with {self.name}")
+            self._sync()
+        elif command == b'CK' and len(packet) >= CLOCK_SYNC.size:
+            _, _, ssrc, count, ts1, ts2, _ = CLOCK_SYNC.unpack_from(packet)
+            if count == 0:
+                reply = (1, ts1, self.clock(), 0)
+            elif count == 1:
+                reply = (2, ts1, ts2, self.clock())
+            else:
+                return
+            self._send_once(self.data.sock, CLOCK_SYNC.pack(APPLEMIDI_SIGNATURE, 0x434B, self.ssrc, *reply),
+                            self.data_target)
+
+    def send_frame(self, data):
+        if self.state != 'open':
+            self.dropped += 1
+            return
+        # MIDI command list: running status, and a zero delta time before
+        # every command after the first
+        midi = bytearray()
+        running_status = None
+        for i in range(0, len(data), 3):
+            if i:
+                midi.append(0)
+            if data[i] != running_status:
+                midi.append(data[i])
+                running_status = data[i]
+            midi += data[i + 1:i + 3]
+        header = bytes([len(midi)]) if len(midi) <= 15 else struct.pack('>H', 0x8000 | len(midi))
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        packet = RTP_HEADER.pack(0x80, RTP_MIDI_PAYLOAD, self.sequence, self.clock() & 0xFFFFFFFF,
+                                 self.ssrc) + header + midi
+        self._transmit(self.data.sock, packet, self.data_target)
+
+    def close(self):
+        if self.state == 'open':
+            self._send_once(self.control.sock, SESSION.pack(APPLEMIDI_SIGNATURE, 0x4259, APPLEMIDI_VERSION,
+                                                            self.token, self.ssrc), self.control_target)  # BY
+        self.control.sock.close()
+        self.data.sock.close()
+
+def decode_osc_bundle(packet):
+    """(NTP seconds, [(address, args)]) from an OSC bundle of ,iii messages"""
+    seconds, fraction = struct.unpack_from('>II', packet, 8)
+    messages = []
+    offset = 16
+    while offset < len(packet):
+        (size,) = struct.unpack_from('>i', packet, offset)
+        element = packet[offset + 4:offset + 4 + size]
+        address = element[:element.index(b'\0')].decode()
+        messages.append((address, struct.unpack('>iii', element[-12:])))
+        offset += 4 + size
+    return seconds + fraction / (1 << 32), messages
+
+def decode_rtp_midi(packet):
+    """(sequence, timestamp, [(status, data1, data2)]) from an RTP-MIDI packet without journal"""
+    _, _, sequence, timestamp, _ = RTP_HEADER.unpack_from(packet)
+    offset = RTP_HEADER.size
+    if packet[offset] & 0x80:
+        length = struct.unpack_from('>H', packet, offset)[0] & 0x0FFF
+        offset += 2
+    else:
+        length = packet[offset] & 0x0F
+        offset += 1
+    midi = packet[offset:offset + length]
+    messages = []
+    status = None
+    i = 0
+    while i < len(midi):
+        if messages:
+            i += 1  # delta time
+        if midi[i] & 0x80:
+            status = midi[i]
+            i += 1
+        messages.append((status, midi[i], midi[i + 1]))
+        i += 2
+    return sequence, timestamp, messages
+
+# Minimal loopback receivers for checking the outputs without a DAW:
+#   python -m mijoco.midi.network osc 9000
+#   python -m mijoco.midi.network rtp 5004
+def receive(protocol, port, on_messages, count=None):
+    """Print or hand over received messages; accepts RTP-MIDI invitations"""
+    if protocol == 'osc':
+        sockets = [_udp_socket(port)]
+    else:
+        sockets = [_udp_socket(port), _udp_socket(port + 1)]
+    for sock in sockets:
+        sock.setblocking(True)
+        sock.settimeout(0.1)
+    ssrc = random.getrandbits(32)
+    received = 0
+    while count is None or received < count:
+        for sock in sockets:
+            try:
+                packet, address = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            if protocol == 'osc':
+                on_messages(decode_osc_bundle(packet))
+            elif packet[:2] == b'\xff\xff':
+                command = packet[2:4]
+                if command == b'IN':
+                    _, _, _, token, _ = SESSION.unpack_from(packet)
+                    sock.sendto(SESSION.pack(APPLEMIDI_SIGNATURE, 0x4F4B, APPLEMIDI_VERSION, token, ssrc)
+                                + b'loopback\0', address)
+                continue
+            else:
+                on_messages(decode_rtp_midi(packet))
+            received += 1
+    for sock in sockets:
+        sock.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ('osc', 'rtp'):
+        print("usage: python -m mijoco.midi.network osc|rtp PORT")
+        sys.exit(2)
+    try:
+        receive(sys.argv[1], int(sys.argv[2]), print)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,279 @@
+from collections.abc import Mapping
+import evdev
+from mijoco.config.config_loader import JoyConType, MIDI_MAX_14BIT
+
+# Declarative input routing. Every mapping, from the classic `mappings`
+# section or from `rules`, becomes a Rule: (device, event type, code) ->
+# action. Each controller binds its rules to its own state, giving one
+# dispatch table per device keyed by (type, code), so handling an event is
+# a single dict lookup.
+
+ACTIONS = ('cc', 'cc14', 'nrpn', 'note', 'toggle', 'momentary')
+AXIS_ACTIONS = ('cc', 'cc14', 'nrpn')
+
+EV_ABS = evdev.ecodes.EV_ABS
+EV_KEY = evdev.ecodes.EV_KEY
+
+# Pseudo event type of the IMU pipeline's outputs (outside evdev's type
+# range, so never matched by a device event); codes index SOURCES
+ORIENTATION = 0x100
+SOURCES = ('pitch', 'roll', 'yaw')
+# Orientation curves take degrees; raw values are hundredths of a degree
+ORIENTATION_SCALE = 100
+ORIENTATION_INPUT = {'min': -90, 'max': 90}
+
+# Event codes that feed the values shown in the status line, per device
+GYRO_AXES = {evdev.ecodes.ABS_X: 'x', evdev.ecodes.ABS_Y: 'y', evdev.ecodes.ABS_Z: 'z'}
+JOYSTICK_AXES = {
+    JoyConType.LEFT: {evdev.ecodes.ABS_X: 'x', evdev.ecodes.ABS_Y: 'y'},
+    JoyConType.RIGHT: {evdev.ecodes.ABS_RX: 'x', evdev.ecodes.ABS_RY: 'y'},
+    # Pro Controller: left stick on x/y, right stick on rx/ry
+    JoyConType.PRO: {evdev.ecodes.ABS_X: 'x', evdev.ecodes.ABS_Y: 'y',
+                     evdev.ecodes.ABS_RX: 'rx', evdev.ecodes.ABS_RY: 'ry'},
+}
+
+# Axis mappings are either a plain CC number (7-bit) or a dict:
+#   {cc: 21, resolution: 14}  -> 14-bit MSB/LSB pair on CC n and n+32
+#   {nrpn: 300}               -> 14-bit NRPN parameter
+def parse_axis_target(entry):
+    if isinstance(entry, Mapping):
+        if 'nrpn' in entry:
+            return 'nrpn', int(entry['nrpn'])
+        if int(entry.get('resolution', 7)) == 14:
+            return 'cc14', _check_cc14(int(entry['cc']))
+        return 'cc', int(entry['cc'])
+    return 'cc', int(entry)
+
+def _check_cc14(cc):
+    if cc > 31:
+        raise ValueError(f"14-bit CC must be 0-31 (LSB is sent on CC n+32), got {cc}")
+    return cc
+
+def event_code(value, prefixes):
+    """Resolve an evdev name ('EV_KEY', 'BTN_TR', 'ABS_RX') or a plain number"""
+    if isinstance(value, int):
+        return value
+    name = str(value).upper()
+    if not name.startswith(prefixes) or name not in evdev.ecodes.ecodes:
+        raise ValueError(f"Unknown event name {value!r}")
+    return evdev.ecodes.ecodes[name]
+
+def _code_name(type, code):
+    if type == ORIENTATION:
+        return SOURCES[code]
+    name = evdev.ecodes.bytype.get(type, {}).get(code, str(code))
+    return name if isinstance(name, str) else name[0]
+
+# One compiled rule. target is (mode, number, curve) for axis actions.
+class Rule:
+    def __init__(self, device, type, code, action, number, target=None, group='button', label=None,
+                 name=None, on=127, off=0, velocity=127, controller=None):
+        self.device = device
+        self.type = type
+        self.code = code
+        self.action = action
+        self.number = number
+        self.target = target
+        self.group = group
+        self.label = label or _code_name(type, code)
+        self.name = name
+        self.on = on
+        self.off = off
+        self.velocity = velocity
+        self.controller = controller
+
+    @property
+    def key(self):
+        return self.type, self.code
+
+    def describe(self):
+        if self.action == 'cc14':
+            return f"CC{self.number}/{self.number + 32} (14-bit)"
+        if self.action == 'nrpn':
+            return f"NRPN {self.number}"
+        if self.action == 'note':
+            return f"Note {self.number}"
+        if self.action == 'momentary':
+            return f"CC{self.number} (momentary)"
+        return f"CC{self.number}"
+
+def parse_rule(entry, input_config, toggle_on, toggle_off, button_names=None):
+    """Compile one entry of the `rules` section; its curve is built here, once"""
+    from mijoco.midi.curves import compile_axis_curve
+
+    if 'source' in entry:
+        # pitch / roll / yaw from the IMU pipeline
+        if entry['source'] not in SOURCES:
+            raise ValueError(f"Rule source must be one of {', '.join(SOURCES)}, got {entry['source']!r}")
+        device, type, code = 'imu', ORIENTATION, SOURCES.index(entry['source'])
+    else:
+        device = entry.get('device', 'main')
+        if device not in ('main', 'imu'):
+            raise ValueError(f"Rule device must be main or imu, got {device!r}")
+        type_name, code_name = entry['event']
+        type = event_code(type_name, ('EV_ABS', 'EV_KEY'))
+        if type not in (EV_ABS, EV_KEY):
+            raise ValueError(f"Rules handle EV_ABS and EV_KEY events, got {type_name!r}")
+        code = event_code(code_name, ('ABS_',) if type == EV_ABS else ('KEY_', 'BTN_'))
+    action = entry['action']
+    if action not in ACTIONS:
+        raise ValueError(f"Rule action must be one of {', '.join(ACTIONS)}, got {action!r}")
+    if (type == EV_KEY) == (action in AXIS_ACTIONS):
+        raise ValueError(f"Rule action {action} does not fit {'EV_KEY' if type == EV_KEY else 'axis'} events")
+    number = int(entry[action if action in ('note', 'nrpn') else 'cc'])
+
+    target = None
+    if action in AXIS_ACTIONS:
+        if action == 'cc14':
+            _check_cc14(number)
+        # The curve starts from the input section of the device it reads
+        if type == ORIENTATION:
+            orientation = input_config.get('orientation', ORIENTATION_INPUT)
+            settings = {**orientation, **orientation.get('axes', {}).get(SOURCES[code], {}),
+                        **entry.get('curve', {}), 'axes': {}}
+            for key in ('min', 'max', 'center'):
+                if settings.get(key) is not None:
+                    settings[key] = settings[key] * ORIENTATION_SCALE
+        else:
+            settings = {**input_config['gyro' if device == 'imu' else 'joystick'], **entry.get('curve', {})}
+        target = (action, number, compile_axis_curve(settings, None, 127 if action == 'cc' else MIDI_MAX_14BIT))
+        group = 'gyro' if device == 'imu' else 'joystick'
+    else:
+        group = 'button'
+    # Buttons are labelled as in the status line unless the rule names them
+    if type == ORIENTATION:
+        label = entry.get('label') or SOURCES[code].capitalize()
+    else:
+        label = entry.get('label') or (button_names or {}).get(code, '').split('(')[0].strip() or None
+    return Rule(device, type, code, action, number, target, group, label, entry.get('name'),
+                entry.get('on', toggle_on), entry.get('off', toggle_off), entry.get('velocity', 127),
+                entry.get('controller'))
+
+# Actions: a Rule bound to one controller's state. apply(value) stores an
+# event value and returns True if MIDI output is due; send(midi_sender)
+# emits it. dirty marks actions already queued in the current frame.
+class AxisAction:
+    def __init__(self, rule, values, key):
+        self.rule = rule
+        self.group = rule.group
+        self.target = rule.target
+        self.values = values
+        self.key = key
+        self.dirty = False
+
+    @property
+    def value(self):
+        return self.values[self.key]
+
+    def apply(self, value):
+        if self.values[self.key] != value:
+            self.values[self.key] = value
+            return True
+        return False
+
+    def send(self, midi_sender):
+        midi_sender.send_axis(self.target, self.values[self.key])
+
+# Press flips the button between its on and off value, kept in ButtonState
+# so it survives config reloads and reconnects
+class ToggleAction:
+    def __init__(self, rule, button_state):
+        self.rule = rule
+        self.group = rule.group
+        self.button_state = button_state
+        self.code = rule.code
+        self.cc = rule.number
+        self.dirty = False
+
+    @property
+    def pressed(self):
+        return self.button_state.states[self.code]
+
+    def apply(self, value):
+        button_state = self.button_state
+        if value == 1:  # Press
+            button_state.cc_values[self.code] = \
+                button_state.toggle_on if button_state.cc_values[self.code] == button_state.toggle_off else button_state.toggle_off
+            button_state.states[self.code] = True
+            return True
+        if value == 0:  # Release
+            button_state.states[self.code] = False
+        return False
+
+    def send(self, midi_sender):
+        midi_sender.send_button(self.cc, self.button_state.cc_values[self.code])
+
+# Base for actions that follow the button: one message on press, one on
+# release. Every change since the last send is kept, so a press and release
+# read in the same wakeup still produce both messages.
+class _HeldAction:
+    def __init__(self, rule, button_state):
+        self.rule = rule
+        self.group = rule.group
+        self.button_state = button_state
+        self.code = rule.code
+        self.number = rule.number
+        self.value = self.released
+        self.changes = []
+        self.dirty = False
+
+    @property
+    def pressed(self):
+        return self.button_state.states[self.code]
+
+    def apply(self, value):
+        if value not in (0, 1):
+            return False  # Key repeat
+        if not self.dirty:
+            self.changes.clear()  # The frame was dropped unsent
+        self.button_state.states[self.code] = bool(value)
+        self.value = self.held if value else self.released
+        self.changes.append(self.value)
+        return True
+
+    def send(self, midi_sender):
+        for value in self.changes or (self.value,):
+            self._send_value(midi_sender, value)
+        self.changes.clear()
+
+# CC on while held, off on release
+class MomentaryAction(_HeldAction):
+    def __init__(self, rule, button_state):
+        self.held = rule.on
+        self.released = rule.off
+        super().__init__(rule, button_state)
+
+    def _send_value(self, midi_sender, value):
+        midi_sender.send_cc(self.number, value)
+
+# Note on while held; release sends velocity 0
+class NoteAction(_HeldAction):
+    def __init__(self, rule, button_state):
+        self.held = rule.velocity
+        self.released = 0
+        super().__init__(rule, button_state)
+
+    def _send_value(self, midi_sender, value):
+        midi_sender.send_note(self.number, value)
+
+BUTTON_ACTIONS = {'toggle': ToggleAction, 'momentary': MomentaryAction, 'note': NoteAction}
+
+def bind_rules(rules, controller, button_state=None):
+    """Dispatch tables {'main': {(type, code): action}, 'imu': {...}} for one controller"""
+    button_state = button_state or controller.button_state
+    display_keys = {'imu': GYRO_AXES, 'main': JOYSTICK_AXES[controller.joycon_type]}
+    display_values = {'imu': controller.gyro_values, 'main': controller.joycon_values}
+    dispatch = {'main': {}, 'imu': {}}
+    for device, table in rules.items():
+        for key, rule in table.items():
+            if rule.action in AXIS_ACTIONS:
+                if rule.type == EV_ABS and rule.code in display_keys[device]:
+                    # Axes shown in the status line keep their value there
+                    values, value_key = display_values[device], display_keys[device][rule.code]
+                else:
+                    values, value_key = controller.rule_values, (device, *key)
+                    values.setdefault(value_key, 0)
+                dispatch[device][key] = AxisAction(rule, values, value_key)
+            else:
+                dispatch[device][key] = BUTTON_ACTIONS[rule.action](rule, button_state)
+    return dispatch
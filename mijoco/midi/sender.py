@@ -1,67 +1,265 @@
-import mido
-from mijoco.config.config_loader import ConfigLoader
-from mijoco.midi.mapper import scale_gyro_to_midi, scale_joystick_to_midi
-from mijoco.devices.detector import JoyConType
+import time
+import weakref
+from mijoco.midi.backends import CONTROL_CHANGE, NOTE_ON, open_backend
+from mijoco.midi.mapper import ControllerMapping
 
-config = ConfigLoader()
+# Cache keys for every CC of a channel, shared so send_cc allocates nothing
+# and a bank switch to another channel builds nothing
+_CC_KEYS = [[(channel, control) for control in range(128)] for channel in range(16)]
+
+# Receiver-side state of one MIDI channel: the selected NRPN parameter and the
+# last 14-bit value per target. Every controller has its own MidiSender but
+# they share the output, so this state is kept per (output, channel) and
+# shared by all senders writing there: a sender never sends data entry for
+# a parameter another sender selected, or skips an MSB another one changed.
+class ChannelState:
+    def __init__(self):
+        self.nrpn_selected = None
+        self.last_high_res = {}
+
+_channel_states = weakref.WeakKeyDictionary()
+
+def channel_states(midi_out):
+    """The 16 ChannelStates of midi_out, created on first use"""
+    try:
+        states = _channel_states.get(midi_out)
+        if states is None:
+            states = _channel_states[midi_out] = [ChannelState() for _ in range(16)]
+    except TypeError:
+        # No output (preview mode) or one that cannot be weakly referenced
+        states = [ChannelState() for _ in range(16)]
+    return states
 
 # Handles all midi output operations
 class MidiSender:
-    def __init__(self, midi_out):
+    def __init__(self, midi_out, mapping: ControllerMapping = None):
         self.midi_out = midi_out
-        self.channel = config.config['midi']['channel']
-    
+        self.output = None
+        # Optional MidiFileRecorder copying every message sent
+        self.recorder = None
+
+        # Change-only mode: remember the last value sent per (channel, CC) and
+        # drop repeats. Optional per-CC rate limit and keepalive resend.
+        self.last_values = {}
+        self.last_sent = {}
+        self.pending = {}
+
+        # High-resolution axes: shared per channel of this output
+        self.channel_states = channel_states(midi_out)
+
+        self.sent_count = 0
+        self.suppressed_count = 0
+        self.rate_limited_count = 0
+        self.keepalive_count = 0
+
+        self.set_mapping(mapping or ControllerMapping())
+
+    def set_mapping(self, mapping: ControllerMapping):
+        """Apply a (new) mapping namespace; value caches survive so a reload sends no duplicates"""
+        self.select_mapping(mapping)
+        output_config = mapping.config.config['midi'].get('output', {})
+        fast_path = output_config.get('fast_path', True)
+        if self.output is None or fast_path != self.fast_path:
+            if self.output:
+                self.output.flush()
+            self.output = open_backend(self.midi_out, fast_path)
+            self.fast_path = fast_path
+            self.set_recorder(self.recorder)
+        self.change_only = output_config.get('change_only', False)
+        self.keepalive = output_config.get('keepalive', 0)
+        default_rate = output_config.get('max_rate', 0)
+        self.default_interval = 1.0 / default_rate if default_rate else 0.0
+        self.min_intervals = {int(cc): 1.0 / rate if rate else 0.0
+                              for cc, rate in output_config.get('max_rate_per_cc', {}).items()}
+
+    def select_mapping(self, mapping: ControllerMapping):
+        """Switch to another bank of the same config: only the mapping and channel change"""
+        if getattr(self, 'channel', None) != mapping.channel:
+            self.channel = mapping.channel
+            self.channel_state = self.channel_states[mapping.channel]
+            self.status = CONTROL_CHANGE | mapping.channel
+            self.note_status = NOTE_ON | mapping.channel
+            self.cc_keys = _CC_KEYS[mapping.channel]
+        self.mapping = mapping
+
+    def set_recorder(self, recorder):
+        """Copy every message sent from now on into recorder (None stops recording)"""
+        self.recorder = recorder
+        self.send_bytes = recorder.tap(self.output.send_message) if recorder else self.output.send_message
+
+    @property
+    def flush_interval(self):
+        """How often flush() must run, or 0 if nothing needs deferred sending"""
+        intervals = [i for i in [self.default_interval, self.keepalive, *self.min_intervals.values()] if i]
+        return min(intervals) if self.change_only and intervals else 0
+
+    def _send(self, control, value):
+        self.send_bytes(self.status, control, value)
+        self.sent_count += 1
+
+    def end_frame(self):
+        """Write out everything sent for one input frame (a single write on batching backends)"""
+        self.output.flush()
+
     def send_cc(self, control, value):
-        self.midi_out.send(mido.Message(
-            'control_change',
-            channel=self.channel,
-            control=control,
-            value=value
-        ))
-    
-    def send_gyro(self, axis, value):
-        """Send gyroscope data as MIDI CC"""
-        self.send_cc(config.gyro_cc_map[axis], scale_gyro_to_midi(value))
-    
-    def send_joystick(self, axis, value, joycon_type: JoyConType):
-        """Send joystick data using appropriate mapping"""
-        cc_map = (config.joystick_right_cc_map if joycon_type == JoyConType.RIGHT 
-                 else config.joystick_left_cc_map)
-        self.send_cc(cc_map[axis], scale_joystick_to_midi(value))
-    
+        if not self.change_only:
+            self._send(control, value)
+            return
+
+        key = self.cc_keys[control]
+        if self.last_values.get(key) == value:
+            # A newer identical value supersedes anything held back
+            self.pending.pop(key, None)
+            self.suppressed_count += 1
+            return
+
+        now = time.monotonic()
+        interval = self.min_intervals.get(control, self.default_interval)
+        if interval and now - self.last_sent.get(key, 0.0) < interval:
+            if key in self.pending:
+                self.suppressed_count += 1
+            self.pending[key] = value
+            self.rate_limited_count += 1
+            return
+
+        self.pending.pop(key, None)
+        self._send(control, value)
+        self.last_values[key] = value
+        self.last_sent[key] = now
+
+    def flush(self):
+        """Send values held back by the rate limiter and due keepalives"""
+        now = time.monotonic()
+        for key, value in list(self.pending.items()):
+            interval = self.min_intervals.get(key[1], self.default_interval)
+            if now - self.last_sent.get(key, 0.0) >= interval:
+                del self.pending[key]
+                self._send(key[1], value)
+                self.last_values[key] = value
+                self.last_sent[key] = now
+        if self.keepalive:
+            for key, value in self.last_values.items():
+                if key not in self.pending and now - self.last_sent[key] >= self.keepalive:
+                    self._send(key[1], value)
+                    self.last_sent[key] = now
+                    self.keepalive_count += 1
+        self.output.flush()
+
+    def preallocate(self):
+        """Size the per-CC caches for every mapped CC up front (dicts keep their size after deletes)"""
+        controls = {rule.number for rules in self.mapping.rules.values() for rule in rules.values()
+                    if rule.action in ('cc', 'toggle', 'momentary')}
+        for cache in (self.last_values, self.last_sent, self.pending):
+            added = [self.cc_keys[control] for control in controls if self.cc_keys[control] not in cache]
+            for key in added:
+                cache[key] = None
+            for key in added:
+                del cache[key]
+
+    def counters(self):
+        return {
+            'sent': self.sent_count,
+            'suppressed': self.suppressed_count,
+            'rate_limited': self.rate_limited_count,
+            'keepalive': self.keepalive_count,
+        }
+
+    def send_cc14(self, control, value):
+        """Send a 14-bit value as MSB on CC n and LSB on CC n+32, skipping unchanged bytes"""
+        key = ('cc14', control)
+        last_high_res = self.channel_state.last_high_res
+        last = last_high_res.get(key)
+        if last == value:
+            self.suppressed_count += 1
+            return
+        msb, lsb = value >> 7, value & 0x7F
+        # Receivers reset the LSB when a new MSB arrives, so an MSB change
+        # always needs the LSB after it; an LSB-only change is a single message
+        if last is None or msb != last >> 7:
+            self._send(control, msb)
+            self._send(control + 32, lsb)
+        else:
+            self._send(control + 32, lsb)
+        last_high_res[key] = value
+
+    def send_nrpn(self, parameter, value):
+        """Send a 14-bit NRPN value; the parameter number is only re-sent when it changes"""
+        key = ('nrpn', parameter)
+        state = self.channel_state
+        last = state.last_high_res.get(key)
+        if last == value:
+            self.suppressed_count += 1
+            return
+        if state.nrpn_selected != parameter:
+            self._send(99, parameter >> 7)
+            self._send(98, parameter & 0x7F)
+            state.nrpn_selected = parameter
+            last = None
+        msb, lsb = value >> 7, value & 0x7F
+        if last is None or msb != last >> 7:
+            self._send(6, msb)
+        self._send(38, lsb)
+        state.last_high_res[key] = value
+
+    def send_axis(self, target, value):
+        mode, number, curve = target
+        if mode == 'cc':
+            self.send_cc(number, curve(value))
+        elif mode == 'cc14':
+            self.send_cc14(number, curve(value))
+        else:
+            self.send_nrpn(number, curve(value))
+
     def send_button(self, cc, value):
         """Send button state as MIDI CC"""
         self.send_cc(cc, value)
 
-# Send all MIDI messages for normal operation
-def send_midi_messages(midi_sender: MidiSender, gyro_values, joycon_values, button_state, gyro_enabled, joystick_enabled, joycon_type: JoyConType):
-    # Send gyro data if enabled
-    if gyro_enabled:
-        for axis in ['x', 'y', 'z']:
-            midi_sender.send_gyro(axis, gyro_values[axis])
-    # Send joystick data if enabled
-    if joystick_enabled:
-        for axis in ['x', 'y']:
-            midi_sender.send_joystick(axis, joycon_values[axis], joycon_type)
-    # Send button data
-    for code, pressed in button_state.states.items():
-        if pressed:
-            midi_sender.send_button(config.button_mappings[code], button_state.cc_values[code])
-
-# Special MIDI sending for learn mode
-def send_midi_for_learn(learn_state, midi_sender: MidiSender, gyro_values, joycon_values, button_state, joycon_type: JoyConType):
+    def send_note(self, note, velocity):
+        """Note on; velocity 0 is the note off"""
+        self.send_bytes(self.note_status, note, velocity)
+        self.sent_count += 1
+
+# Send the current value of every mapped control for normal operation;
+# buttons only while held
+def send_midi_messages(midi_sender: MidiSender, controller, gyro_enabled, joystick_enabled):
+    for dispatch in controller.dispatch.values():
+        for action in dispatch.values():
+            if action.group == 'gyro':
+                send = gyro_enabled
+            elif action.group == 'joystick':
+                send = joystick_enabled
+            else:
+                send = action.pressed
+            if send:
+                action.send(midi_sender)
+    midi_sender.end_frame()
+
+# Send what changed in the completed input frames: one burst per hardware report
+def send_midi_frame(midi_sender: MidiSender, frame, gyro_enabled, joystick_enabled):
+    for action in frame.actions:
+        if action.group == 'gyro' and not gyro_enabled or action.group == 'joystick' and not joystick_enabled:
+            continue
+        action.send(midi_sender)
+    frame.clear()
+    midi_sender.end_frame()
+
+# Clocked output: buttons go out at once, axes wait for the next clock tick
+def send_midi_buttons(midi_sender: MidiSender, frame):
+    """Returns the number of buttons sent"""
+    buttons = frame.take('button')
+    for action in buttons:
+        action.send(midi_sender)
+    midi_sender.end_frame()
+    return len(buttons)
+
+# Special MIDI sending for learn mode: only the control being learned, from
+# its current value, while it is away from rest
+def send_midi_for_learn(learn_state, midi_sender: MidiSender, controller):
     control = learn_state.current_selection
-    if control == 'gyro_x':
-        midi_sender.send_gyro('x', gyro_values['x'])
-    elif control == 'gyro_y':
-        midi_sender.send_gyro('y', gyro_values['y'])
-    elif control == 'gyro_z':
-        midi_sender.send_gyro('z', gyro_values['z'])
-    elif control in ['joystick_x', 'joystick_rx']:
-        midi_sender.send_joystick('x', joycon_values['x'], joycon_type)
-    elif control in ['joystick_y', 'joystick_ry']:
-        midi_sender.send_joystick('y', joycon_values['y'], joycon_type)
-    elif control == 'buttons':
-        for code, pressed in button_state.states.items():
-            if pressed:
-                midi_sender.send_button(config.button_mappings[code], button_state.cc_values[code])
\ No newline at end of file
+    for dispatch in controller.dispatch.values():
+        for action in dispatch.values():
+            if action.rule.name != control:
+                continue
+            if (action.pressed if action.group == 'button' else action.value != 0):
+                action.send(midi_sender)
+    midi_sender.end_frame()
@@ -0,0 +1,141 @@
+import os
+import struct
+import threading
+import time
+import mido
+from mido.midifiles.meta import encode_variable_int
+
+# Records the MIDI stream MidiSender emits into a Standard MIDI File for
+# later editing. The send path only packs (timestamp, 3 bytes) into a
+# preallocated ring; a background thread drains the ring, turns timestamps
+# into delta ticks and appends the events to the file's single track. After
+# every flush the track ends with End of Track and its chunk length is
+# patched, so the file on disk is always complete up to the last flush.
+
+# Send time (CLOCK_MONOTONIC ns), status, data 1, data 2
+RECORD = struct.Struct('<qBBBx')
+# End of Track meta event with a zero delta
+END_OF_TRACK = bytes([0, *mido.MetaMessage('end_of_track').bytes()])
+# Offset of the MTrk length in a file with one track
+TRACK_LENGTH_OFFSET = 18
+
+class MidiFileRecorder:
+    def __init__(self, path, ring_size=65536, flush_interval=2.0, bpm=120, ticks_per_beat=960):
+        self.path = path
+        # Power of two, so the slot is head & mask
+        self.capacity = 1 << max(ring_size - 1, 1).bit_length()
+        self.mask = self.capacity - 1
+        self.ring = bytearray(self.capacity * RECORD.size)
+        # Written only by the sending thread / only by the drain thread
+        self.head = 0
+        self.tail = 0
+        self.max_used = 0
+        self.overruns = 0
+        self.written = 0
+        self.errors = 0
+        self.flush_interval = flush_interval
+        self.start_ns = time.monotonic_ns()
+        self.ticks_per_ns = ticks_per_beat / (mido.bpm2tempo(bpm) * 1000)
+        self.last_tick = 0
+
+        track = mido.MidiTrack([mido.MetaMessage('track_name', name='MiJoCo', time=0),
+                                mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm), time=0)])
+        mido.MidiFile(type=0, ticks_per_beat=ticks_per_beat, tracks=[track]).save(path)
+        self.file = open(path, 'r+b')
+        self.file.seek(0, os.SEEK_END)
+        self.track_length = self.file.tell() - TRACK_LENGTH_OFFSET - 4
+
+        self.running = True
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="mijoco-smf", daemon=True)
+        self.thread.start()
+
+    def record(self, status, data1, data2):
+        """Copy one outgoing message into the ring; drops it (an overrun) when the ring is full"""
+        head = self.head
+        used = head - self.tail
+        if used >= self.capacity:
+            self.overruns += 1
+            return
+        RECORD.pack_into(self.ring, (head & self.mask) * RECORD.size, time.monotonic_ns(), status, data1, data2)
+        self.head = head + 1
+        if used >= self.max_used:
+            self.max_used = used + 1
+
+    def tap(self, send_message):
+        """send_message wrapped so every message is recorded before it is sent"""
+        record = self.record
+
+        def send_and_record(status, data1, data2):
+            record(status, data1, data2)
+            send_message(status, data1, data2)
+        return send_and_record
+
+    def _drain(self):
+        """Encode what is in the ring as track events"""
+        head = self.head
+        tail = self.tail
+        data = bytearray()
+        size = RECORD.size
+        last_tick = self.last_tick
+        while tail != head:
+            timestamp, status, data1, data2 = RECORD.unpack_from(self.ring, (tail & self.mask) * size)
+            tail += 1
+            tick = max(round((timestamp - self.start_ns) * self.ticks_per_ns), last_tick)
+            data.extend(encode_variable_int(tick - last_tick))
+            data.append(status)
+            data.append(data1)
+            data.append(data2)
+            last_tick = tick
+        self.tail = tail
+        self.last_tick = last_tick
+        return data
+
+    def _append(self, data):
+        """Replace End of Track with data + End of Track and patch the chunk length"""
+        file = self.file
+        file.seek(-len(END_OF_TRACK), os.SEEK_END)
+        file.write(data)
+        file.write(END_OF_TRACK)
+        self.track_length += len(data)
+        file.seek(TRACK_LENGTH_OFFSET)
+        file.write(struct.pack('>I', self.track_length))
+        file.flush()
+        os.fsync(file.fileno())
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            running = self.running
+            count = self.head - self.tail
+            if count:
+                try:
+                    self._append(self._drain())
+                    self.written += count
+                except OSError:
+                    self.errors += 1
+            if not running:
+                return
+
+    def counters(self):
+        return {
+            'path': str(self.path),
+            'written': self.written,
+            'queued': self.head - self.tail,
+            'ring': self.capacity,
+            'max_queued': self.max_used,
+            'overruns': self.overruns,
+            'errors': self.errors,
+        }
+
+    def close(self):
+        """Write out what is left and close the file"""
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        self.file.close()
+
+def print_recorder_counters(counters):
+    print(f"\nMIDI file {counters['path']}: written {counters['written']} | "
+          f"ring {counters['queued']}/{counters['ring']} (max {counters['max_queued']}) | "
+          f"overruns {counters['overruns']} | errors {counters['errors']}")
@@ -0,0 +1,167 @@
+import sys
+import threading
+from collections import deque
+from mijoco.config.config_loader import get_config
+
+def snapshot_controller(controller):
+    """Copy the displayed state of one controller; cheap enough for the loop thread"""
+    button_state = controller.button_state
+    gyro = controller.gyro_values
+    joy = controller.joycon_values
+    return (
+        f"{controller.name} - disconnected" if controller.missing else controller.name,
+        (gyro['x'], gyro['y'], gyro['z']),
+        tuple(joy.values()),
+        tuple((code, button_state.cc_values[code]) for code, pressed in button_state.states.items() if pressed),
+    )
+
+def format_fields(snapshot, gyro_enabled, joystick_enabled):
+    """Split one status line into fields so only changed fields need redrawing"""
+    name, (gx, gy, gz), sticks, pressed = snapshot
+    config = get_config()
+    active_buttons = [f"{config.button_names.get(code, '?')}({'ON' if value == config.toggle_on else 'OFF'})"
+                      for code, value in pressed]
+    # Pro Controllers have a second stick (rx, ry)
+    stick_fields = (f"{sticks[0]:6d}", " | Y:", f"{sticks[1]:6d}")
+    if len(sticks) > 2:
+        stick_fields += (" | RX:", f"{sticks[2]:6d}", " | RY:", f"{sticks[3]:6d}")
+    return (
+        f"[{name}] Gyro: X:", f"{gx:6d}", " | Y:", f"{gy:6d}", " | Z:", f"{gz:6d}",
+        f" [MIDI:{'ON ' if gyro_enabled else 'OFF'}] | Joy: X:", *stick_fields,
+        f" | [MIDI:{'ON ' if joystick_enabled else 'OFF'}] | Buttons: ",
+        f"{','.join(active_buttons) if active_buttons else 'None':20s}",
+    )
+
+def format_values(controller, gyro_enabled, joystick_enabled):
+    return ''.join(format_fields(snapshot_controller(controller), gyro_enabled, joystick_enabled))
+
+# Terminal status display on its own thread. The engine only publishes a
+# snapshot (a tuple copy of the state); formatting and writing to stdout
+# happen here, so a slow terminal can never stall MIDI output.
+class StatusDisplay:
+    def __init__(self, gyro_enabled, joystick_enabled, stream=None):
+        self.gyro_enabled = gyro_enabled
+        self.joystick_enabled = joystick_enabled
+        self.stream = stream or sys.stdout
+        self._snapshot = None
+        self._notices = deque()
+        self._rows = None
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="status-display", daemon=True)
+
+    def publish(self, controllers):
+        """Called on the loop thread; replaces any snapshot not yet drawn"""
+        self._snapshot = tuple(snapshot_controller(controller) for controller in controllers)
+        self._wakeup.set()
+
+    def notice(self, text):
+        """Print a message above the status block without writing from the caller's thread"""
+        self._notices.append(text)
+        self._wakeup.set()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=1.0)
+        if not self._thread.is_alive():
+            # Anything queued after the thread's last pass
+            while self._notices:
+                self._write_notice(self._notices.popleft())
+        if self._rows and len(self._rows) > 1:
+            # Leave the cursor below the status block
+            self.stream.write(f"\x1b[{len(self._rows) - 1}E")
+            self.stream.flush()
+
+    def _run(self):
+        drawn = None
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Notices queued before stop() are still written
+            while self._notices:
+                self._write_notice(self._notices.popleft())
+                drawn = None
+            if self._stopped:
+                return
+            snapshot = self._snapshot
+            if snapshot is None or snapshot is drawn:
+                continue
+            drawn = snapshot
+            rows = [format_fields(s, self.gyro_enabled, self.joystick_enabled) for s in snapshot]
+            self._draw(rows)
+
+    def _write_notice(self, text):
+        lines = len(self._rows) if self._rows else 1
+        self.stream.write(f"\x1b[{lines}E" if lines > 1 else "\n")
+        self.stream.write(text + "\n")
+        self.stream.flush()
+        self._rows = None
+
+    def _draw(self, rows):
+        if self._rows is None or len(rows) != len(self._rows):
+            output = "\r" + "\n".join(''.join(row) + "\x1b[K" for row in rows)
+            if len(rows) > 1:
+                output += f"\x1b[{len(rows) - 1}F"
+        else:
+            output = self._diff(rows)
+        self._rows = rows
+        if output:
+            self.stream.write(output)
+            self.stream.flush()
+
+    def _diff(self, rows):
+        """Cursor-addressed updates for the fields that changed"""
+        output = []
+        for line, (old, new) in enumerate(zip(self._rows, rows)):
+            if old == new:
+                continue
+            if line:
+                output.append(f"\x1b[{line}E")
+            column = 0
+            for index, (old_field, new_field) in enumerate(zip(old, new)):
+                if old_field != new_field:
+                    if len(old_field) != len(new_field):
+                        # Later fields move: redraw the rest of the line
+                        output.append(f"\x1b[{column + 1}G" + ''.join(new[index:]) + "\x1b[K")
+                        break
+                    output.append(f"\x1b[{column + 1}G{new_field}")
+                column += len(new_field)
+            output.append(f"\x1b[{line}F" if line else "\r")
+        return ''.join(output)
+
+# Headless (--quiet) counterpart of StatusDisplay.notice: messages from the
+# loop thread are queued and printed here, so the loop never writes to a
+# possibly blocked stdout (a pipe to a full journal, a stopped terminal)
+class NoticeWriter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._notices = deque()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="notices", daemon=True)
+
+    def notice(self, text):
+        self._notices.append(text)
+        self._wakeup.set()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while self._notices:
+                self.stream.write(self._notices.popleft() + "\n")
+                self.stream.flush()
+            if self._stopped:
+                return
@@ -0,0 +1,59 @@
+import ctypes
+import os
+import struct
+from mijoco.utils.libc import load_libc
+
+# Minimal inotify binding via libc, so file watching needs no extra dependency
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+class Inotify:
+    def __init__(self):
+        libc = load_libc()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches = {}
+
+    def add_watch(self, path, mask):
+        wd = load_libc().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self.watches[wd] = str(path)
+        return wd
+
+    def read(self):
+        """Return pending events as (watched path, mask, name) tuples"""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            events.append((self.watches.get(wd), mask, name))
+        return events
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,11 @@
+import ctypes
+import ctypes.util
+
+_libc = None
+
+def load_libc():
+    """libc via ctypes, loaded once, with errno capture"""
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    return _libc
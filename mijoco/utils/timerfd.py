@@ -0,0 +1,49 @@
+import ctypes
+import os
+import struct
+from mijoco.utils.libc import load_libc
+
+# Minimal timerfd binding via libc: a periodic CLOCK_MONOTONIC timer the
+# kernel keeps on its own deadline grid, readable as a file descriptor
+
+CLOCK_MONOTONIC = 1
+TFD_NONBLOCK = os.O_NONBLOCK
+TFD_CLOEXEC = os.O_CLOEXEC
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [('it_interval', _Timespec), ('it_value', _Timespec)]
+
+_EXPIRATIONS = struct.Struct('Q')
+
+class TimerFd:
+    def __init__(self):
+        self.fd = load_libc().timerfd_create(CLOCK_MONOTONIC, TFD_NONBLOCK | TFD_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def set_interval(self, interval_ns):
+        """Fire every interval_ns, first one interval from now; 0 disarms"""
+        period = _Timespec(interval_ns // 1000000000, interval_ns % 1000000000)
+        spec = _Itimerspec(period, period)
+        if load_libc().timerfd_settime(self.fd, 0, ctypes.byref(spec), None) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def read(self):
+        """Number of expirations since the last read (more than 1 means ticks were missed)"""
+        try:
+            return _EXPIRATIONS.unpack(os.read(self.fd, 8))[0]
+        except BlockingIOError:
+            return 0
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,39 @@
+from pathlib import Path
+import yaml
+from mijoco.config.writer import add_rule_text, save_rule
+
+CONFIG = Path(__file__).resolve().parent.parent / "config.yml"
+RULE = {'controller': 'Right', 'device': 'main', 'event': ['EV_ABS', 'ABS_RX'], 'action': 'cc', 'cc': 90}
+
+def _with_rules(rules_text):
+    """The shipped config.yml with its `rules` section replaced by rules_text"""
+    lines = CONFIG.read_text().splitlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith('rules:'))
+    return '\n'.join(lines[:start]) + '\n' + rules_text
+
+def test_column_zero_list_gets_column_zero_item():
+    text = _with_rules("rules:\n- {event: [EV_KEY, BTN_TR], action: note, note: 60}\n\nprint_interval: 0.1\n")
+    result = add_rule_text(text, RULE)
+    config = yaml.safe_load(result)
+    assert config['rules'][-1] == RULE
+    assert len(config['rules']) == 2
+    assert config['print_interval'] == 0.1
+    assert "\n- {controller: Right" in result
+
+def test_column_zero_list_replaces_same_input():
+    text = _with_rules("rules:\n- {controller: Right, device: main, event: [EV_ABS, ABS_RX], action: cc, cc: 30}\n")
+    config = yaml.safe_load(add_rule_text(text, RULE))
+    assert config['rules'] == [RULE]
+
+def test_indented_list_keeps_its_indent():
+    text = _with_rules("rules:\n    - {event: [EV_KEY, BTN_TR], action: note, note: 60}\nbanks: {list: [a]}\n")
+    result = add_rule_text(text, RULE)
+    assert "\n    - {controller: Right" in result
+    assert yaml.safe_load(result)['rules'][-1] == RULE
+
+def test_save_rule_on_column_zero_list(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text(_with_rules("rules:\n- {event: [EV_KEY, BTN_TR], action: note, note: 60}\n"))
+    config = save_rule(path, RULE)
+    assert len(config.rules) == 2
+    assert not list(tmp_path.glob('.*.tmp'))